@@ -1,49 +1,580 @@
-from flask import Flask, render_template, request, jsonify
+from flask import (Flask, render_template, request, jsonify, Response, send_file, session, stream_with_context,
+                   url_for)
+import functools
+import json
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 from dotenv import load_dotenv
-from groq_client import GroqClient
-from gemini_client import GeminiClient
-from openrouter_client import OpenRouterClient
+from model_cache import ModelCatalogCache
+from conversation_store import ConversationStore, Message
+from conversation_db import SQLiteConversationStore
+from context_packer import MODEL_CONTEXT_WINDOWS, context_window, pack_conversation
+from health import ProviderProber
+from providers import LazyClient
+from router import ChatRouter, CircuitOpenError, parse_model_map
+from rate_limiter import RateLimitError, RateScheduler, parse_rate_limits, request_tokens
+from response_cache import ResponseCache, request_key
+from singleflight import SingleFlight
+from static_assets import IMMUTABLE_MAX_AGE, StaticAssets, DEFAULT_DIRECTORY as STATIC_BUILD_DIR
+import arena
+import batch
+import compression
+import metrics
+import timing
+from profiler import SlowRequestProfiler
+from timing import phase
+from tts_cache import TTSCache, cache_key, is_valid_key
+from tts_stream import join_wav, split_text, stream_wav, synthesize_in_order
 import secrets
 
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
-
-# Initialize Groq client (optional)
-try:
-    groq_client = GroqClient(api_key=os.getenv('GROQ_API_KEY'))
-except Exception as e:
-    print(f"Warning: Groq client initialization failed: {e}")
-    groq_client = None
-
-# Initialize Gemini client if available
-try:
-    gemini_client = GeminiClient(api_key=os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY'))
-except Exception as e:
-    print(f"Warning: Gemini client initialization failed: {e}")
-    gemini_client = None
-
-# Initialize OpenRouter client if available
-try:
-    openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
-    if openrouter_api_key:
-        print(f"[INFO] Initializing OpenRouter client...")
-        openrouter_client = OpenRouterClient(api_key=openrouter_api_key)
-        print(f"[INFO] OpenRouter client initialized successfully")
+# Set FLASK_SECRET_KEY so session cookies stay valid across restarts and hosts
+app.secret_key = os.getenv('FLASK_SECRET_KEY') or secrets.token_hex(16)
+
+
+def _attach_rate_observer(provider, client):
+    """Learn rate limits from the rate-limit headers of every chat response"""
+    client.rate_observer = functools.partial(rate_scheduler.observe, provider)
+
+
+def _provider_client(provider, module, class_name, api_key):
+    """A client built on first use (see providers.py), or None if the provider has no API key"""
+    if not api_key:
+        return None
+    return LazyClient(provider, module, class_name,
+                      setup=functools.partial(_attach_rate_observer, provider), api_key=api_key)
+
+
+# Provider SDKs are only imported once a client is used (or by providers.warm_up())
+groq_client = _provider_client('groq', 'groq_client', 'GroqClient', os.getenv('GROQ_API_KEY'))
+if groq_client is None:
+    print("Warning: Groq client not configured. Set GROQ_API_KEY.")
+gemini_client = _provider_client('gemini', 'gemini_client', 'GeminiClient',
+                                 os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY'))
+if gemini_client is None:
+    print("Warning: Gemini client not configured. Set GEMINI_API_KEY or GOOGLE_API_KEY.")
+openrouter_client = _provider_client('openrouter', 'openrouter_client', 'OpenRouterClient',
+                                     os.getenv('OPENROUTER_API_KEY'))
+if openrouter_client is None:
+    print("[WARNING] OPENROUTER_API_KEY not found in environment")
+
+# Per-session conversation storage: in-process (bounded, LRU-evicted) by default, or
+# a SQLite WAL database shared by all workers with the in-process store as its cache
+_conversation_caps = dict(
+    max_conversations=int(os.getenv('CONVERSATION_STORE_MAX', 10000)),
+    max_chars=int(os.getenv('CONVERSATION_STORE_MAX_CHARS', 50_000_000)),
+    max_messages=int(os.getenv('CONVERSATION_MAX_MESSAGES', 500)),
+    max_per_owner=int(os.getenv('CONVERSATIONS_PER_USER', 20)),
+)
+if os.getenv('CONVERSATION_BACKEND', 'memory').lower() == 'sqlite':
+    conversation_store = SQLiteConversationStore(
+        os.getenv('CONVERSATION_DB_PATH', os.path.join(tempfile.gettempdir(), 'groq-chatbot-conversations.db')),
+        synchronous=os.getenv('CONVERSATION_DB_SYNC', 'normal'),
+        **_conversation_caps,
+    )
+else:
+    conversation_store = ConversationStore(**_conversation_caps)
+# Largest page of messages /api/history returns for one `limit` request
+HISTORY_MAX_PAGE = int(os.getenv('HISTORY_MAX_PAGE', 200))
+
+# Shared model catalog cache (stale entries are served while refreshing in background)
+model_catalog = ModelCatalogCache(
+    ttl=float(os.getenv('MODEL_CACHE_TTL', 300)),
+    max_stale=float(os.getenv('MODEL_CACHE_MAX_STALE', 86400)),
+)
+
+# Background provider health probes (read by /health/ready)
+provider_prober = ProviderProber(interval=float(os.getenv('HEALTH_PROBE_INTERVAL', 30)))
+for _name, _client in (('groq', groq_client), ('gemini', gemini_client), ('openrouter', openrouter_client)):
+    if _client is not None:
+        # Late-bound so registering a probe does not build the client
+        provider_prober.register(_name, lambda client=_client: client.fetch_models())
+
+# Per-route RPM/TPM token buckets with a priority wait queue and 429 retries
+rate_scheduler = RateScheduler(
+    parse_rate_limits(os.getenv('RATE_LIMITS', '')),
+    max_wait=float(os.getenv('RATE_LIMIT_MAX_WAIT', 30)),
+    max_retries=int(os.getenv('RATE_LIMIT_MAX_RETRIES', 3)),
+)
+# Hedging, failover and circuit breakers across providers
+chat_router = ChatRouter(
+    {'groq': groq_client, 'gemini': gemini_client, 'openrouter': openrouter_client},
+    equivalents=parse_model_map(os.getenv('HEDGE_MODEL_MAP', '')),
+    hedge=os.getenv('HEDGE_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on'),
+    default_delay=float(os.getenv('HEDGE_DEFAULT_DELAY', 2.0)),
+    failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30)),
+    scheduler=rate_scheduler,
+)
+PROVIDERS = ('groq', 'gemini', 'openrouter')
+
+# Coalesce identical concurrent upstream calls (catalog fetches, cacheable chats)
+catalog_flight = SingleFlight('catalog')
+chat_flight = SingleFlight('chat')
+
+# Opt-in exact-match cache for deterministic (temperature 0) chat answers
+response_cache = ResponseCache(
+    enabled=os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on'),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', 3600)),
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+    directory=os.getenv('RESPONSE_CACHE_DIR') or None,
+    max_temperature=float(os.getenv('RESPONSE_CACHE_MAX_TEMPERATURE', 0)),
+)
+
+# Content-addressed TTS audio cache (in-process LRU + shared disk tier)
+tts_cache = TTSCache(
+    directory=os.getenv('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'groq-chatbot-tts')) or None,
+    memory_bytes=int(os.getenv('TTS_CACHE_MEMORY_BYTES', 32 * 1024 * 1024)),
+    disk_bytes=int(os.getenv('TTS_CACHE_DISK_BYTES', 512 * 1024 * 1024)),
+)
+TTS_AUDIO_MAX_AGE = int(os.getenv('TTS_AUDIO_MAX_AGE', 86400))
+
+# Long text is synthesized as sentence-aligned chunks, several at a time
+TTS_CHUNK_CHARS = int(os.getenv('TTS_CHUNK_CHARS', 1000))
+TTS_FIRST_CHUNK_CHARS = int(os.getenv('TTS_FIRST_CHUNK_CHARS', 200))
+TTS_CHUNK_CONCURRENCY = int(os.getenv('TTS_CHUNK_CONCURRENCY', 3))
+# Longest text one TTS request may synthesize (checked before any upstream call)
+TTS_MAX_CHARS = int(os.getenv('TTS_MAX_CHARS', 20000))
+_tts_pool = ThreadPoolExecutor(max_workers=int(os.getenv('TTS_POOL_WORKERS', 8)), thread_name_prefix='tts')
+TTS_MODELS = ('playai-tts', 'playai-tts-arabic')
+
+# Models named in configuration; with the catalogs these are the model label values metrics may use
+_configured_models = set(MODEL_CONTEXT_WINDOWS) | set(TTS_MODELS) | {
+    model for route, alternatives in chat_router.equivalents.items() for _, model in [route] + alternatives}
+
+
+def _known_model(provider, model):
+    """True if a requested model is configured or listed in the provider's cached catalog"""
+    if model in _configured_models:
+        return True
+    entry = model_catalog.entry(provider)
+    return entry is not None and entry.find(model) is not None
+
+
+metrics.register_model_check(_known_model)
+
+# Server-Timing phases on instrumented endpoints, and flame-graph profiles of slow requests
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+slow_request_profiler = SlowRequestProfiler(
+    threshold_ms=float(os.getenv('SLOW_REQUEST_PROFILE_MS', 0)),
+    interval_ms=float(os.getenv('SLOW_REQUEST_SAMPLE_MS', 10)),
+    directory=os.getenv('SLOW_REQUEST_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'groq-chatbot-profiles')),
+)
+
+# gzip/brotli for JSON bodies of at least COMPRESSION_MIN_BYTES
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+
+# Content-hashed, precompressed copies of static/ CSS and JS, served from /assets/ as immutable
+static_assets = StaticAssets(app.static_folder, os.getenv('STATIC_BUILD_DIR', STATIC_BUILD_DIR))
+static_assets.build()
+
+
+@app.template_global()
+def asset_url(filename):
+    """Fingerprinted URL of a static file (plain /static/ URL if it was not built)"""
+    return static_assets.url(filename) or url_for('static', filename=filename)
+
+
+# /api/chat/batch: prompts per batch, and concurrent batch calls per provider (per process)
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+batch_pools = batch.ProviderPools(
+    batch.parse_concurrency(os.getenv('BATCH_CONCURRENCY', '')),
+    default=int(os.getenv('BATCH_DEFAULT_CONCURRENCY', 8)),
+)
+
+# /api/chat/arena: models answering one prompt side by side (one streaming thread each)
+ARENA_MAX_MODELS = int(os.getenv('ARENA_MAX_MODELS', 4))
+_arena_pool = ThreadPoolExecutor(max_workers=int(os.getenv('ARENA_POOL_WORKERS', 32)), thread_name_prefix='arena')
+
+# Per-provider deadline for the concurrent provider=all catalog fan-out
+MODEL_FETCH_TIMEOUT = float(os.getenv('MODEL_FETCH_TIMEOUT', 5))
+# One thread per provider: at most one fetch per provider runs here (see _catalog_lookup)
+_catalog_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='catalog')
+_catalog_fetches = {}
+_catalog_fetches_lock = threading.Lock()
+
+
+def _list_models(provider, client):
+    """Return the cached model catalog for a provider"""
+    metrics.CATALOG_REQUESTS.labels(provider).inc()
+    # Concurrent cold/expired lookups share one upstream fetch
+    fetch = functools.partial(catalog_flight.do, provider, client.fetch_models)
+    return model_catalog.get(provider, fetch, client.FALLBACK_MODELS)
+
+
+def _catalog_lookup(provider, client):
+    """
+    A future for a provider's catalog in the provider=all fan-out
+
+    A catalog that can be served without waiting resolves at once. Otherwise
+    every request shares the one fetch for that provider on _catalog_pool, so
+    a hung provider holds a single pool thread instead of one per request.
+    """
+    metrics.CATALOG_REQUESTS.labels(provider).inc()
+    fetch = functools.partial(catalog_flight.do, provider, client.fetch_models)
+    models = model_catalog.peek(provider, fetch)
+    if models is not None:
+        future = Future()
+        future.set_result(models)
+        return future
+    with _catalog_fetches_lock:
+        future = _catalog_fetches.get(provider)
+        if future is None:
+            future = _catalog_pool.submit(model_catalog.get, provider, fetch, client.FALLBACK_MODELS)
+            _catalog_fetches[provider] = future
+    future.add_done_callback(functools.partial(_catalog_fetched, provider))
+    return future
+
+
+def _catalog_fetched(provider, future):
+    with _catalog_fetches_lock:
+        if _catalog_fetches.get(provider) is future:
+            del _catalog_fetches[provider]
+
+
+def _catalog_partial(providers):
+    """Providers answered from the static fallback list or an expired catalog, with the live fetch error"""
+    partial = {}
+    for provider in providers:
+        error = model_catalog.failure(provider)
+        if error is not None:
+            partial[provider] = error
+    return partial
+
+
+# Completion budget reserved when packing the context window
+DEFAULT_MAX_TOKENS = 1024
+DEFAULT_TEMPERATURE = 0.7
+
+
+def _cache_answer(answer_key, provider, model, messages, max_tokens, temperature, answer):
+    """Cache a routed answer under the route that actually produced it"""
+    text, answered_provider, answered_model = answer
+    if (answered_provider, answered_model) != (provider, model):
+        # A failover or hedge answer must not be served later as the requested model's
+        answer_key = request_key(answered_provider, answered_model, messages, temperature, max_tokens)
+    response_cache.put(answer_key, {'message': text, 'provider': answered_provider, 'model': answered_model})
+
+
+def _ask_and_cache(answer_key, provider, model, messages, max_tokens, temperature, **options):
+    """Answer a cacheable chat once for all identical requests in flight, then cache it"""
+    def ask():
+        answer = chat_router.chat(provider, model, messages, max_tokens, temperature, **options)
+        _cache_answer(answer_key, provider, model, messages, max_tokens, temperature, answer)
+        return answer
+    return chat_flight.do(answer_key, ask)
+
+
+# Request parsing, validation and bookkeeping below are shared with asgi.py: they
+# take plain values (body, headers, clients) instead of reading the request, and
+# the ones that may block (conversation store, disk caches) are run off the
+# event loop there.
+
+def _chat_params(data):
+    """Return (message, model, max_tokens, temperature, provider) from a chat request body"""
+    provider = (data.get('provider') or 'groq').lower()
+    if provider == 'groq' and groq_client is None and gemini_client is not None:
+        # Fallback to Gemini if Groq is not configured
+        provider = 'gemini'
+    return (
+        data.get('message'),
+        data.get('model', 'mixtral-8x7b-32768'),
+        int(data.get('max_tokens') or DEFAULT_MAX_TOKENS),
+        float(data.get('temperature', DEFAULT_TEMPERATURE)),
+        provider,
+    )
+
+
+def _cache_allowed(data, headers):
+    """False if the request opts out of the response cache ("cache": false or Cache-Control: no-cache)"""
+    if data.get('cache') is False:
+        return False
+    return 'no-cache' not in headers.get('Cache-Control', '').lower()
+
+
+def _lookup_answer(use_cache, provider, model, messages, temperature, max_tokens):
+    """
+    Look a chat up in the response cache (reads the disk tier, if configured)
+
+    Returns (X-Cache status, answer key, cached answer); the key is None when
+    the request bypasses the cache.
+    """
+    if not (use_cache and response_cache.cacheable(temperature)):
+        metrics.RESPONSE_CACHE.labels('bypass').inc()
+        return 'BYPASS', None, None
+    answer_key = request_key(provider, model, messages, temperature, max_tokens)
+    cached, tier = response_cache.get(answer_key)
+    metrics.RESPONSE_CACHE.labels(tier or 'miss').inc()
+    return ('HIT' if cached is not None else 'MISS'), answer_key, cached
+
+
+def _context_window(provider, model):
+    """Context window of a model, as reported by its cached catalog entry if available"""
+    reported = None
+    entry = model_catalog.entry(provider)
+    if entry is not None:
+        info = entry.find(model)
+        if info:
+            reported = info.get('context_length')
+    return context_window(model, reported)
+
+
+def _pack_context(provider, model, conv, prompt, max_tokens):
+    """Pack the newest turns of a conversation plus the prompt into the model's context window"""
+    return pack_conversation(conv, prompt, _context_window(provider, model), max_tokens)
+
+
+def _pack_turn(provider, model, conv, prompt, max_tokens):
+    """_pack_context() under the conversation's lock (waits for a write in progress)"""
+    with conv.lock:
+        return _pack_context(provider, model, conv, prompt, max_tokens)
+
+
+def _record_turn(conv, user_entry, answer, model):
+    """Append a completed turn to the conversation; returns (timestamp, seq of the answer)"""
+    timestamp = datetime.now().isoformat()
+    seq = conversation_store.append(conv, user_entry, Message('assistant', answer, timestamp, model)) + 1
+    return timestamp, seq
+
+
+def _observe_answer(provider, messages, answer):
+    """Count the characters sent to and received from a provider"""
+    metrics.REQUEST_CHARS.labels(provider).observe(metrics.message_chars(messages))
+    metrics.RESPONSE_CHARS.labels(provider).observe(len(answer or ''))
+
+
+def _stream_done(timestamp, seq, provider, model, context, started, first_token, finished):
+    """Payload of a chat stream's done event (headers went out before the answer, so timing rides here)"""
+    first_token = first_token or finished
+    return {
+        'timestamp': timestamp, 'seq': seq, 'provider': provider, 'model': model, 'context': context,
+        'timing': {'upstream_ttfb_ms': round((first_token - started) * 1000, 1),
+                   'upstream_generation_ms': round((finished - first_token) * 1000, 1)},
+    }
+
+
+def _get_provider_client(provider, clients=None):
+    """Return (client, error_message) for the requested chat provider (from this app's clients by default)"""
+    clients = chat_router.clients if clients is None else clients
+    if provider not in PROVIDERS:
+        return None, f'Unknown provider: {provider}'
+    if provider == 'gemini':
+        if not clients.get('gemini'):
+            return None, 'Gemini client not configured. Set GEMINI_API_KEY.'
+        return clients['gemini'], None
+    if provider == 'openrouter':
+        if not clients.get('openrouter'):
+            return None, 'OpenRouter client not configured. Set OPENROUTER_API_KEY.'
+        return clients['openrouter'], None
+    if not clients.get('groq'):
+        return None, 'Groq client not configured. Set GROQ_API_KEY.'
+    return clients['groq'], None
+
+
+def _arena_params(data, clients):
+    """Return (message, max_tokens, temperature, runs) from an arena request body (raises ValueError)"""
+    user_message = data.get('message')
+    max_tokens = int(data.get('max_tokens') or DEFAULT_MAX_TOKENS)
+    temperature = float(data.get('temperature', DEFAULT_TEMPERATURE))
+    if not user_message:
+        raise ValueError('Message is required')
+    runs = []
+    for slot, (provider, model) in enumerate(arena.parse_contenders(data.get('contenders'), ARENA_MAX_MODELS)):
+        client, error = _get_provider_client(provider, clients)
+        if error:
+            raise ValueError(error)
+        runs.append(arena.ContenderRun(slot, provider, model, client))
+    return user_message, max_tokens, temperature, runs
+
+
+def _pack_arena(conv, user_entry, runs, max_tokens):
+    """Pack the conversation once for every contender: the smallest window keeps the history fair and fitting"""
+    window = min(_context_window(run.provider, run.model) for run in runs)
+    with conv.lock:
+        return pack_conversation(conv, user_entry, window, max_tokens)
+
+
+def _arena_outcome(router, run, messages):
+    """Record an ended contender with the router; returns its (event, payload)"""
+    if run.error is not None:
+        router.record(run.provider, run.model, error=run.error)
+        return 'error', run.result()
+    router.record(run.provider, run.model, latency=run.finished - run.started)
+    _observe_answer(run.provider, messages, run.text)
+    return 'result', run.result()
+
+
+def _arena_finish(conv, user_entry, runs, context):
+    """Append the recorded contender's answer (if any); returns the done payload"""
+    winner = arena.recorded(runs)
+    timestamp = datetime.now().isoformat()
+    seq = None
+    if winner is not None:
+        seq = conversation_store.append(
+            conv, user_entry, Message('assistant', winner.text, timestamp, winner.model)) + 1
+    return {'timestamp': timestamp, 'seq': seq, 'context': context,
+            'recorded': winner.slot if winner is not None else None}
+
+
+def _batch_problem(items):
+    """(error message, status) if a batch body's items cannot be accepted, else None"""
+    if not isinstance(items, list) or not items:
+        return 'items must be a non-empty list', 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return f'At most {BATCH_MAX_ITEMS} items per batch', 413
+    return None
+
+
+def _batch_entries(items, data, clients, received):
+    """Each item parsed into a BatchItem, or its rejected result line, in request order"""
+    entries = []
+    for index, raw in enumerate(items):
+        try:
+            item = batch.parse_item(index, raw, data, 'mixtral-8x7b-32768', DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE)
+            if item.provider == 'groq' and not clients.get('groq') and clients.get('gemini'):
+                # Fallback to Gemini if Groq is not configured
+                item.provider = 'gemini'
+            _, error = _get_provider_client(item.provider, clients)
+            if error:
+                raise ValueError(error)
+        except ValueError as e:
+            # Rejected before dispatch; reported with the other results
+            entries.append(batch.rejected(index, raw, str(e), received))
+            continue
+        entries.append(item)
+    return entries
+
+
+def _batch_result(item, received, started, answer=None, cached=False, error=None):
+    """Result line of a batch item that was answered (or failed with error)"""
+    result = {'index': item.index, 'id': item.id}
+    if error is None:
+        result.update(success=True, message=answer[0], provider=answer[1], model=answer[2], cached=cached)
+        metrics.BATCH_ITEMS.labels(item.provider, 'cached' if cached else 'ok').inc()
     else:
-        print(f"[WARNING] OPENROUTER_API_KEY not found in environment")
-        openrouter_client = None
-except Exception as e:
-    print(f"[ERROR] OpenRouter client initialization failed: {e}")
-    import traceback
-    traceback.print_exc()
-    openrouter_client = None
+        if isinstance(error, RateLimitError):
+            result.update(success=False, error=str(error), status=429, retry_after=error.retry_after)
+        elif isinstance(error, CircuitOpenError):
+            result.update(success=False, error=str(error), status=503)
+        else:
+            result.update(success=False, error=str(error), status=502)
+        metrics.BATCH_ITEMS.labels(item.provider, 'error').inc()
+    result['timing'] = batch.timing(received, started, time.perf_counter())
+    return result
+
+
+def _catalog_results(pending):
+    """(ready providers, partial errors) of catalog lookups after the deadline (futures or asyncio tasks)"""
+    ready = []
+    partial = {}
+    for name, lookup in pending.items():
+        if not lookup.done():
+            partial[name] = 'timeout'
+        elif lookup.exception() is not None:
+            partial[name] = str(lookup.exception())
+        else:
+            ready.append(name)
+    partial.update(_catalog_partial(ready))
+    return ready, partial
+
+
+def _session_owner():
+    """Return the user id stored in the session cookie, assigning one if needed"""
+    owner = session.get('uid')
+    if not owner:
+        owner = ConversationStore.new_owner_id()
+        session['uid'] = owner
+    return owner
+
+
+def _current_conversation():
+    """Return the conversation selected in the session cookie, creating one if needed"""
+    conv = conversation_store.get_or_create(session.get('conversation_id'), _session_owner())
+    if session.get('conversation_id') != conv.id:
+        session['conversation_id'] = conv.id
+    return conv
+
+
+@app.before_request
+def _begin_request_timing():
+    if SERVER_TIMING_ENABLED:
+        timing.start(request.endpoint)
+    slow_request_profiler.begin(request.endpoint)
+
+
+@app.after_request
+def _server_timing(response):
+    """Report the phases timed by the handler (streams report those before the first byte)"""
+    current = timing.finish()
+    if current is not None and current.phases:
+        response.headers['Server-Timing'] = current.header()
+    return response
+
+
+@app.after_request
+def _compress(response):
+    """gzip/brotli-encode JSON bodies for clients that accept it (runs before _server_timing)"""
+    if not COMPRESSION_ENABLED or response.mimetype not in compression.COMPRESSIBLE:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+    encoding = compression.negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    with phase('compress'):
+        body = compression.compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    metrics.COMPRESSED_BYTES.labels(encoding, 'in').inc(len(data))
+    metrics.COMPRESSED_BYTES.labels(encoding, 'out').inc(len(body))
+    return response
+
+
+def _not_modified(etag):
+    """304 response if the request's If-None-Match lists etag (in any encoding), else None"""
+    matched = compression.matching_etag(request.if_none_match, etag)
+    if matched is None:
+        return None
+    metrics.NOT_MODIFIED.labels(request.endpoint).inc()
+    response = Response(status=304)
+    response.set_etag(matched)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+def _with_etag(response, etag=None):
+    """Give a response a strong ETag (a hash of its body by default), or answer 304 if the client has it"""
+    etag = etag or compression.body_etag(response.get_data())
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    response.set_etag(etag)
+    # Kept by the browser but revalidated on every use
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.teardown_request
+def _end_request_profile(error=None):
+    # Runs after a streamed body has been fully sent, so slow streams are profiled too
+    slow_request_profiler.end()
 
-# In-memory storage for chat history (session only)
-chat_history = []
 
 @app.route('/')
 def index():
@@ -51,79 +582,83 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve a fingerprinted static file, precompressed for the client and cached as immutable"""
+    resolved = static_assets.resolve(filename, request.accept_encodings)
+    if resolved is None:
+        return Response('Not found', status=404, mimetype='text/plain')
+    path, mimetype, encoding = resolved
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @app.route('/api/models', methods=['GET'])
 def get_models():
     """Get list of available models from selected provider."""
     try:
         provider = request.args.get('provider', 'groq').lower()
-        print(f"[DEBUG] /api/models called with provider: {provider}")
 
         if provider == 'gemini':
             if not gemini_client:
-                print(f"[DEBUG] Gemini client not configured")
                 return jsonify({'success': False, 'error': 'Gemini client not configured. Set GEMINI_API_KEY.'}), 400
-            models = gemini_client.list_models()
-            print(f"[DEBUG] Gemini models loaded: {len(models)}")
-            return jsonify({'success': True, 'models': models})
+            with phase('catalog'):
+                models = _list_models('gemini', gemini_client)
+            with phase('serialize'):
+                return _with_etag(jsonify({'success': True, 'models': models, 'partial': _catalog_partial(['gemini'])}))
 
         if provider == 'openrouter':
             if not openrouter_client:
-                print(f"[DEBUG] OpenRouter client not configured")
                 return jsonify({'success': False, 'error': 'OpenRouter client not configured. Set OPENROUTER_API_KEY.'}), 400
-            print(f"[DEBUG] Fetching OpenRouter models...")
-            models = openrouter_client.list_models()
-            print(f"[DEBUG] OpenRouter models loaded: {len(models)}")
-            return jsonify({'success': True, 'models': models})
+            with phase('catalog'):
+                models = _list_models('openrouter', openrouter_client)
+            with phase('serialize'):
+                return _with_etag(jsonify({'success': True, 'models': models, 'partial': _catalog_partial(['openrouter'])}))
 
         if provider == 'all':
-            models = []
-            try:
-                groq_models = groq_client.list_models()
-                for m in groq_models:
-                    m_copy = dict(m)
-                    m_copy['provider'] = 'groq'
-                    models.append(m_copy)
-            except Exception:
-                pass
-            try:
-                if gemini_client:
-                    gem_models = gemini_client.list_models()
-                    for m in gem_models:
-                        m_copy = dict(m)
-                        m_copy['provider'] = 'gemini'
-                        models.append(m_copy)
-            except Exception:
-                pass
-            try:
-                if openrouter_client:
-                    or_models = openrouter_client.list_models()
-                    for m in or_models:
-                        m_copy = dict(m)
-                        m_copy['provider'] = 'openrouter'
-                        models.append(m_copy)
-            except Exception:
-                pass
-            return jsonify({'success': True, 'models': models})
+            clients = {
+                'groq': groq_client,
+                'gemini': gemini_client,
+                'openrouter': openrouter_client,
+            }
+            with phase('catalog'):
+                futures = {
+                    name: _catalog_lookup(name, client)
+                    for name, client in clients.items() if client is not None
+                }
+                # Fetch concurrently; a provider that misses the deadline keeps filling
+                # the cache in the background and is reported as partial
+                wait(futures.values(), timeout=MODEL_FETCH_TIMEOUT)
+
+            ready, partial = _catalog_results(futures)
+
+            with phase('serialize'):
+                return _with_etag(jsonify({
+                    'success': True,
+                    'models': model_catalog.merged(ready),
+                    'partial': partial
+                }))
 
         # Default to groq provider
-        models = groq_client.list_models()
-        return jsonify({'success': True, 'models': models})
+        with phase('catalog'):
+            models = _list_models('groq', groq_client)
+        with phase('serialize'):
+            return _with_etag(jsonify({'success': True, 'models': models, 'partial': _catalog_partial(['groq'])}))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages"""
-    global chat_history
-    
     try:
-        data = request.json
-        user_message = data.get('message')
-        selected_model = data.get('model', 'mixtral-8x7b-32768')
-        provider = (data.get('provider') or 'groq').lower()
-        if provider == 'groq' and groq_client is None and gemini_client is not None:
-            # Fallback to Gemini if Groq is not configured
-            provider = 'gemini'
+        with phase('parse'):
+            data = request.json
+            user_message, selected_model, max_tokens, temperature, provider = _chat_params(data)
         
         if not user_message:
             return jsonify({
@@ -131,65 +666,335 @@ def chat():
                 'error': 'Message is required'
             }), 400
         
-        # Add user message to in-memory history
-        chat_history.append({
-            'role': 'user',
-            'content': user_message,
-            'timestamp': datetime.now().isoformat(),
-            'model': selected_model
-        })
+        with phase('history'):
+            conv = _current_conversation()
+            user_entry = Message('user', user_message, datetime.now().isoformat(), selected_model)
+            
+            # Prepare messages for provider API: newest turns that fit the context window
+            messages, context = _pack_turn(provider, selected_model, conv, user_entry, max_tokens)
         
-        # Prepare messages for provider API (includes the latest user message)
-        messages = [{'role': msg['role'], 'content': msg['content']} for msg in chat_history]
+        client, error = _get_provider_client(provider)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
         
-        # Get response from selected provider
-        if provider == 'gemini':
-            if not gemini_client:
-                return jsonify({'success': False, 'error': 'Gemini client not configured. Set GEMINI_API_KEY.'}), 400
-            assistant_message = gemini_client.chat(messages, model=selected_model)
-        elif provider == 'openrouter':
-            if not openrouter_client:
-                return jsonify({'success': False, 'error': 'OpenRouter client not configured. Set OPENROUTER_API_KEY.'}), 400
-            assistant_message = openrouter_client.chat(messages, model=selected_model)
+        # Deterministic requests may be answered from the response cache
+        with phase('cache'):
+            cache_status, answer_key, cached = _lookup_answer(
+                _cache_allowed(data, request.headers), provider, selected_model, messages, temperature, max_tokens)
+        
+        if cached is not None:
+            assistant_message, provider, selected_model = cached['message'], cached['provider'], cached['model']
         else:
-            if not groq_client:
-                return jsonify({'success': False, 'error': 'Groq client not configured. Set GROQ_API_KEY.'}), 400
-            assistant_message = groq_client.chat(messages, model=selected_model)
+            # Rate-limit queueing, hedging and failover included
+            with phase('upstream'):
+                if cache_status == 'MISS':
+                    # Identical cacheable requests already in flight share one upstream call
+                    assistant_message, provider, selected_model = _ask_and_cache(
+                        answer_key, provider, selected_model, messages, max_tokens, temperature)
+                else:
+                    # Get response from selected provider (hedged / failed over to equivalents)
+                    assistant_message, provider, selected_model = chat_router.chat(
+                        provider, selected_model, messages, max_tokens, temperature)
+            _observe_answer(provider, messages, assistant_message)
         
-        # Add assistant message to in-memory history
-        timestamp = datetime.now().isoformat()
-        chat_history.append({
-            'role': 'assistant',
-            'content': assistant_message,
-            'timestamp': timestamp,
-            'model': selected_model
-        })
+        # Record the completed turn in the conversation
+        with phase('store'):
+            timestamp, seq = _record_turn(conv, user_entry, assistant_message, selected_model)
         
-        return jsonify({
-            'success': True,
-            'message': assistant_message,
-            'timestamp': timestamp
-        })
+        with phase('serialize'):
+            response = jsonify({
+                'success': True,
+                'message': assistant_message,
+                'timestamp': timestamp,
+                'seq': seq,
+                'provider': provider,
+                'model': selected_model,
+                'context': context
+            })
+        response.headers['X-Cache'] = cache_status
+        return response
         
+    except RateLimitError as e:
+        return _rate_limited(e)
+    except CircuitOpenError as e:
+        return _circuit_open(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def _circuit_open(error):
+    """503 response for a chat whose provider and every equivalent have an open circuit"""
+    return jsonify({'success': False, 'error': str(error)}), 503
+
+def _rate_limited(error):
+    """429 response for a chat that stayed rate limited until its deadline"""
+    response = jsonify({'success': False, 'error': str(error)})
+    response.status_code = 429
+    if error.retry_after:
+        response.headers['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response
+
+def _sse(event, payload):
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat messages, streaming the response as Server-Sent Events"""
+    data = request.json or {}
+    user_message, selected_model, max_tokens, temperature, provider = _chat_params(data)
+
+    if not user_message:
+        return jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400
+
+    client, error = _get_provider_client(provider)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    # Skip a provider whose circuit is open in favour of a configured equivalent
+    admitted = chat_router.admit(provider, selected_model)
+    if admitted is None:
+        return _circuit_open(CircuitOpenError(provider))
+    (provider, selected_model), probe = admitted
+    client = chat_router.clients[provider]
+
+    try:
+        conv = _current_conversation()
+        user_entry = Message('user', user_message, datetime.now().isoformat(), selected_model)
+        # Prepare messages for provider API: newest turns that fit the context window
+        messages, context = _pack_turn(provider, selected_model, conv, user_entry, max_tokens)
+    except BaseException:
+        # No stream will report an outcome for an admitted probe
+        if probe:
+            chat_router.release(provider)
+        raise
+
+    def generate():
+        parts = []
+        completed = False
+        started = time.perf_counter()
+        first_token = None
+        # Waits for rate-limit capacity; a 429 before the first token is retried
+        upstream = rate_scheduler.run_stream(
+            provider, selected_model, request_tokens(messages, max_tokens),
+            lambda: client.chat_stream(messages, model=selected_model, temperature=temperature, max_tokens=max_tokens))
+        try:
+            with metrics.track_upstream(provider, selected_model, 'stream'):
+                for delta in upstream:
+                    if not parts:
+                        first_token = time.perf_counter()
+                        metrics.TIME_TO_FIRST_TOKEN.labels(
+                            provider, metrics.model_label(provider, selected_model)).observe(first_token - started)
+                    parts.append(delta)
+                    yield _sse('token', {'delta': delta})
+            completed = True
+        except Exception as e:
+            chat_router.record(provider, selected_model, error=e)
+            yield _sse('error', {'error': str(e)})
+        finally:
+            # Runs on normal completion, upstream errors and client disconnects (GeneratorExit);
+            # closing the upstream generator releases the provider connection early.
+            upstream.close()
+            if probe and not completed:
+                # Disconnected or rejected without a counted outcome: give the half-open probe back
+                chat_router.release(provider)
+
+        if not completed:
+            return
+
+        finished = time.perf_counter()
+        chat_router.record(provider, selected_model, latency=finished - started)
+        # Only a fully received answer becomes part of the conversation
+        assistant_message = ''.join(parts)
+        _observe_answer(provider, messages, assistant_message)
+        timestamp, seq = _record_turn(conv, user_entry, assistant_message, selected_model)
+        yield _sse('done', _stream_done(timestamp, seq, provider, selected_model, context,
+                                        started, first_token, finished))
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/chat/arena', methods=['POST'])
+def chat_arena():
+    """Send one prompt to several models at once, streaming their answers interleaved as Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    try:
+        user_message, max_tokens, temperature, runs = _arena_params(data, chat_router.clients)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conv = _current_conversation()
+    user_entry = Message('user', user_message, datetime.now().isoformat(), runs[0].model)
+    messages, context = _pack_arena(conv, user_entry, runs, max_tokens)
+    tokens = request_tokens(messages, max_tokens)
+
+    def open_stream(run):
+        # No failover or hedging: each slot answers with exactly the model that was asked for
+        return rate_scheduler.run_stream(
+            run.provider, run.model, tokens,
+            lambda: run.client.chat_stream(messages, model=run.model, temperature=temperature, max_tokens=max_tokens))
+
+    def generate():
+        yield _sse('start', {'contenders': [run.describe() for run in runs], 'context': context})
+        for run, delta in arena.interleave(runs, open_stream, _arena_pool):
+            if delta is not None:
+                yield _sse('token', {'slot': run.slot, 'delta': delta})
+                continue
+            yield _sse(*_arena_outcome(chat_router, run, messages))
+        yield _sse('done', _arena_finish(conv, user_entry, runs, context))
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def _batch_answer(item, use_cache, received):
+    """Answer one batch item through the router; returns its result line"""
+    started = time.perf_counter()
+    try:
+        _, answer_key, cached = _lookup_answer(
+            use_cache, item.provider, item.model, item.messages, item.temperature, item.max_tokens)
+        if cached is not None:
+            answer = cached['message'], cached['provider'], cached['model']
+        elif answer_key is not None:
+            answer = _ask_and_cache(answer_key, item.provider, item.model, item.messages, item.max_tokens,
+                                    item.temperature, priority=batch.BATCH_PRIORITY, hedge=False)
+        else:
+            # Failover still applies; hedging would spend quota to shave latency nobody waits on
+            answer = chat_router.chat(item.provider, item.model, item.messages, item.max_tokens, item.temperature,
+                                      priority=batch.BATCH_PRIORITY, hedge=False)
+    except Exception as e:
+        return _batch_result(item, received, started, error=e)
+    return _batch_result(item, received, started, answer, cached=cached is not None)
+
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer independent prompts concurrently, streaming NDJSON results as they complete"""
+    received = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    problem = _batch_problem(items)
+    if problem:
+        return jsonify({'success': False, 'error': problem[0]}), problem[1]
+    use_cache = _cache_allowed(data, request.headers)
+
+    futures = []
+    for entry in _batch_entries(items, data, chat_router.clients, received):
+        if isinstance(entry, dict):
+            futures.append(batch.done_future(entry))
+        else:
+            futures.append(batch_pools.submit(entry.provider, _batch_answer, entry, use_cache, received))
+
+    def generate():
+        results = []
+        try:
+            for future in as_completed(futures):
+                results.append(future.result())
+                yield batch.line(results[-1])
+            yield batch.line(batch.summary(results, time.perf_counter() - received))
+        finally:
+            # Client went away: drop the items that have not started yet
+            for future in futures:
+                future.cancel()
+
+    return Response(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def _history_page(conv, since=None, before=None, limit=None):
+    """History payload for a range of a conversation's messages, each tagged with its sequence number"""
+    start, messages = conv.page(since, before, limit)
+    return {
+        'success': True,
+        'session_id': conv.id,
+        'history': [dict(msg.to_dict(), seq=seq) for seq, msg in enumerate(messages, start)],
+        'first_seq': conv.first_seq,
+        'next_seq': conv.next_seq,
+        'has_older': start > conv.first_seq,
+        'has_newer': start + len(messages) < conv.next_seq,
+    }
+
+
+def _history_params(args):
+    """(since, before, limit) from the /api/history query string; raises ValueError for a bad limit"""
+    limit = args.get('limit', type=int)
+    if limit is not None:
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(limit, HISTORY_MAX_PAGE)
+    return args.get('since', type=int), args.get('before', type=int), limit
+
+
+def _history_snapshot(conv, since, before, limit, if_none_match):
+    """
+    (ETag, history payload) of a conversation, read under its lock
+
+    Message numbers are never reused, so the numbered range identifies the
+    content. The payload is None when If-None-Match already lists the ETag.
+    """
+    with conv.lock:
+        etag = f'{conv.id}.{conv.first_seq}.{conv.next_seq}'
+        if compression.matching_etag(if_none_match, etag) is not None:
+            return etag, None
+        return etag, _history_page(conv, since, before, limit)
+
+
+def _switched_history(conv):
+    """History payload of a conversation the client switched to, read under its lock"""
+    with conv.lock:
+        return _history_page(conv)
+
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """Get chat history for current session (in-memory)"""
-    return jsonify({
-        'success': True,
-        'history': chat_history
-    })
+    """
+    Get chat history for the current conversation
+
+    Every message carries its sequence number (`seq`). Without parameters the
+    whole history is returned; `since=<seq>` returns only newer messages (what a
+    client cache is missing), `before=<seq>` older ones, and `limit` pages either.
+    """
+    try:
+        since, before, limit = _history_params(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    conv = _current_conversation()
+    etag, payload = _history_snapshot(conv, since, before, limit, request.if_none_match)
+    if payload is None:
+        not_modified = _not_modified(etag)
+        not_modified.cache_control.private = True
+        return not_modified
+    response = _with_etag(jsonify(payload), etag)
+    response.cache_control.private = True
+    return response
 
 @app.route('/api/clear', methods=['POST'])
 def clear_history():
-    """Clear chat history"""
-    global chat_history
-    chat_history = []
+    """Clear chat history of the current conversation"""
+    conversation_store.clear(_current_conversation())
     
     return jsonify({
         'success': True,
@@ -198,118 +1003,310 @@ def clear_history():
 
 @app.route('/api/new-chat', methods=['POST'])
 def new_chat():
-    """Start a new chat (clear history)"""
-    global chat_history
-    chat_history = []
+    """Start a new chat (previous conversations stay available via /api/sessions)"""
+    conv = conversation_store.create(_session_owner())
+    session['conversation_id'] = conv.id
     
     return jsonify({
         'success': True,
+        'session_id': conv.id,
         'message': 'New chat started'
     })
 
 @app.route('/api/sessions', methods=['GET'])
 def get_sessions():
-    """Get all chat sessions - disabled for no-database mode"""
+    """Get all chat sessions of the current user"""
+    current = _current_conversation()
+    sessions = conversation_store.list(current.owner)
+    for item in sessions:
+        item['active'] = item['id'] == current.id
     return jsonify({
         'success': True,
-        'sessions': []  # No sessions in memory-only mode
+        'sessions': sessions
     })
 
 @app.route('/api/switch-session', methods=['POST'])
 def switch_session():
-    """Switch to a different session - disabled for no-database mode"""
-    return jsonify({
-        'success': False,
-        'error': 'Sessions not available in memory-only mode'
-    }), 501
+    """Switch to a different session of the current user"""
+    data = request.get_json(silent=True) or {}
+    conv = conversation_store.get(data.get('session_id'), _session_owner())
+    if conv is None:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+    
+    session['conversation_id'] = conv.id
+    return jsonify(_switched_history(conv))
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get statistics"""
+    conv = _current_conversation()
     return jsonify({
         'success': True,
         'stats': {
-            'total_messages': len(chat_history),
-            'user_messages': sum(1 for msg in chat_history if msg['role'] == 'user'),
-            'assistant_messages': sum(1 for msg in chat_history if msg['role'] == 'assistant')
+            'total_messages': conv.user_messages + conv.assistant_messages,
+            'user_messages': conv.user_messages,
+            'assistant_messages': conv.assistant_messages
         }
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition, aggregated across gunicorn workers"""
+    body, content_type = metrics.render()
+    return Response(body, mimetype=None, content_type=content_type)
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness probe: the process is up and serving requests (no upstream calls)"""
+    return jsonify({'status': 'alive'}), 200
+
+@app.route('/health/ready', methods=['GET'])
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint for container orchestration"""
-    try:
-        # Check any available provider API (simple model list)
-        if groq_client is not None:
-            _ = groq_client.list_models()
-            provider = 'groq'
-        elif gemini_client is not None:
-            _ = gemini_client.list_models()
-            provider = 'gemini'
-        elif openrouter_client is not None:
-            _ = openrouter_client.list_models()
-            provider = 'openrouter'
-        else:
-            return jsonify({'status': 'unhealthy', 'error': 'No AI provider configured'}), 503
+    """Readiness probe for container orchestration, served from cached provider probes"""
+    providers = provider_prober.snapshot()
+    if not providers:
+        return jsonify({'status': 'unhealthy', 'error': 'No AI provider configured'}), 503
 
-        return jsonify({'status': 'healthy', 'api': provider, 'messages': len(chat_history)}), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'error': str(e)
-        }), 503
+    provider_prober.ensure_started()
+    # Only the very first check in a worker waits (briefly) for the initial probe round
+    provider_prober.wait_first_round(timeout=float(os.getenv('HEALTH_PROBE_WAIT', 5)))
+    providers = provider_prober.snapshot()
+
+    ready = provider_prober.is_ready()
+    api = next((name for name, result in providers.items() if result['healthy']), None)
+    return jsonify({
+        'status': 'healthy' if ready else 'unhealthy',
+        'api': api,
+        'providers': providers,
+        'circuits': chat_router.snapshot(),
+        'rate_limits': rate_scheduler.snapshot(),
+        'messages': conversation_store.total_messages
+    }), 200 if ready else 503
+
+def _audio_response(key, response_format, data=None):
+    """
+    Serve cached audio with a strong ETag and Range support
+
+    Memory-tier bytes are sent directly; disk-tier files go through send_file so
+    the WSGI server can use sendfile. Returns None if the key is not cached.
+    """
+    mimetype = f'audio/{response_format}'
+    if data is None:
+        data = tts_cache.get_bytes(key)
+        if data is not None:
+            metrics.TTS_CACHE.labels('memory').inc()
+
+    if data is None:
+        path = tts_cache.get_path(key, response_format)
+        if path is None:
+            return None
+        metrics.TTS_CACHE.labels('disk').inc()
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=key, max_age=TTS_AUDIO_MAX_AGE)
+    else:
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(key)
+        response.cache_control.max_age = TTS_AUDIO_MAX_AGE
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    # send_file marks responses with a max_age public; the audio belongs to one user
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.headers['Content-Disposition'] = f'inline; filename="speech.{response_format}"'
+    response.headers['X-TTS-Key'] = key
+    return response
+
+def _synthesize_chunk(text, model, voice, response_format):
+    """Synthesize one chunk, reusing chunk audio cached by an earlier request"""
+    key = cache_key(text, model, voice, response_format)
+    audio = tts_cache.get(key, response_format)
+    if audio is None:
+        audio = groq_client.text_to_speech(
+            text=text,
+            model=model,
+            voice=voice,
+            response_format=response_format
+        )
+        metrics.TTS_BYTES.labels(metrics.model_label('groq', model)).inc(len(audio))
+        tts_cache.put(key, audio, response_format)
+    return audio
+
+def _synthesize_chunks(chunks, model, voice, response_format):
+    """Yield chunk audio in order, synthesizing up to TTS_CHUNK_CONCURRENCY at once"""
+    return synthesize_in_order(
+        lambda chunk: _synthesize_chunk(chunk, model, voice, response_format),
+        chunks,
+        _tts_pool,
+        concurrency=TTS_CHUNK_CONCURRENCY
+    )
+
+def _speech_too_long(text):
+    """Error message if text exceeds TTS_MAX_CHARS (None if it may be synthesized)"""
+    if len(text) > TTS_MAX_CHARS:
+        return f'Text is too long for speech ({len(text)} characters, at most {TTS_MAX_CHARS})'
+    return None
+
+def _split_speech(text):
+    return split_text(text, max_chars=TTS_CHUNK_CHARS, first_chunk_chars=TTS_FIRST_CHUNK_CHARS)
+
+def _tts_params(data):
+    return (
+        data.get('text', ''),
+        data.get('model', 'playai-tts'),
+        data.get('voice', 'Fritz-PlayAI'),
+        'wav'
+    )
+
+def _tts_problem(text):
+    """(error message, status) if text cannot be synthesized, else None"""
+    if not text:
+        return 'Text is required', 400
+    too_long = _speech_too_long(text)
+    if too_long:
+        return too_long, 413
+    return None
+
+def _tts_failure(error):
+    """(error payload, status) for a failed synthesis"""
+    error_msg = str(error)
+    
+    # Check for terms acceptance error
+    if 'terms acceptance' in error_msg.lower():
+        return {
+            'success': False,
+            'error': 'TTS requires terms acceptance. Please visit https://console.groq.com/playground?model=playai-tts to accept terms.',
+            'error_type': 'terms_required'
+        }, 403
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
+
+def _tts_error(error):
+    payload, status = _tts_failure(error)
+    return jsonify(payload), status
 
 @app.route('/api/tts', methods=['POST'])
 def text_to_speech():
-    """Convert text to speech using Groq TTS API"""
+    """Convert text to speech using Groq TTS API (returns one complete WAV)"""
     try:
-        data = request.get_json()
-        text = data.get('text', '')
-        model = data.get('model', 'playai-tts')
-        voice = data.get('voice', 'Fritz-PlayAI')
+        with phase('parse'):
+            text, model, voice, response_format = _tts_params(request.get_json())
         
-        if not text:
-            return jsonify({
-                'success': False,
-                'error': 'Text is required'
-            }), 400
+        problem = _tts_problem(text)
+        if problem:
+            return jsonify({'success': False, 'error': problem[0]}), problem[1]
         
-        # Limit text length (Groq supports max 10K characters)
-        if len(text) > 10000:
-            text = text[:10000]
+        key = cache_key(text, model, voice, response_format)
+        metrics.TTS_REQUESTS.labels(metrics.model_label('groq', model)).inc()
         
-        # Call Groq TTS API
-        audio_content = groq_client.text_to_speech(
-            text=text,
-            model=model,
-            voice=voice
-        )
+        with phase('cache'):
+            cached = _audio_response(key, response_format)
+        if cached is not None:
+            return cached
+        metrics.TTS_CACHE.labels('miss').inc()
         
-        # Return audio as WAV file
-        from flask import Response
-        return Response(
-            audio_content,
-            mimetype='audio/wav',
-            headers={
-                'Content-Disposition': 'inline; filename="speech.wav"'
-            }
-        )
+        # Text of any length: chunks are synthesized in parallel and stitched
+        with phase('upstream'):
+            chunks = _split_speech(text)
+            if len(chunks) == 1:
+                audio_content = _synthesize_chunk(chunks[0], model, voice, response_format)
+            else:
+                audio_content = join_wav(_synthesize_chunks(chunks, model, voice, response_format))
+        
+        with phase('serialize'):
+            tts_cache.put(key, audio_content, response_format)
+            return _audio_response(key, response_format, data=audio_content)
         
     except Exception as e:
-        error_msg = str(e)
+        return _tts_error(e)
+
+@app.route('/api/tts/stream', methods=['POST'])
+def text_to_speech_stream():
+    """
+    Prepare streamed speech and return the URL to play it from
+
+    The first chunk is synthesized here so errors (e.g. terms not accepted)
+    come back as JSON; the audio itself is fetched from the returned URL.
+    """
+    try:
+        text, model, voice, response_format = _tts_params(request.get_json())
         
-        # Check for terms acceptance error
-        if 'terms acceptance' in error_msg.lower():
-            return jsonify({
-                'success': False,
-                'error': 'TTS requires terms acceptance. Please visit https://console.groq.com/playground?model=playai-tts to accept terms.',
-                'error_type': 'terms_required'
-            }), 403
+        problem = _tts_problem(text)
+        if problem:
+            return jsonify({'success': False, 'error': problem[0]}), problem[1]
         
-        return jsonify({
-            'success': False,
-            'error': error_msg
-        }), 500
+        key = cache_key(text, model, voice, response_format)
+        metrics.TTS_REQUESTS.labels(metrics.model_label('groq', model)).inc()
+        url = f'/api/tts/stream/{key}.{response_format}'
+        
+        if tts_cache.get_bytes(key) is not None or tts_cache.get_path(key, response_format):
+            return jsonify({'success': True, 'key': key, 'url': url, 'cached': True})
+        
+        chunks = _split_speech(text)
+        first_audio = _synthesize_chunk(chunks[0], model, voice, response_format)
+        if len(chunks) == 1:
+            tts_cache.put(key, first_audio, response_format)
+        else:
+            tts_cache.put_request(key, {'text': text, 'model': model, 'voice': voice})
+        
+        return jsonify({'success': True, 'key': key, 'url': url, 'cached': len(chunks) == 1})
+        
+    except Exception as e:
+        return _tts_error(e)
+
+@app.route('/api/tts/stream/<key>.<response_format>', methods=['GET'])
+def stream_speech(key, response_format):
+    """Stream audio as one WAV, sending each chunk as soon as it is synthesized"""
+    if not is_valid_key(key) or response_format != 'wav':
+        return jsonify({'success': False, 'error': 'Invalid audio key'}), 400
+    
+    cached = _audio_response(key, response_format)
+    if cached is not None:
+        return cached
+    
+    params = tts_cache.get_request(key)
+    if params is None:
+        return jsonify({'success': False, 'error': 'Unknown speech request'}), 404
+    metrics.TTS_CACHE.labels('miss').inc()
+    text, model, voice = params['text'], params['model'], params['voice']
+    
+    def generate():
+        audio_chunks = []
+        
+        def collect():
+            for audio in _synthesize_chunks(_split_speech(text), model, voice, response_format):
+                audio_chunks.append(audio)
+                yield audio
+        
+        try:
+            yield from stream_wav(collect())
+        except Exception as e:
+            # Headers are already sent; end the stream where the audio stops
+            print(f"[ERROR] Streamed TTS failed for {key}: {e}")
+            return
+        # Complete: keep the stitched file so replays are served from the cache
+        tts_cache.put(key, join_wav(audio_chunks), response_format)
+    
+    response = Response(generate(), mimetype=f'audio/{response_format}')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['X-TTS-Key'] = key
+    return response
+
+@app.route('/api/tts/<key>.<response_format>', methods=['GET'])
+def cached_speech(key, response_format):
+    """Replay previously synthesized audio by its content key (supports ETag and Range)"""
+    if not is_valid_key(key) or response_format not in ('wav', 'mp3', 'flac', 'ogg', 'mulaw'):
+        return jsonify({'success': False, 'error': 'Invalid audio key'}), 400
+    response = _audio_response(key, response_format)
+    if response is None:
+        return jsonify({'success': False, 'error': 'Audio not cached'}), 404
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,181 @@
+"""
+Arena mode: one prompt answered by several models at once, streamed interleaved.
+
+/api/chat/arena packs the conversation once, for the smallest context window
+among the selected models. The same PackedMessages goes to every contender.
+It carries both the OpenAI-style list and the Gemini history, so every
+provider can use it. Each contender streams on its own thread (or asyncio
+task), and the deltas are merged into one Server-Sent Events stream as they
+arrive. Every event carries the contender's slot:
+
+    event: start   {"contenders": [{"slot": 0, "provider": "groq", "model": "..."}, ...], "context": {...}}
+    event: token   {"slot": 1, "delta": "..."}
+    event: result  {"slot": 1, "provider": ..., "model": ..., "ttfb_ms": 212.5, "total_ms": 1840.2,
+                    "chars": 1532, "tokens": 385}
+    event: error   {"slot": 2, "provider": ..., "model": ..., "error": "...", "ttfb_ms": null, ...}
+    event: done    {"timestamp": ..., "context": {...}, "recorded": 0}
+
+Only one answer continues the conversation: the one from the first contender
+in the request's order that finished without an error ("recorded").
+"""
+import asyncio
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from context_packer import estimate_tokens
+
+
+def parse_contenders(raw, max_models: int) -> List[Tuple[str, str]]:
+    """Validate [{"provider", "model"}, ...] into distinct (provider, model) pairs (raises ValueError)"""
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('contenders must be a non-empty list of {"provider", "model"} objects')
+    contenders = []
+    for entry in raw:
+        if not isinstance(entry, dict) or not entry.get('model'):
+            raise ValueError('Each contender needs a provider and a model')
+        route = (str(entry.get('provider') or 'groq').lower(), str(entry['model']))
+        if route not in contenders:
+            contenders.append(route)
+    if len(contenders) > max_models:
+        raise ValueError(f'At most {max_models} models per arena round')
+    return contenders
+
+
+class ContenderRun:
+    """Progress and timing of one contender's answer"""
+
+    __slots__ = ('slot', 'provider', 'model', 'client', 'started', 'first_token', 'finished', 'parts', 'error')
+
+    def __init__(self, slot: int, provider: str, model: str, client) -> None:
+        self.slot = slot
+        self.provider = provider
+        self.model = model
+        self.client = client
+        self.started: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.parts: List[str] = []
+        self.error: Optional[BaseException] = None
+
+    def begin(self) -> None:
+        self.started = time.perf_counter()
+
+    def token(self, delta: str) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            metrics.TIME_TO_FIRST_TOKEN.labels(self.provider, metrics.model_label(self.provider, self.model)).observe(
+                self.first_token - self.started)
+        self.parts.append(delta)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.finished = time.perf_counter()
+        self.error = error
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+    def describe(self) -> Dict[str, object]:
+        return {'slot': self.slot, 'provider': self.provider, 'model': self.model}
+
+    def result(self) -> Dict[str, object]:
+        """Payload of the contender's result (or error) event"""
+        def ms(moment):
+            return round((moment - self.started) * 1000, 1) if moment is not None and self.started else None
+
+        text = self.text
+        payload = dict(self.describe(), ttfb_ms=ms(self.first_token), total_ms=ms(self.finished),
+                       chars=len(text), tokens=estimate_tokens(text) if text else 0)
+        if self.error is not None:
+            payload['error'] = str(self.error)
+        return payload
+
+
+def interleave(runs: List[ContenderRun], open_stream, executor):
+    """
+    Stream every contender on the executor and merge their output
+
+    open_stream(run) returns the contender's iterator of text deltas. Yields
+    (run, delta) as deltas arrive and (run, None) once a contender has ended.
+    Closing the generator (client disconnect) stops every contender.
+    """
+    events = queue.Queue()
+    stopped = threading.Event()
+
+    def pump(run):
+        run.begin()
+        error = None
+        try:
+            upstream = open_stream(run)
+            try:
+                with metrics.track_upstream(run.provider, run.model, 'arena'):
+                    for delta in upstream:
+                        if stopped.is_set():
+                            break
+                        run.token(delta)
+                        events.put((run, delta))
+            finally:
+                # Releases the provider connection early when stopped
+                upstream.close()
+        except Exception as e:
+            error = e
+        run.end(error)
+        events.put((run, None))
+
+    futures = [executor.submit(pump, run) for run in runs]
+    try:
+        remaining = len(runs)
+        while remaining:
+            run, delta = events.get()
+            if delta is None:
+                remaining -= 1
+            yield run, delta
+    finally:
+        stopped.set()
+        for future in futures:
+            future.cancel()
+
+
+async def interleave_async(runs: List[ContenderRun], open_stream):
+    """Asyncio counterpart of interleave(): one task per contender, cancelled on disconnect"""
+    events = asyncio.Queue()
+
+    async def pump(run):
+        run.begin()
+        error = None
+        try:
+            upstream = open_stream(run)
+            try:
+                with metrics.track_upstream(run.provider, run.model, 'arena'):
+                    async for delta in upstream:
+                        run.token(delta)
+                        events.put_nowait((run, delta))
+            finally:
+                await upstream.aclose()
+        except Exception as e:
+            error = e
+        run.end(error)
+        events.put_nowait((run, None))
+
+    tasks = [asyncio.ensure_future(pump(run)) for run in runs]
+    try:
+        remaining = len(runs)
+        while remaining:
+            run, delta = await events.get()
+            if delta is None:
+                remaining -= 1
+            yield run, delta
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def recorded(runs: List[ContenderRun]) -> Optional[ContenderRun]:
+    """The answer that continues the conversation: first contender (request order) without an error"""
+    for run in runs:
+        if run.error is None and run.finished is not None and run.parts:
+            return run
+    return None
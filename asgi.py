@@ -0,0 +1,849 @@
+"""
+ASGI entry point: the same routes as app.py served natively on asyncio.
+
+Each upstream call awaits an async provider client (AsyncGroq, httpx.AsyncClient,
+the Gemini SDK's *_async calls) instead of blocking a worker thread, so one
+process can hold thousands of idle upstream waits. Conversations, the model
+catalog, health probes, the TTS cache and metrics are the objects app.py
+creates, and request parsing, validation and bookkeeping are app.py's helpers,
+so both entry points behave identically.
+
+Those helpers are synchronous. Anything that may block (conversation store
+calls and everything done under a conversation's lock, the disk tiers of the
+response and TTS caches) runs in a worker thread so the event loop keeps
+serving other requests.
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn -c gunicorn_config.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from quart import Quart, Response, jsonify, render_template, request, send_file, session, url_for
+from quart.wrappers.response import DataBody
+
+import app as wsgi
+import arena
+import batch
+import compression
+import http_pool
+import metrics
+import timing
+from conversation_store import ConversationStore, Message
+from rate_limiter import RateLimitError, request_tokens
+from router import CircuitOpenError
+from timing import phase
+from static_assets import IMMUTABLE_MAX_AGE
+from tts_cache import cache_key, is_valid_key
+from tts_stream import join_wav, stream_wav_async, synthesize_in_order_async
+
+app = Quart(__name__)
+# Same key and cookie format as the WSGI app, so sessions work across both
+app.secret_key = wsgi.app.secret_key
+
+conversation_store = wsgi.conversation_store
+model_catalog = wsgi.model_catalog
+provider_prober = wsgi.provider_prober
+tts_cache = wsgi.tts_cache
+response_cache = wsgi.response_cache
+catalog_flight = wsgi.catalog_flight
+chat_flight = wsgi.chat_flight
+rate_scheduler = wsgi.rate_scheduler
+static_assets = wsgi.static_assets
+# Same per-provider caps as the WSGI app's batch pools, as semaphores on this event loop
+batch_semaphores = batch.ProviderSemaphores(wsgi.batch_pools.limits, wsgi.batch_pools.default)
+
+
+def _async_client(class_name, sync_client):
+    """The async counterpart of a configured sync client (or None), also built on first use"""
+    if sync_client is None:
+        return None
+    return sync_client.sibling(class_name)
+
+
+groq_client = _async_client('AsyncGroqClient', wsgi.groq_client)
+gemini_client = _async_client('AsyncGeminiClient', wsgi.gemini_client)
+openrouter_client = _async_client('AsyncOpenRouterClient', wsgi.openrouter_client)
+
+chat_router = wsgi.chat_router.with_clients(
+    {'groq': groq_client, 'gemini': gemini_client, 'openrouter': openrouter_client})
+
+# Sync clients keep serving background catalog refreshes (their own threads)
+_sync_clients = {
+    'groq': wsgi.groq_client,
+    'gemini': wsgi.gemini_client,
+    'openrouter': wsgi.openrouter_client,
+}
+
+
+@app.after_serving
+async def close_pools():
+    """Close pooled upstream connections on shutdown"""
+    await http_pool.aclose_all()
+
+
+async def _list_models(provider, client):
+    """Return the cached model catalog for a provider"""
+    metrics.CATALOG_REQUESTS.labels(provider).inc()
+    sync_client = _sync_clients[provider]
+    # Concurrent cold/expired lookups share one upstream fetch
+    return await model_catalog.get_async(
+        provider,
+        lambda: catalog_flight.do_async(provider, client.fetch_models),
+        sync_client.fetch_models,
+        client.FALLBACK_MODELS,
+    )
+
+
+async def _cache_call(cache, fn, *args):
+    """Call a cache method, in a worker thread if the cache has a disk tier (memory lookups stay on the loop)"""
+    if cache.directory:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def _ask_and_cache(answer_key, provider, model, messages, max_tokens, temperature, **options):
+    """Answer a cacheable chat once for all identical requests in flight, then cache it"""
+    async def ask():
+        answer = await chat_router.chat_async(provider, model, messages, max_tokens, temperature, **options)
+        await _cache_call(response_cache, wsgi._cache_answer,
+                          answer_key, provider, model, messages, max_tokens, temperature, answer)
+        return answer
+    return await chat_flight.do_async(answer_key, ask)
+
+
+def _session_owner():
+    """Return the user id stored in the session cookie, assigning one if needed"""
+    owner = session.get('uid')
+    if not owner:
+        owner = ConversationStore.new_owner_id()
+        session['uid'] = owner
+    return owner
+
+
+async def _current_conversation():
+    """Return the conversation selected in the session cookie, creating one if needed"""
+    conv = await asyncio.to_thread(conversation_store.get_or_create, session.get('conversation_id'), _session_owner())
+    if session.get('conversation_id') != conv.id:
+        session['conversation_id'] = conv.id
+    return conv
+
+
+def _get_provider_client(provider):
+    """Return (async client, error_message) for the requested chat provider"""
+    return wsgi._get_provider_client(provider, chat_router.clients)
+
+
+def _circuit_open(error):
+    """503 response for a chat whose provider and every equivalent have an open circuit"""
+    return jsonify({'success': False, 'error': str(error)}), 503
+
+
+def _rate_limited(error):
+    """429 response for a chat that stayed rate limited until its deadline"""
+    response = jsonify({'success': False, 'error': str(error)})
+    response.status_code = 429
+    if error.retry_after:
+        response.headers['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response
+
+
+@app.before_request
+async def _begin_request_timing():
+    # The sampling profiler only sees OS threads, so only Server-Timing applies here
+    if wsgi.SERVER_TIMING_ENABLED:
+        timing.start(request.endpoint)
+
+
+@app.after_request
+async def _server_timing(response):
+    """Report the phases timed by the handler (streams report those before the first byte)"""
+    current = timing.finish()
+    if current is not None and current.phases:
+        response.headers['Server-Timing'] = current.header()
+    return response
+
+
+@app.after_request
+async def _compress(response):
+    """gzip/brotli-encode JSON bodies for clients that accept it (runs before _server_timing)"""
+    if not wsgi.COMPRESSION_ENABLED or response.mimetype not in compression.COMPRESSIBLE:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or not isinstance(response.response, DataBody)
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = await response.get_data()
+    if len(data) < wsgi.COMPRESSION_MIN_BYTES:
+        return response
+    encoding = compression.negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    with phase('compress'):
+        # Large bodies are compressed off the event loop
+        body = (compression.compress(data, encoding) if len(data) < 65536
+                else await asyncio.to_thread(compression.compress, data, encoding))
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    metrics.COMPRESSED_BYTES.labels(encoding, 'in').inc(len(data))
+    metrics.COMPRESSED_BYTES.labels(encoding, 'out').inc(len(body))
+    return response
+
+
+def _not_modified(etag):
+    """304 response if the request's If-None-Match lists etag (in any encoding), else None"""
+    matched = compression.matching_etag(request.if_none_match, etag)
+    if matched is None:
+        return None
+    metrics.NOT_MODIFIED.labels(request.endpoint).inc()
+    response = Response('', status=304)
+    response.set_etag(matched)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+async def _with_etag(response, etag=None):
+    """Give a response a strong ETag (a hash of its body by default), or answer 304 if the client has it"""
+    etag = etag or compression.body_etag(await response.get_data())
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.template_global()
+def asset_url(filename):
+    """Fingerprinted URL of a static file (plain /static/ URL if it was not built)"""
+    return static_assets.url(filename) or url_for('static', filename=filename)
+
+
+@app.route('/')
+async def index():
+    """Render the main chat interface"""
+    return await render_template('index.html')
+
+
+@app.route('/assets/<path:filename>')
+async def fingerprinted_asset(filename):
+    """Serve a fingerprinted static file, precompressed for the client and cached as immutable"""
+    resolved = static_assets.resolve(filename, request.accept_encodings)
+    if resolved is None:
+        return Response('Not found', status=404, mimetype='text/plain')
+    path, mimetype, encoding = resolved
+    # Quart's send_file takes no max_age; the lifetime is set on the response
+    response = await send_file(path, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route('/api/models', methods=['GET'])
+async def get_models():
+    """Get list of available models from selected provider."""
+    try:
+        provider = request.args.get('provider', 'groq').lower()
+
+        if provider in ('gemini', 'openrouter'):
+            client, error = _get_provider_client(provider)
+            if error:
+                return jsonify({'success': False, 'error': error}), 400
+            with phase('catalog'):
+                models = await _list_models(provider, client)
+            with phase('serialize'):
+                return await _with_etag(jsonify({'success': True, 'models': models, 'partial': wsgi._catalog_partial([provider])}))
+
+        if provider == 'all':
+            clients = {
+                'groq': groq_client,
+                'gemini': gemini_client,
+                'openrouter': openrouter_client,
+            }
+            with phase('catalog'):
+                tasks = {
+                    name: asyncio.ensure_future(_list_models(name, client))
+                    for name, client in clients.items() if client is not None
+                }
+                # A provider that misses the deadline keeps filling the cache and is reported as partial
+                if tasks:
+                    await asyncio.wait(tasks.values(), timeout=wsgi.MODEL_FETCH_TIMEOUT)
+
+            ready, partial = wsgi._catalog_results(tasks)
+
+            with phase('serialize'):
+                return await _with_etag(jsonify({
+                    'success': True,
+                    'models': model_catalog.merged(ready),
+                    'partial': partial
+                }))
+
+        # Default to groq provider
+        client, error = _get_provider_client('groq')
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        with phase('catalog'):
+            models = await _list_models('groq', client)
+        with phase('serialize'):
+            return await _with_etag(jsonify({'success': True, 'models': models, 'partial': wsgi._catalog_partial(['groq'])}))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    """Handle chat messages"""
+    try:
+        with phase('parse'):
+            data = await request.get_json()
+            user_message, selected_model, max_tokens, temperature, provider = wsgi._chat_params(data)
+
+        if not user_message:
+            return jsonify({
+                'success': False,
+                'error': 'Message is required'
+            }), 400
+
+        with phase('history'):
+            conv = await _current_conversation()
+            user_entry = Message('user', user_message, datetime.now().isoformat(), selected_model)
+
+            # Prepare messages for provider API: newest turns that fit the context window
+            messages, context = await asyncio.to_thread(
+                wsgi._pack_turn, provider, selected_model, conv, user_entry, max_tokens)
+
+        client, error = _get_provider_client(provider)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        # Deterministic requests may be answered from the response cache
+        with phase('cache'):
+            cache_status, answer_key, cached = await _cache_call(
+                response_cache, wsgi._lookup_answer, wsgi._cache_allowed(data, request.headers),
+                provider, selected_model, messages, temperature, max_tokens)
+
+        if cached is not None:
+            assistant_message, provider, selected_model = cached['message'], cached['provider'], cached['model']
+        else:
+            with phase('upstream'):
+                if cache_status == 'MISS':
+                    # Identical cacheable requests already in flight share one upstream call
+                    assistant_message, provider, selected_model = await _ask_and_cache(
+                        answer_key, provider, selected_model, messages, max_tokens, temperature)
+                else:
+                    assistant_message, provider, selected_model = await chat_router.chat_async(
+                        provider, selected_model, messages, max_tokens, temperature)
+            wsgi._observe_answer(provider, messages, assistant_message)
+
+        # Record the completed turn in the conversation
+        with phase('store'):
+            timestamp, seq = await asyncio.to_thread(
+                wsgi._record_turn, conv, user_entry, assistant_message, selected_model)
+
+        with phase('serialize'):
+            response = jsonify({
+                'success': True,
+                'message': assistant_message,
+                'timestamp': timestamp,
+                'seq': seq,
+                'provider': provider,
+                'model': selected_model,
+                'context': context
+            })
+        response.headers['X-Cache'] = cache_status
+        return response
+
+    except RateLimitError as e:
+        return _rate_limited(e)
+    except CircuitOpenError as e:
+        return _circuit_open(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Handle chat messages, streaming the response as Server-Sent Events"""
+    data = await request.get_json() or {}
+    user_message, selected_model, max_tokens, temperature, provider = wsgi._chat_params(data)
+
+    if not user_message:
+        return jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400
+
+    client, error = _get_provider_client(provider)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    admitted = chat_router.admit(provider, selected_model)
+    if admitted is None:
+        return _circuit_open(CircuitOpenError(provider))
+    (provider, selected_model), probe = admitted
+    client = chat_router.clients[provider]
+
+    try:
+        conv = await _current_conversation()
+        user_entry = Message('user', user_message, datetime.now().isoformat(), selected_model)
+        messages, context = await asyncio.to_thread(
+            wsgi._pack_turn, provider, selected_model, conv, user_entry, max_tokens)
+    except BaseException:
+        # No stream will report an outcome for an admitted probe
+        if probe:
+            chat_router.release(provider)
+        raise
+
+    async def generate():
+        parts = []
+        completed = False
+        started = time.perf_counter()
+        first_token = None
+        upstream = rate_scheduler.run_stream_async(
+            provider, selected_model, request_tokens(messages, max_tokens),
+            lambda: client.chat_stream(messages, model=selected_model, temperature=temperature, max_tokens=max_tokens))
+        try:
+            with metrics.track_upstream(provider, selected_model, 'stream'):
+                async for delta in upstream:
+                    if not parts:
+                        first_token = time.perf_counter()
+                        metrics.TIME_TO_FIRST_TOKEN.labels(
+                            provider, metrics.model_label(provider, selected_model)).observe(first_token - started)
+                    parts.append(delta)
+                    yield wsgi._sse('token', {'delta': delta})
+            completed = True
+        except Exception as e:
+            chat_router.record(provider, selected_model, error=e)
+            yield wsgi._sse('error', {'error': str(e)})
+        finally:
+            # Also runs when the client disconnects (the task is cancelled)
+            await upstream.aclose()
+            if probe and not completed:
+                # Disconnected or rejected without a counted outcome: give the half-open probe back
+                chat_router.release(provider)
+
+        if not completed:
+            return
+
+        finished = time.perf_counter()
+        chat_router.record(provider, selected_model, latency=finished - started)
+        # Only a fully received answer becomes part of the conversation
+        assistant_message = ''.join(parts)
+        wsgi._observe_answer(provider, messages, assistant_message)
+        timestamp, seq = await asyncio.to_thread(
+            wsgi._record_turn, conv, user_entry, assistant_message, selected_model)
+        yield wsgi._sse('done', wsgi._stream_done(timestamp, seq, provider, selected_model, context,
+                                                  started, first_token, finished))
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None  # Long answers may stream for longer than the default body timeout
+    return response
+
+
+@app.route('/api/chat/arena', methods=['POST'])
+async def chat_arena():
+    """Send one prompt to several models at once, streaming their answers interleaved as Server-Sent Events"""
+    data = await request.get_json(silent=True) or {}
+    try:
+        user_message, max_tokens, temperature, runs = wsgi._arena_params(data, chat_router.clients)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conv = await _current_conversation()
+    user_entry = Message('user', user_message, datetime.now().isoformat(), runs[0].model)
+    messages, context = await asyncio.to_thread(wsgi._pack_arena, conv, user_entry, runs, max_tokens)
+    tokens = request_tokens(messages, max_tokens)
+
+    def open_stream(run):
+        return rate_scheduler.run_stream_async(
+            run.provider, run.model, tokens,
+            lambda: run.client.chat_stream(messages, model=run.model, temperature=temperature, max_tokens=max_tokens))
+
+    async def generate():
+        yield wsgi._sse('start', {'contenders': [run.describe() for run in runs], 'context': context})
+        async for run, delta in arena.interleave_async(runs, open_stream):
+            if delta is not None:
+                yield wsgi._sse('token', {'slot': run.slot, 'delta': delta})
+                continue
+            yield wsgi._sse(*wsgi._arena_outcome(chat_router, run, messages))
+        yield wsgi._sse('done', await asyncio.to_thread(wsgi._arena_finish, conv, user_entry, runs, context))
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+
+async def _batch_answer(item, use_cache, received):
+    """Answer one batch item through the router once its provider has a free slot"""
+    async with batch_semaphores.semaphore(item.provider):
+        started = time.perf_counter()
+        try:
+            _, answer_key, cached = await _cache_call(
+                response_cache, wsgi._lookup_answer,
+                use_cache, item.provider, item.model, item.messages, item.temperature, item.max_tokens)
+            if cached is not None:
+                answer = cached['message'], cached['provider'], cached['model']
+            elif answer_key is not None:
+                answer = await _ask_and_cache(answer_key, item.provider, item.model, item.messages, item.max_tokens,
+                                              item.temperature, priority=batch.BATCH_PRIORITY, hedge=False)
+            else:
+                answer = await chat_router.chat_async(
+                    item.provider, item.model, item.messages, item.max_tokens, item.temperature,
+                    priority=batch.BATCH_PRIORITY, hedge=False)
+        except Exception as e:
+            return wsgi._batch_result(item, received, started, error=e)
+        return wsgi._batch_result(item, received, started, answer, cached=cached is not None)
+
+
+@app.route('/api/chat/batch', methods=['POST'])
+async def chat_batch():
+    """Answer independent prompts concurrently, streaming NDJSON results as they complete"""
+    received = time.perf_counter()
+    data = await request.get_json(silent=True) or {}
+    items = data.get('items')
+    problem = wsgi._batch_problem(items)
+    if problem:
+        return jsonify({'success': False, 'error': problem[0]}), problem[1]
+    use_cache = wsgi._cache_allowed(data, request.headers)
+
+    rejected = []
+    tasks = []
+    for entry in wsgi._batch_entries(items, data, chat_router.clients, received):
+        if isinstance(entry, dict):
+            rejected.append(entry)
+        else:
+            tasks.append(asyncio.ensure_future(_batch_answer(entry, use_cache, received)))
+
+    async def generate():
+        results = []
+        try:
+            for result in rejected:
+                results.append(result)
+                yield batch.line(result)
+            for next_done in asyncio.as_completed(tasks):
+                results.append(await next_done)
+                yield batch.line(results[-1])
+            yield batch.line(batch.summary(results, time.perf_counter() - received))
+        finally:
+            # Client went away: cancel the items still waiting or in flight
+            for task in tasks:
+                task.cancel()
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+
+@app.route('/api/history', methods=['GET'])
+async def get_history():
+    """Get chat history for the current conversation (paged with since/before/limit, see app.py)"""
+    try:
+        since, before, limit = wsgi._history_params(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    conv = await _current_conversation()
+    etag, payload = await asyncio.to_thread(
+        wsgi._history_snapshot, conv, since, before, limit, request.if_none_match)
+    if payload is None:
+        not_modified = _not_modified(etag)
+        not_modified.cache_control.private = True
+        return not_modified
+    response = await _with_etag(jsonify(payload), etag)
+    response.cache_control.private = True
+    return response
+
+
+@app.route('/api/clear', methods=['POST'])
+async def clear_history():
+    """Clear chat history of the current conversation"""
+    await asyncio.to_thread(conversation_store.clear, await _current_conversation())
+    return jsonify({
+        'success': True,
+        'message': 'Chat history cleared'
+    })
+
+
+@app.route('/api/new-chat', methods=['POST'])
+async def new_chat():
+    """Start a new chat (previous conversations stay available via /api/sessions)"""
+    conv = await asyncio.to_thread(conversation_store.create, _session_owner())
+    session['conversation_id'] = conv.id
+    return jsonify({
+        'success': True,
+        'session_id': conv.id,
+        'message': 'New chat started'
+    })
+
+
+@app.route('/api/sessions', methods=['GET'])
+async def get_sessions():
+    """Get all chat sessions of the current user"""
+    current = await _current_conversation()
+    sessions = await asyncio.to_thread(conversation_store.list, current.owner)
+    for item in sessions:
+        item['active'] = item['id'] == current.id
+    return jsonify({
+        'success': True,
+        'sessions': sessions
+    })
+
+
+@app.route('/api/switch-session', methods=['POST'])
+async def switch_session():
+    """Switch to a different session of the current user"""
+    data = await request.get_json(silent=True) or {}
+    conv = await asyncio.to_thread(conversation_store.get, data.get('session_id'), _session_owner())
+    if conv is None:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+
+    session['conversation_id'] = conv.id
+    return jsonify(await asyncio.to_thread(wsgi._switched_history, conv))
+
+
+@app.route('/api/stats', methods=['GET'])
+async def get_stats():
+    """Get statistics"""
+    conv = await _current_conversation()
+    return jsonify({
+        'success': True,
+        'stats': {
+            'total_messages': conv.user_messages + conv.assistant_messages,
+            'user_messages': conv.user_messages,
+            'assistant_messages': conv.assistant_messages
+        }
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Prometheus text exposition, aggregated across workers"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@app.route('/health/live', methods=['GET'])
+async def health_live():
+    """Liveness probe: the process is up and serving requests (no upstream calls)"""
+    return jsonify({'status': 'alive'}), 200
+
+
+@app.route('/health/ready', methods=['GET'])
+@app.route('/health', methods=['GET'])
+async def health_check():
+    """Readiness probe for container orchestration, served from cached provider probes"""
+    providers = provider_prober.snapshot()
+    if not providers:
+        return jsonify({'status': 'unhealthy', 'error': 'No AI provider configured'}), 503
+
+    provider_prober.ensure_started()
+    # Only the very first check in a worker waits (briefly) for the initial probe round
+    await asyncio.to_thread(provider_prober.wait_first_round, float(os.getenv('HEALTH_PROBE_WAIT', 5)))
+    providers = provider_prober.snapshot()
+
+    ready = provider_prober.is_ready()
+    api = next((name for name, result in providers.items() if result['healthy']), None)
+    return jsonify({
+        'status': 'healthy' if ready else 'unhealthy',
+        'api': api,
+        'providers': providers,
+        'circuits': chat_router.snapshot(),
+        'rate_limits': rate_scheduler.snapshot(),
+        'messages': conversation_store.total_messages
+    }), 200 if ready else 503
+
+
+async def _audio_response(key, response_format, data=None):
+    """Serve cached audio with a strong ETag and Range support (None if not cached)"""
+    if data is None:
+        data = tts_cache.get_bytes(key)
+        if data is not None:
+            metrics.TTS_CACHE.labels('memory').inc()
+    if data is None:
+        data = await asyncio.to_thread(tts_cache.get, key, response_format)
+        if data is None:
+            return None
+        metrics.TTS_CACHE.labels('disk').inc()
+
+    response = Response(data, mimetype=f'audio/{response_format}')
+    response.set_etag(key)
+    response.cache_control.max_age = wsgi.TTS_AUDIO_MAX_AGE
+    response.cache_control.private = True
+    response.headers['Content-Disposition'] = f'inline; filename="speech.{response_format}"'
+    response.headers['X-TTS-Key'] = key
+    return await response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
+async def _synthesize_chunk(text, model, voice, response_format):
+    """Synthesize one chunk, reusing chunk audio cached by an earlier request"""
+    key = cache_key(text, model, voice, response_format)
+    audio = await asyncio.to_thread(tts_cache.get, key, response_format)
+    if audio is None:
+        audio = await groq_client.text_to_speech(
+            text=text,
+            model=model,
+            voice=voice,
+            response_format=response_format
+        )
+        metrics.TTS_BYTES.labels(metrics.model_label('groq', model)).inc(len(audio))
+        await asyncio.to_thread(tts_cache.put, key, audio, response_format)
+    return audio
+
+
+def _synthesize_chunks(chunks, model, voice, response_format):
+    """Yield chunk audio in order, synthesizing up to TTS_CHUNK_CONCURRENCY at once"""
+    return synthesize_in_order_async(
+        lambda chunk: _synthesize_chunk(chunk, model, voice, response_format),
+        chunks,
+        concurrency=wsgi.TTS_CHUNK_CONCURRENCY
+    )
+
+
+def _tts_error(error):
+    payload, status = wsgi._tts_failure(error)
+    return jsonify(payload), status
+
+
+@app.route('/api/tts', methods=['POST'])
+async def text_to_speech():
+    """Convert text to speech using Groq TTS API (returns one complete WAV)"""
+    try:
+        with phase('parse'):
+            text, model, voice, response_format = wsgi._tts_params(await request.get_json())
+        problem = wsgi._tts_problem(text)
+        if problem:
+            return jsonify({'success': False, 'error': problem[0]}), problem[1]
+        if groq_client is None:
+            return jsonify({'success': False, 'error': 'Groq client not configured. Set GROQ_API_KEY.'}), 400
+
+        key = cache_key(text, model, voice, response_format)
+        metrics.TTS_REQUESTS.labels(metrics.model_label('groq', model)).inc()
+
+        with phase('cache'):
+            cached = await _audio_response(key, response_format)
+        if cached is not None:
+            return cached
+        metrics.TTS_CACHE.labels('miss').inc()
+
+        with phase('upstream'):
+            chunks = wsgi._split_speech(text)
+            audio_chunks = [audio async for audio in _synthesize_chunks(chunks, model, voice, response_format)]
+            audio_content = audio_chunks[0] if len(audio_chunks) == 1 else join_wav(audio_chunks)
+
+        with phase('serialize'):
+            await asyncio.to_thread(tts_cache.put, key, audio_content, response_format)
+            return await _audio_response(key, response_format, data=audio_content)
+
+    except Exception as e:
+        return _tts_error(e)
+
+
+@app.route('/api/tts/stream', methods=['POST'])
+async def text_to_speech_stream():
+    """Prepare streamed speech and return the URL to play it from"""
+    try:
+        text, model, voice, response_format = wsgi._tts_params(await request.get_json())
+        problem = wsgi._tts_problem(text)
+        if problem:
+            return jsonify({'success': False, 'error': problem[0]}), problem[1]
+        if groq_client is None:
+            return jsonify({'success': False, 'error': 'Groq client not configured. Set GROQ_API_KEY.'}), 400
+
+        key = cache_key(text, model, voice, response_format)
+        metrics.TTS_REQUESTS.labels(metrics.model_label('groq', model)).inc()
+        url = f'/api/tts/stream/{key}.{response_format}'
+
+        if (tts_cache.get_bytes(key) is not None
+                or await _cache_call(tts_cache, tts_cache.get_path, key, response_format)):
+            return jsonify({'success': True, 'key': key, 'url': url, 'cached': True})
+
+        # The first chunk is synthesized here so errors come back as JSON
+        chunks = wsgi._split_speech(text)
+        first_audio = await _synthesize_chunk(chunks[0], model, voice, response_format)
+        if len(chunks) == 1:
+            await asyncio.to_thread(tts_cache.put, key, first_audio, response_format)
+        else:
+            await asyncio.to_thread(tts_cache.put_request, key, {'text': text, 'model': model, 'voice': voice})
+
+        return jsonify({'success': True, 'key': key, 'url': url, 'cached': len(chunks) == 1})
+
+    except Exception as e:
+        return _tts_error(e)
+
+
+@app.route('/api/tts/stream/<key>.<response_format>', methods=['GET'])
+async def stream_speech(key, response_format):
+    """Stream audio as one WAV, sending each chunk as soon as it is synthesized"""
+    if not is_valid_key(key) or response_format != 'wav':
+        return jsonify({'success': False, 'error': 'Invalid audio key'}), 400
+
+    cached = await _audio_response(key, response_format)
+    if cached is not None:
+        return cached
+
+    params = await asyncio.to_thread(tts_cache.get_request, key)
+    if params is None or groq_client is None:
+        return jsonify({'success': False, 'error': 'Unknown speech request'}), 404
+    metrics.TTS_CACHE.labels('miss').inc()
+    text, model, voice = params['text'], params['model'], params['voice']
+
+    async def generate():
+        audio_chunks = []
+
+        async def collect():
+            async for audio in _synthesize_chunks(wsgi._split_speech(text), model, voice, response_format):
+                audio_chunks.append(audio)
+                yield audio
+
+        try:
+            async for data in stream_wav_async(collect()):
+                yield data
+        except Exception as e:
+            # Headers are already sent; end the stream where the audio stops
+            print(f"[ERROR] Streamed TTS failed for {key}: {e}")
+            return
+        # Complete: keep the stitched file so replays are served from the cache
+        await asyncio.to_thread(tts_cache.put, key, join_wav(audio_chunks), response_format)
+
+    response = Response(generate(), mimetype=f'audio/{response_format}')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['X-TTS-Key'] = key
+    response.timeout = None
+    return response
+
+
+@app.route('/api/tts/<key>.<response_format>', methods=['GET'])
+async def cached_speech(key, response_format):
+    """Replay previously synthesized audio by its content key (supports ETag and Range)"""
+    if not is_valid_key(key) or response_format not in ('wav', 'mp3', 'flac', 'ogg', 'mulaw'):
+        return jsonify({'success': False, 'error': 'Invalid audio key'}), 400
+    response = await _audio_response(key, response_format)
+    if response is None:
+        return jsonify({'success': False, 'error': 'Audio not cached'}), 404
+    return response
+
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,179 @@
+"""
+Batch chat: many independent prompts fanned out under per-provider concurrency caps.
+
+/api/chat/batch takes a list of prompts, each with its own provider and model,
+and answers them concurrently. Calls to one provider are capped by
+BATCH_CONCURRENCY. The cap is shared by all batches in a worker process, so
+batches cannot crowd out interactive chats. Batch calls also queue behind
+interactive chats for rate-limit capacity (BATCH_PRIORITY). Each result is
+streamed back as one NDJSON line as soon as it completes, and a summary line
+follows the last result:
+
+    {"index": 3, "id": "q3", "success": true, "message": "...", "provider": "groq",
+     "model": "llama-3.1-8b-instant", "cached": false,
+     "timing": {"queued_ms": 120.4, "upstream_ms": 812.0, "total_ms": 932.9}}
+    {"index": 4, "id": 4, "success": false, "error": "Message is required", "status": 400, "timing": {...}}
+    {"done": true, "count": 5, "succeeded": 4, "failed": 1, "elapsed_ms": 1843.2}
+
+Batch prompts are stateless: they are not added to any conversation.
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# Lower runs first in the rate-limit queue; interactive chats use 0
+BATCH_PRIORITY = 10
+
+_ROLES = ('system', 'user', 'assistant')
+
+
+def parse_concurrency(raw: str) -> Dict[str, int]:
+    """Parse a BATCH_CONCURRENCY value ({"groq": 8, "gemini": 4}) into {provider: limit}"""
+    if not raw or not raw.strip():
+        return {}
+    try:
+        data = json.loads(raw)
+        return {provider.strip().lower(): max(1, int(limit)) for provider, limit in data.items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"[WARNING] Ignoring invalid BATCH_CONCURRENCY: {e}")
+        return {}
+
+
+class BatchItem:
+    """One validated prompt of a batch"""
+
+    __slots__ = ('index', 'id', 'provider', 'model', 'messages', 'max_tokens', 'temperature')
+
+    def __init__(self, index, item_id, provider, model, messages, max_tokens, temperature):
+        self.index = index
+        self.id = item_id
+        self.provider = provider
+        self.model = model
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+
+def parse_item(index: int, item, defaults: Dict[str, object], model: str, max_tokens: int,
+               temperature: float) -> BatchItem:
+    """
+    Validate one batch entry (raises ValueError)
+
+    An entry has either a "message" (plus an optional "system" prompt) or a full
+    "messages" list; provider, model, max_tokens, temperature and system fall
+    back to the same keys at the top level of the request, then to the chat defaults.
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Each item must be an object')
+
+    def field(name, fallback=None):
+        value = item.get(name)
+        if value is None:
+            value = defaults.get(name)
+        return fallback if value is None else value
+
+    messages = item.get('messages')
+    if messages is None:
+        message = item.get('message')
+        if not isinstance(message, str) or not message:
+            raise ValueError('Message is required')
+        messages = [{'role': 'user', 'content': message}]
+        system = field('system')
+        if system:
+            messages.insert(0, {'role': 'system', 'content': str(system)})
+    elif not (isinstance(messages, list) and messages and all(
+            isinstance(m, dict) and m.get('role') in _ROLES and isinstance(m.get('content'), str)
+            for m in messages)):
+        raise ValueError('messages must be a non-empty list of {"role", "content"} objects')
+    else:
+        messages = [{'role': m['role'], 'content': m['content']} for m in messages]
+
+    try:
+        return BatchItem(
+            index, item.get('id', index), str(field('provider', 'groq')).lower(), str(field('model', model)),
+            messages, int(field('max_tokens', max_tokens)), float(field('temperature', temperature)))
+    except (TypeError, ValueError):
+        raise ValueError('max_tokens and temperature must be numbers') from None
+
+
+def timing(received: float, started: float, finished: float) -> Dict[str, float]:
+    """Per-item timing: waiting for a concurrency slot, answering, and since the batch arrived"""
+    return {
+        'queued_ms': round((started - received) * 1000, 1),
+        'upstream_ms': round((finished - started) * 1000, 1),
+        'total_ms': round((finished - received) * 1000, 1),
+    }
+
+
+def line(payload: Dict[str, object]) -> str:
+    """One NDJSON line"""
+    return json.dumps(payload) + '\n'
+
+
+def rejected(index: int, item, error: str, received: float) -> Dict[str, object]:
+    """Result line for an item rejected before dispatch"""
+    item_id = item.get('id', index) if isinstance(item, dict) else index
+    return {'index': index, 'id': item_id, 'success': False, 'error': error, 'status': 400,
+            'timing': timing(received, received, received)}
+
+
+def done_future(result) -> Future:
+    """An already completed future (for items rejected before dispatch)"""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class ProviderPools:
+    """One bounded thread pool per provider: at most `limit` batch calls in flight each"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default: int = 8) -> None:
+        self.limits = limits or {}
+        self.default = default
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def limit(self, provider: str) -> int:
+        return self.limits.get(provider, self.default)
+
+    def submit(self, provider: str, fn, *args) -> Future:
+        """Queue a call behind the provider's other batch calls"""
+        return self._pool(provider).submit(fn, *args)
+
+    def _pool(self, provider):
+        # Worker threads don't survive fork; build the pools in the process that uses them
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pools = {}
+                self._pid = os.getpid()
+            pool = self._pools.get(provider)
+            if pool is None:
+                pool = self._pools[provider] = ThreadPoolExecutor(
+                    max_workers=self.limit(provider), thread_name_prefix=f'batch-{provider}')
+            return pool
+
+
+class ProviderSemaphores:
+    """Asyncio counterpart of ProviderPools: one semaphore per provider"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default: int = 8) -> None:
+        self.limits = limits or {}
+        self.default = default
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def semaphore(self, provider: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = self._semaphores[provider] = asyncio.Semaphore(self.limits.get(provider, self.default))
+        return semaphore
+
+
+def summary(results: List[Dict[str, object]], elapsed: float) -> Dict[str, object]:
+    """The closing line of a batch response"""
+    succeeded = sum(1 for r in results if r.get('success'))
+    return {'done': True, 'count': len(results), 'succeeded': succeeded,
+            'failed': len(results) - succeeded, 'elapsed_ms': round(elapsed * 1000, 1)}
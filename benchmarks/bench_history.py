@@ -0,0 +1,78 @@
+"""
+Microbenchmark: per-turn cost of preparing provider payloads vs. history length.
+
+Compares the old approach (rebuild the OpenAI message list and the Gemini
+history from every stored message) with the conversation store's
+incrementally maintained projections and prefix-sum packing.
+
+Usage:
+    python benchmarks/bench_history.py
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_packer import pack_conversation  # noqa: E402
+from conversation_store import ConversationStore, Message  # noqa: E402
+
+TURNS = 200
+WINDOW = 8192
+MAX_TOKENS = 1024
+TEXT = 'The quick brown fox jumps over the lazy dog. ' * 8
+
+
+def rebuild_turn(history):
+    """What app.chat and GeminiClient.chat used to do on every turn"""
+    history.append({'role': 'user', 'content': TEXT, 'timestamp': datetime.now().isoformat(), 'model': 'm'})
+    messages = [{'role': m['role'], 'content': m['content']} for m in history]
+    gemini = []
+    for msg in messages[:-1]:
+        role = 'model' if msg.get('role') == 'assistant' else 'user'
+        gemini.append({'role': role, 'parts': [msg.get('content', '')]})
+    history.append({'role': 'assistant', 'content': TEXT, 'timestamp': datetime.now().isoformat(), 'model': 'm'})
+
+
+def incremental_turn(store, conv):
+    """Current path: pack from cached projections, append one record per message"""
+    prompt = Message('user', TEXT, datetime.now().isoformat(), 'm')
+    pack_conversation(conv, prompt, WINDOW, MAX_TOKENS)
+    store.append(conv, prompt, Message('assistant', TEXT, datetime.now().isoformat(), 'm'))
+
+
+def bench(history_length):
+    # Old approach
+    history = []
+    for _ in range(history_length // 2):
+        history.append({'role': 'user', 'content': TEXT, 'timestamp': '', 'model': 'm'})
+        history.append({'role': 'assistant', 'content': TEXT, 'timestamp': '', 'model': 'm'})
+    start = time.perf_counter()
+    for _ in range(TURNS):
+        rebuild_turn(history)
+        del history[-2:]
+    rebuild_us = (time.perf_counter() - start) / TURNS * 1e6
+
+    # Incremental approach
+    store = ConversationStore(max_messages=history_length + 2 * TURNS + 10, max_chars=10 ** 12)
+    conv = store.create('bench')
+    for _ in range(history_length // 2):
+        store.append(conv, Message('user', TEXT, '', 'm'), Message('assistant', TEXT, '', 'm'))
+    start = time.perf_counter()
+    for _ in range(TURNS):
+        incremental_turn(store, conv)
+    incremental_us = (time.perf_counter() - start) / TURNS * 1e6
+
+    return rebuild_us, incremental_us
+
+
+def main():
+    print(f"{'history':>8} {'rebuild (us/turn)':>18} {'incremental (us/turn)':>22}")
+    for length in (10, 100, 1000, 10000):
+        rebuild_us, incremental_us = bench(length)
+        print(f"{length:>8} {rebuild_us:>18.1f} {incremental_us:>22.1f}")
+
+
+if __name__ == '__main__':
+    main()
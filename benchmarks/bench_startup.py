@@ -0,0 +1,74 @@
+"""
+Benchmark: cold-start cost of importing the app, with and without provider clients.
+
+Each scenario runs in a fresh interpreter, with fake API keys for all three
+providers so every client is configured:
+
+    import    `import app` (provider SDKs and clients are loaded on first use)
+    warm      `import app` + providers.warm_up(), i.e. what a gunicorn master
+              with preload_app pays once before forking (and what every
+              `import app` cost before clients were built lazily)
+    flask     `import flask` alone, for reference
+
+and reports the wall time, peak RSS and the number of loaded modules (median
+of --runs), plus which provider SDKs ended up imported.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'flask': 'import flask',
+    'import': 'import app',
+    'warm': 'import app, providers; providers.warm_up()',
+}
+SDKS = ('groq', 'google.generativeai', 'httpx')
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'sdks': [name for name in {sdks!r} if name in sys.modules],
+}}))
+"""
+
+
+def run(statement):
+    """Run one scenario in a fresh interpreter; returns its measurements"""
+    env = dict(os.environ, GROQ_API_KEY='bench', GEMINI_API_KEY='bench', OPENROUTER_API_KEY='bench')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(statement=statement, sdks=SDKS)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<10} {'time ms':>9} {'peak RSS MB':>12} {'modules':>8}  SDKs loaded")
+    for name, statement in SCENARIOS.items():
+        samples = [run(statement) for _ in range(args.runs)]
+        print(f"{name:<10} {statistics.median(s['ms'] for s in samples):>9.0f} "
+              f"{statistics.median(s['rss_mb'] for s in samples):>12.1f} "
+              f"{statistics.median(s['modules'] for s in samples):>8.0f}  "
+              f"{', '.join(samples[-1]['sdks']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Local stand-ins for the Groq, OpenRouter and Gemini APIs, for load tests.
+
+One HTTP server answers the endpoints the provider clients use, with
+configurable latency, token rate, streaming and error injection, so the app's
+throughput can be measured without spending real quota:
+
+- Groq (OpenAI-compatible): /openai/v1/models, /openai/v1/chat/completions,
+  /openai/v1/audio/speech
+- OpenRouter (OpenAI-compatible): /api/v1/models, /api/v1/chat/completions
+- Gemini (REST): /v1beta/models, /v1beta/models/<model>:generateContent,
+  /v1beta/models/<model>:streamGenerateContent
+
+Point the app at it with:
+    GROQ_BASE_URL=http://127.0.0.1:8090
+    OPENROUTER_BASE_URL=http://127.0.0.1:8090/api/v1
+    GEMINI_BASE_URL=http://127.0.0.1:8090
+
+Usage:
+    python benchmarks/fake_providers.py --port 8090 --latency 0.2 --token-rate 200
+"""
+import argparse
+import json
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_stream import wav_header  # noqa: E402
+
+MODEL = 'fake-model-8192'
+WORD = 'lorem '
+# 16-bit mono PCM at 24 kHz, like the Groq PlayAI voices
+WAV_FMT = struct.pack('<HHIIHH', 1, 1, 24000, 48000, 2, 16)
+GEMINI_PATH = re.compile(r'^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)$')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_arguments(parser)
+    return parser
+
+
+def add_arguments(parser):
+    """Fake-provider options (shared with benchmarks/loadtest.py)"""
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before the first token')
+    parser.add_argument('--token-rate', type=float, default=200.0, help='generated tokens per second')
+    parser.add_argument('--tokens', type=int, default=100, help='tokens per answer')
+    parser.add_argument('--chunk-tokens', type=int, default=5, help='tokens per streamed chunk')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='seconds per speech request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of chats answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of chats answered with 429')
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeProvider/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- plumbing ---------------------------------------------------------
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send(self, status, payload, content_type='application/json', headers=None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type, headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _chunk(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _injected_error(self):
+        """Send an injected 429/500 and return True, or return False"""
+        roll = random.random()
+        if roll < self.config.rate_limit_rate:
+            self._send(429, {'error': {'message': 'Rate limit reached (injected)', 'code': 429}},
+                       headers={'retry-after': '1', 'x-ratelimit-remaining-requests': '0'})
+            return True
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self._send(500, {'error': {'message': 'Internal error (injected)', 'code': 500}})
+            return True
+        return False
+
+    def _token_chunks(self):
+        """Yield (delay, text) for each streamed chunk of an answer"""
+        config = self.config
+        remaining = config.tokens
+        while remaining > 0:
+            count = min(config.chunk_tokens, remaining)
+            remaining -= count
+            yield count / config.token_rate, WORD * count
+
+    def _rate_limit_headers(self):
+        return {
+            'x-ratelimit-limit-tokens': '1000000',
+            'x-ratelimit-remaining-tokens': '999000',
+            'x-ratelimit-reset-tokens': '60ms',
+        }
+
+    # -- routes -----------------------------------------------------------
+
+    def do_HEAD(self):
+        self._send(200, b'')
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/openai/v1/models':
+            self._send(200, {'object': 'list', 'data': [
+                {'id': MODEL, 'object': 'model', 'created': 0, 'owned_by': 'fake', 'active': True},
+            ]})
+        elif path == '/api/v1/models':
+            self._send(200, {'data': [
+                {'id': f'fake/{MODEL}:free', 'name': 'Fake (free)', 'context_length': 8192,
+                 'pricing': {'prompt': '0', 'completion': '0'}},
+            ]})
+        elif path == '/v1beta/models':
+            self._send(200, {'models': [
+                {'name': 'models/fake-gemini', 'displayName': 'Fake Gemini',
+                 'supportedGenerationMethods': ['generateContent', 'streamGenerateContent']},
+            ]})
+        else:
+            self._send(404, {'error': {'message': f'Unknown path {path}'}})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        body = self._body()
+        if path in ('/openai/v1/chat/completions', '/api/v1/chat/completions'):
+            self._openai_chat(body)
+        elif path == '/openai/v1/audio/speech':
+            self._speech(body)
+        else:
+            match = GEMINI_PATH.match(path)
+            if match:
+                self._gemini(match.group(1), match.group(2) == 'streamGenerateContent')
+            else:
+                self._send(404, {'error': {'message': f'Unknown path {path}'}})
+
+    def _openai_chat(self, body):
+        if self._injected_error():
+            return
+        time.sleep(self.config.latency)
+        model = body.get('model', MODEL)
+        usage = {'prompt_tokens': 10, 'completion_tokens': self.config.tokens,
+                 'total_tokens': 10 + self.config.tokens}
+        if not body.get('stream'):
+            time.sleep(self.config.tokens / self.config.token_rate)
+            self._send(200, {
+                'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': model, 'usage': usage,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': WORD * self.config.tokens}}],
+            }, headers=self._rate_limit_headers())
+            return
+
+        headers = dict(self._rate_limit_headers(), **{'Cache-Control': 'no-cache'})
+        self._start_chunked('text/event-stream', headers)
+        for delay, text in self._token_chunks():
+            time.sleep(delay)
+            chunk = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._chunk('data: [DONE]\n\n')
+        self._end_chunked()
+
+    def _gemini(self, model, stream):
+        if self._injected_error():
+            return
+        time.sleep(self.config.latency)
+        usage = {'promptTokenCount': 10, 'candidatesTokenCount': self.config.tokens,
+                 'totalTokenCount': 10 + self.config.tokens}
+
+        def candidate(text):
+            return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]},
+                                    'finishReason': 'STOP', 'index': 0}]}
+
+        if not stream:
+            time.sleep(self.config.tokens / self.config.token_rate)
+            self._send(200, dict(candidate(WORD * self.config.tokens), usageMetadata=usage))
+            return
+
+        # The REST transport streams one JSON array of responses
+        self._start_chunked('application/json')
+        self._chunk('[')
+        first = True
+        for delay, text in self._token_chunks():
+            time.sleep(delay)
+            self._chunk(('' if first else ',\n') + json.dumps(candidate(text)))
+            first = False
+        self._chunk(('' if first else ',\n') + json.dumps(dict(candidate(''), usageMetadata=usage)) + ']')
+        self._end_chunked()
+
+    def _speech(self, body):
+        time.sleep(self.config.tts_latency)
+        # About 60 ms of silence per input character
+        pcm = bytes(int(len(body.get('input', '')) * 0.06 * 48000) & ~1)
+        self._send(200, wav_header(WAV_FMT, len(pcm)) + pcm, content_type='audio/wav')
+
+
+def serve(config):
+    """Start the fake provider server in a background thread; returns the server"""
+    server = ThreadingHTTPServer((config.host, config.port), FakeProviderHandler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name='fake-providers', daemon=True).start()
+    return server
+
+
+def environment(config):
+    """Environment variables that point the app's provider clients at the server"""
+    origin = f"http://{config.host}:{config.port}"
+    return {
+        'GROQ_API_KEY': 'fake', 'GEMINI_API_KEY': 'fake', 'OPENROUTER_API_KEY': 'fake',
+        'GROQ_BASE_URL': origin,
+        'OPENROUTER_BASE_URL': f"{origin}/api/v1",
+        'GEMINI_BASE_URL': origin,
+    }
+
+
+def main():
+    config = build_parser().parse_args()
+    serve(config)
+    print(f"Fake providers listening on http://{config.host}:{config.port}")
+    for name, value in environment(config).items():
+        print(f"  {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
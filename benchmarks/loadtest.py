@@ -0,0 +1,213 @@
+"""
+Load test: throughput and latency of /api/chat, /api/models and /api/tts.
+
+Starts the fake providers (benchmarks/fake_providers.py), serves the app with
+gunicorn against them and drives the selected endpoints from concurrent
+virtual users (each with its own session cookie and keep-alive connection).
+With several --configs the same load runs against each worker configuration
+in turn and the results are printed side by side:
+
+    sync     gunicorn sync workers (one request per worker)
+    gthread  gunicorn gthread workers (GUNICORN_THREADS per worker)
+    gevent   gunicorn gevent workers via wsgi_gevent.py
+
+Usage:
+    python benchmarks/loadtest.py --configs sync,gthread,gevent --concurrency 32 --duration 20
+    python benchmarks/loadtest.py --target http://127.0.0.1:5000 --endpoints chat
+
+With --target the app (and its providers) must already be running.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_providers  # noqa: E402
+
+CONFIGS = {
+    'sync': ('sync', 'app:app'),
+    'gthread': ('gthread', 'app:app'),
+    'gevent': ('gevent', 'wsgi_gevent:app'),
+}
+PROVIDER_MODELS = {
+    'groq': fake_providers.MODEL,
+    'openrouter': f'fake/{fake_providers.MODEL}:free',
+    'gemini': 'fake-gemini',
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--target', help='URL of an already running app (skips starting servers)')
+    parser.add_argument('--configs', default='gthread', help='comma-separated: ' + ', '.join(CONFIGS))
+    parser.add_argument('--endpoints', default='chat,models,tts', help='comma-separated: chat, stream, models, tts')
+    parser.add_argument('--provider', default='groq', choices=sorted(PROVIDER_MODELS))
+    parser.add_argument('--concurrency', type=int, default=16, help='virtual users')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds of load per configuration')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--app-port', type=int, default=5077)
+    fake = parser.add_argument_group('fake providers')
+    fake_providers.add_arguments(fake)
+    return parser
+
+
+class Results:
+    """Latencies and failures per endpoint, collected from all virtual users"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed):
+        """{endpoint: (requests, errors, req/s, p50, p95, p99)} with latencies in ms"""
+        rows = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+
+            def pct(q):
+                return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+            rows[endpoint] = (len(samples), self.errors.get(endpoint, 0), len(samples) / elapsed,
+                              pct(0.50), pct(0.95), pct(0.99))
+        return rows
+
+
+def make_request(client, endpoint, provider, n):
+    """Send one request; returns True on success"""
+    if endpoint == 'models':
+        response = client.get('/api/models', params={'provider': 'all'})
+    elif endpoint == 'tts':
+        # Unique text so every request is synthesized rather than served from the TTS cache
+        response = client.post('/api/tts', json={'text': f'Benchmark sentence number {n}. ' * 3})
+    elif endpoint == 'stream':
+        body = {'message': f'Question {n}', 'provider': provider, 'model': PROVIDER_MODELS[provider]}
+        with client.stream('POST', '/api/chat/stream', json=body) as response:
+            payload = b''.join(response.iter_bytes())
+        return response.status_code == 200 and b'event: done' in payload
+    else:
+        response = client.post('/api/chat', json={
+            'message': f'Question {n}', 'provider': provider, 'model': PROVIDER_MODELS[provider],
+            'cache': False,
+        })
+    return response.status_code == 200
+
+
+def drive(base_url, endpoints, provider, concurrency, duration):
+    """Run the load; returns (Results, elapsed seconds)"""
+    results = Results()
+    deadline = time.perf_counter() + duration
+    counter = iter(range(10 ** 12))
+    counter_lock = threading.Lock()
+
+    def user(index):
+        with httpx.Client(base_url=base_url, timeout=120.0) as client:
+            turn = index
+            while time.perf_counter() < deadline:
+                endpoint = endpoints[turn % len(endpoints)]
+                turn += 1
+                with counter_lock:
+                    n = next(counter)
+                started = time.perf_counter()
+                try:
+                    ok = make_request(client, endpoint, provider, n)
+                except httpx.HTTPError:
+                    ok = False
+                results.record(endpoint, time.perf_counter() - started, ok)
+
+    started = time.perf_counter()
+    users = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def start_app(name, args, env):
+    """Start gunicorn with one worker configuration and wait until it is live"""
+    worker_class, entry_point = CONFIGS[name]
+    env = dict(env, WORKER_CLASS=worker_class, PORT=str(args.app_port),
+               GUNICORN_WORKERS=str(args.workers), GUNICORN_THREADS=str(args.threads),
+               HTTP_POOL_PREWARM='false', LOG_LEVEL='warning')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--access-logfile', os.devnull,
+         entry_point],
+        cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{args.app_port}'
+    for _ in range(200):
+        try:
+            if httpx.get(f'{base_url}/health/live', timeout=1.0).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn ({name}) exited with status {process.returncode}')
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({name}) did not become live')
+
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def print_table(runs):
+    header = f"{'config':<10} {'endpoint':<8} {'requests':>9} {'errors':>7} {'req/s':>8} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, rows in runs:
+        for endpoint, (count, errors, rate, p50, p95, p99) in rows.items():
+            print(f"{name:<10} {endpoint:<8} {count:>9} {errors:>7} {rate:>8.1f} "
+                  f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+
+def main():
+    args = build_parser().parse_args()
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+
+    if args.target:
+        results, elapsed = drive(args.target, endpoints, args.provider, args.concurrency, args.duration)
+        print_table([('target', results.summary(elapsed))])
+        return
+
+    fake_providers.serve(args)
+    env = dict(os.environ, **fake_providers.environment(args))
+    runs = []
+    for name in [c.strip() for c in args.configs.split(',') if c.strip()]:
+        print(f"Running {name} ({args.concurrency} users, {args.duration:.0f}s)...", file=sys.stderr)
+        try:
+            process, base_url = start_app(name, args, env)
+        except RuntimeError as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            continue
+        try:
+            results, elapsed = drive(base_url, endpoints, args.provider, args.concurrency, args.duration)
+        finally:
+            stop_app(process)
+        runs.append((name, results.summary(elapsed)))
+    print_table(runs)
+
+
+if __name__ == '__main__':
+    main()
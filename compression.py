@@ -0,0 +1,68 @@
+"""
+Content-Encoding negotiation for JSON responses.
+
+JSON bodies above a size threshold are compressed when the client accepts
+gzip or brotli. Brotli is preferred at equal quality and is used only if the
+optional `brotli` package is installed. Dynamic responses use fast settings
+(gzip 6, brotli 5). Static assets are compressed once at build time with the
+maximum settings (see static_assets.py).
+
+A strong ETag must differ between encodings of the same resource, so a
+compressed response carries its identity ETag with the encoding appended
+("<etag>-gzip", "<etag>-br"). etag_variants() lists every form a client may
+send back in If-None-Match.
+"""
+import gzip
+import hashlib
+from typing import Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('application/json',)
+
+# Dynamic responses trade ratio for speed; precompressed assets use the maximum
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+GZIP_MAX_LEVEL = 9
+BROTLI_MAX_QUALITY = 11
+
+
+def encodings() -> Tuple[str, ...]:
+    """Supported encodings, most preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings) -> Optional[str]:
+    """Best supported encoding for a parsed Accept-Encoding header (None means send identity)"""
+    return accept_encodings.best_match(encodings())
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """Compress a body; `best` uses the slowest, smallest settings (for build-time assets)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_MAX_QUALITY if best else BROTLI_QUALITY)
+    # mtime=0 keeps the output deterministic, so identical bodies compress identically
+    return gzip.compress(data, compresslevel=GZIP_MAX_LEVEL if best else GZIP_LEVEL, mtime=0)
+
+
+def body_etag(data: bytes) -> str:
+    """Strong ETag value for a response body"""
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def etag_variants(etag: str) -> Tuple[str, ...]:
+    """The identity ETag and its per-encoding forms"""
+    return (etag,) + tuple(f'{etag}-{encoding}' for encoding in ('gzip', 'br'))
+
+
+def matching_etag(if_none_match, etag: str) -> Optional[str]:
+    """The form of etag listed in a parsed If-None-Match header (None if it does not match)"""
+    if not if_none_match:
+        return None
+    for variant in etag_variants(etag):
+        if if_none_match.contains(variant):
+            return variant
+    return None
@@ -0,0 +1,143 @@
+"""
+Token-budgeted context window packing.
+
+Instead of sending a conversation's entire history on every turn, keep the
+newest messages that fit the model's context window while leaving room for
+the completion (max_tokens). Token counts are estimated cheaply from message
+length once per stored message, and a conversation's running token prefix
+sum lets the cut point be found with a binary search instead of a walk over
+the history.
+"""
+import hashlib
+import re
+from bisect import bisect_left
+from typing import Dict, Optional, Tuple
+
+# Rough heuristic: ~4 characters per token for English text
+CHARS_PER_TOKEN = 4
+# Per-message framing overhead (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Headroom for estimation error
+SAFETY_MARGIN_TOKENS = 256
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Known context windows for Groq and Gemini models (OpenRouter reports context_length)
+MODEL_CONTEXT_WINDOWS = {
+    # Groq
+    'mixtral-8x7b-32768': 32768,
+    'llama2-70b-4096': 4096,
+    'gemma-7b-it': 8192,
+    'gemma2-9b-it': 8192,
+    'llama3-70b-8192': 8192,
+    'llama3-8b-8192': 8192,
+    'llama-3.1-8b-instant': 131072,
+    'llama-3.1-70b-versatile': 131072,
+    'llama-3.3-70b-versatile': 131072,
+    'llama-guard-3-8b': 8192,
+    # Gemini
+    'gemini-1.5-flash': 1048576,
+    'gemini-1.5-flash-8b': 1048576,
+    'gemini-1.5-pro': 2097152,
+    'gemini-2.0-flash': 1048576,
+    'gemini-2.0-flash-exp': 1048576,
+    'gemini-2.0-flash-lite': 1048576,
+}
+
+# Model ids like "llama3-70b-8192" encode their window as a trailing number
+_WINDOW_SUFFIX = re.compile(r'-(\d{4,7})$')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def extend_digest(digest: bytes, role: str, content: str) -> bytes:
+    """Running digest of a message history, extended by one more message"""
+    entry = f'{role}\0{content}'.encode('utf-8', 'surrogatepass')
+    return hashlib.blake2b(digest + entry, digest_size=16).digest()
+
+
+def context_window(model: str, reported: Optional[int] = None) -> int:
+    """
+    Resolve the context window of a model
+
+    Args:
+        model: Model ID
+        reported: Context length reported by the provider's catalog, if any
+
+    Returns:
+        Context window in tokens
+    """
+    if reported:
+        return int(reported)
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    match = _WINDOW_SUFFIX.search(model)
+    if match:
+        return int(match.group(1))
+    return DEFAULT_CONTEXT_WINDOW
+
+
+class PackedMessages(list):
+    """
+    OpenAI-style message list that also carries the matching Gemini history
+
+    Providers that speak the OpenAI format use it as a plain list;
+    GeminiClient picks up ``gemini_history`` instead of converting again, and
+    ``conversation_id`` to continue a live chat session for the conversation.
+    ``history_key`` (seq of the first packed message, running digest of the
+    history before the prompt) identifies exactly which history was packed.
+    """
+
+    def __init__(self, messages, gemini_history=None, conversation_id=None, history_key=None):
+        super().__init__(messages)
+        self.gemini_history = gemini_history
+        self.conversation_id = conversation_id
+        self.history_key = history_key
+
+
+def pack_conversation(conv, prompt, window: int, max_tokens: int) -> Tuple[PackedMessages, Dict[str, int]]:
+    """
+    Select the newest turns of a stored conversation that fit, plus the new prompt
+
+    Uses the conversation's token prefix sums and cached projections, so the
+    cost depends on how many messages are kept, not on the history length.
+
+    Args:
+        conv: Conversation (from conversation_store) holding the prior turns
+        prompt: New user Message being sent
+        window: Model context window in tokens
+        max_tokens: Tokens reserved for the completion
+
+    Returns:
+        (PackedMessages for the provider API, packing stats with kept/trimmed/tokens/budget)
+    """
+    budget = max(window - max_tokens - SAFETY_MARGIN_TOKENS, 0)
+    prefix = conv.token_prefix
+    total = prefix[-1]
+    count = len(conv.messages)
+
+    # Smallest start index whose suffix (plus the prompt) fits in the budget
+    need = total + prompt.tokens - budget
+    start = bisect_left(prefix, need, 0, count) if need > prefix[0] else 0
+    start = min(start, count)
+
+    # Don't open the context with an orphaned assistant reply
+    if start < count and conv.messages[start].role == 'assistant':
+        start += 1
+
+    prompt_message = {'role': prompt.role, 'content': prompt.content}
+    messages = PackedMessages(
+        conv.openai_messages[start:] + [prompt_message],
+        gemini_history=conv.gemini_history[start:],
+        conversation_id=conv.id,
+        history_key=(conv.first_seq + start, conv.history_digest[count]),
+    )
+    stats = {
+        'kept': count - start + 1,
+        'trimmed': start,
+        'tokens': total - prefix[start] + prompt.tokens,
+        'budget': budget,
+    }
+    return messages, stats
@@ -0,0 +1,297 @@
+"""
+Conversation store shared by all worker processes through SQLite in WAL mode.
+
+Every gunicorn worker opens the same database file. A user's turns are
+therefore visible whichever worker serves the next request, and history
+survives worker recycling and restarts. Each worker still keeps the hot
+conversations in the in-process ConversationStore, with their message records,
+provider projections and token prefix sums, so packing a context window never
+touches the database.
+
+Every write bumps the conversation's version counter in the same transaction.
+A cached conversation is checked against its row with one primary-key lookup
+per request. When another worker has written to it since, only the new
+messages are read, and the front is dropped if the conversation was trimmed or
+cleared.
+
+Appends are not batched across requests. Each append is one BEGIN IMMEDIATE
+transaction, holding the database write lock and the conversation's lock. It
+writes a turn's user and assistant messages and the row update together. What
+that commit costs depends on `synchronous`:
+
+    off     no fsync; a power loss can lose recent turns (never corrupts in WAL mode)
+    normal  no fsync per commit; a WAL checkpoint fsyncs many turns at once
+            (default; safe against process crashes)
+    full    fsync on every commit, i.e. on every turn
+
+The calls block, so asgi.py runs them in a worker thread.
+
+The per-conversation message cap and the per-user conversation cap apply to
+the database. The conversation and character caps bound each worker's cache;
+evicting from the cache loses nothing.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import metrics
+from conversation_store import Conversation, ConversationStore, Message
+
+SYNC_MODES = ('off', 'normal', 'full', 'extra')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL,
+    first_seq INTEGER NOT NULL,
+    next_seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_owner ON conversations (owner, updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    model TEXT,
+    PRIMARY KEY (conversation_id, seq)
+) WITHOUT ROWID;
+"""
+
+_ROW = 'SELECT owner, title, created_at, updated_at, version, first_seq, next_seq FROM conversations WHERE id = ?'
+
+
+class SQLiteConversationStore(ConversationStore):
+    """ConversationStore whose conversations live in a SQLite database shared by all workers"""
+
+    def __init__(self, path: str, synchronous: str = 'normal', busy_timeout: float = 5.0, **kwargs) -> None:
+        """
+        Args:
+            path: Database file (created if missing; every worker must see the same file)
+            synchronous: fsync policy: off, normal or full (see module docstring)
+            busy_timeout: Seconds to wait for another worker's write to finish
+            **kwargs: ConversationStore caps
+        """
+        super().__init__(**kwargs)
+        if synchronous.lower() not in SYNC_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNC_MODES)}, got {synchronous!r}")
+        self.path = path
+        self.synchronous = synchronous.upper()
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Closed again right away: a connection must not be carried into forked workers
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(f'PRAGMA synchronous={self.synchronous}')
+        return db
+
+    def _db(self) -> sqlite3.Connection:
+        """This thread's connection (connections are never shared across threads or processes)"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.db = self._connect()
+            local.pid = os.getpid()
+        return local.db
+
+    @contextmanager
+    def _transaction(self, mode: str = 'IMMEDIATE'):
+        """Run a block in one transaction (IMMEDIATE for writes, DEFERRED for a consistent read)"""
+        db = self._db()
+        db.execute(f'BEGIN {mode}')
+        try:
+            yield db
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+
+    def get(self, conversation_id: Optional[str], owner: str) -> Optional[Conversation]:
+        """Return an owner's conversation, read through the cache and brought up to date"""
+        if not conversation_id:
+            return None
+        row = self._db().execute(_ROW, (conversation_id,)).fetchone()
+        if row is None or row[0] != owner:
+            if row is None:
+                # Deleted by another worker (per-user cap); drop the cached copy too
+                with self._lock:
+                    self._remove_locked(conversation_id)
+            return None
+        conv = super().get(conversation_id, owner)
+        if conv is None:
+            metrics.CONVERSATION_CACHE.labels('load').inc()
+            return self._load(conversation_id, owner)
+        if conv.version == row[4]:
+            metrics.CONVERSATION_CACHE.labels('hit').inc()
+            return conv
+        metrics.CONVERSATION_CACHE.labels('refresh').inc()
+        with conv.lock, self._transaction('DEFERRED') as db:
+            self._sync(conv, db)
+        return conv
+
+    def create(self, owner: str, conversation_id: Optional[str] = None) -> Conversation:
+        """Create a conversation, dropping the owner's oldest ones beyond the per-user cap"""
+        with self._transaction() as db:
+            if conversation_id and db.execute(_ROW, (conversation_id,)).fetchone() is not None:
+                # Taken (by another owner): never adopt someone else's conversation
+                conversation_id = None
+            conv = super().create(owner, conversation_id)
+            self._save_row(db, conv, 1, insert=True)
+            stale = self._delete_over_cap(db, owner)
+        conv.version = 1
+        self._forget(stale)
+        return conv
+
+    def list(self, owner: str) -> List[Dict[str, object]]:
+        """Summaries of an owner's conversations across all workers, most recently updated first"""
+        rows = self._db().execute(
+            'SELECT id, title, next_seq - first_seq, created_at, updated_at FROM conversations '
+            'WHERE owner = ? ORDER BY updated_at DESC', (owner,))
+        return [
+            {'id': cid, 'title': title, 'message_count': count, 'created_at': created_at, 'updated_at': updated_at}
+            for cid, title, count, created_at, updated_at in rows
+        ]
+
+    def append(self, conv: Conversation, *messages: Message) -> int:
+        """Append messages in one IMMEDIATE transaction, after catching up with other workers' writes
+
+        One call per turn (the user and assistant messages together); calls are
+        not batched with other requests. Blocks on the database write lock and
+        the commit, so async callers run it in a thread.
+
+        Returns the sequence number of the first appended message.
+        """
+        stale = []
+        with conv.lock:
+            try:
+                with self._transaction() as db:
+                    row = self._sync(conv, db)
+                    # A row deleted while the request was waiting is stored again in full
+                    pending = list(messages) if row is not None else conv.messages + list(messages)
+                    start = conv.next_seq - (len(pending) - len(messages))
+                    db.executemany(
+                        'INSERT INTO messages (conversation_id, seq, role, content, timestamp, model) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        [(conv.id, seq, m.role, m.content, m.timestamp, m.model)
+                         for seq, m in enumerate(pending, start)])
+                    first_seq = conv.first_seq
+                    seq = super().append(conv, *messages)
+                    if conv.first_seq > first_seq:
+                        db.execute('DELETE FROM messages WHERE conversation_id = ? AND seq < ?',
+                                   (conv.id, conv.first_seq))
+                    version = row[4] + 1 if row is not None else 1
+                    self._save_row(db, conv, version, insert=row is None)
+                    if row is None:
+                        stale = self._delete_over_cap(db, conv.owner)
+            except Exception:
+                # The cached copy may now be ahead of the database; reload it on next use
+                conv.version = -1
+                raise
+            conv.version = version
+        self._forget(stale)
+        return seq
+
+    def clear(self, conv: Conversation) -> None:
+        """Remove every message from a conversation, including ones written by other workers"""
+        stale = []
+        with conv.lock:
+            with self._transaction() as db:
+                row = self._sync(conv, db)
+                super().clear(conv)
+                db.execute('DELETE FROM messages WHERE conversation_id = ?', (conv.id,))
+                version = row[4] + 1 if row is not None else 1
+                self._save_row(db, conv, version, insert=row is None)
+                if row is None:
+                    stale = self._delete_over_cap(db, conv.owner)
+            conv.version = version
+        self._forget(stale)
+
+    def _delete_over_cap(self, db, owner):
+        """Delete an owner's least recently updated conversations beyond the per-user cap; returns their ids"""
+        stale = [cid for (cid,) in db.execute(
+            'SELECT id FROM conversations WHERE owner = ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?',
+            (owner, self.max_per_owner))]
+        for cid in stale:
+            db.execute('DELETE FROM messages WHERE conversation_id = ?', (cid,))
+            db.execute('DELETE FROM conversations WHERE id = ?', (cid,))
+        return stale
+
+    def _forget(self, stale):
+        """Drop deleted conversations from this worker's cache (after the deleting transaction committed)"""
+        if stale:
+            with self._lock:
+                for cid in stale:
+                    self._remove_locked(cid)
+
+    def _save_row(self, db, conv, version, insert):
+        values = (conv.title, conv.updated_at, version, conv.first_seq, conv.next_seq, conv.id)
+        if insert:
+            db.execute(
+                'INSERT INTO conversations (title, updated_at, version, first_seq, next_seq, id, owner, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', values + (conv.owner, conv.created_at))
+        else:
+            db.execute(
+                'UPDATE conversations SET title = ?, updated_at = ?, version = ?, first_seq = ?, next_seq = ? '
+                'WHERE id = ?', values)
+
+    def _load(self, conversation_id, owner):
+        """Read a conversation into the cache"""
+        conv = Conversation(conversation_id, owner)
+        conv.version = -1
+        with self._transaction('DEFERRED') as db:
+            row = self._sync(conv, db)
+        if row is None:
+            return None
+        conv.created_at = row[2]
+        with self._lock:
+            cached = self._conversations.get(conversation_id)
+            if cached is not None:
+                # Another thread loaded it first
+                return cached
+            self._adopt_locked(conv)
+            self._evict_locked(keep=conv.id)
+        return conv
+
+    def _sync(self, conv, db):
+        """Bring a conversation up to date with its row; returns the row (None if deleted)
+
+        The caller holds conv.lock and runs this inside a transaction.
+        """
+        row = db.execute(_ROW, (conv.id,)).fetchone()
+        if row is None or row[4] == conv.version:
+            return row
+        _, title, _, updated_at, version, first_seq, next_seq = row
+        chars, count = conv.chars, len(conv.messages)
+        if first_seq >= conv.next_seq or next_seq < conv.next_seq:
+            # Cleared, trimmed past everything cached, or cached ahead of a failed write
+            conv._reset()
+            conv.next_seq = conv.first_seq = first_seq
+        elif first_seq > conv.first_seq:
+            conv._drop_front(first_seq - conv.first_seq)
+        for role, content, timestamp, model in db.execute(
+                'SELECT role, content, timestamp, model FROM messages '
+                'WHERE conversation_id = ? AND seq >= ? AND seq < ? ORDER BY seq',
+                (conv.id, conv.next_seq, next_seq)):
+            conv._push(Message(role, content, timestamp, model))
+        conv.title = title
+        conv.updated_at = updated_at
+        conv.version = version
+        with self._lock:
+            if self._conversations.get(conv.id) is conv:
+                self._total_chars += conv.chars - chars
+                self._total_messages += len(conv.messages) - count
+        return row
@@ -0,0 +1,312 @@
+"""
+In-memory, per-session conversation store.
+
+Messages are stored as compact slotted records in an append-only list. Each
+conversation also maintains its OpenAI-style and Gemini-style projections
+and a running token prefix sum incrementally, so a new turn appends one entry
+to each instead of rebuilding provider payloads from the whole history. A
+running digest of the history is extended the same way, so a packed window
+can be identified without hashing it again.
+
+Conversations are keyed by an id kept in the Flask session cookie and owned by
+a per-browser user id. Each conversation has its own lock, and the store as a
+whole is bounded: when the number of conversations or the total amount of
+stored text exceeds its cap, the least recently used idle conversations are
+evicted, so memory stays flat no matter how many users come and go.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from context_packer import estimate_tokens, extend_digest
+
+
+class Message:
+    """One chat message; slotted to keep long histories compact"""
+
+    __slots__ = ('role', 'content', 'timestamp', 'model', 'tokens')
+
+    def __init__(self, role: str, content: str, timestamp: str, model: Optional[str] = None) -> None:
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.model = model
+        self.tokens = estimate_tokens(content)
+
+    def to_dict(self) -> Dict[str, object]:
+        """Public representation used by the history API"""
+        return {
+            'role': self.role,
+            'content': self.content,
+            'timestamp': self.timestamp,
+            'model': self.model,
+        }
+
+
+class Conversation:
+    """A single chat conversation, its provider projections and running counters"""
+
+    def __init__(self, conversation_id: str, owner: str) -> None:
+        self.id = conversation_id
+        self.owner = owner
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Messages are numbered from 0 and numbers are never reused; messages holds
+        # [first_seq, next_seq). version is the shared store's change counter.
+        self.next_seq = 0
+        self.version = 0
+        self._reset()
+        # Held while reading or mutating this conversation's messages
+        self.lock = threading.RLock()
+
+    def _reset(self) -> None:
+        self.messages: List[Message] = []
+        # {'role', 'content'} dicts for OpenAI-compatible APIs (Groq, OpenRouter)
+        self.openai_messages: List[Dict[str, str]] = []
+        # {'role': 'user'|'model', 'parts': [...]} dicts for Gemini chat history
+        self.gemini_history: List[Dict[str, object]] = []
+        # token_prefix[i] = tokens of all messages before messages[i]; len == len(messages) + 1
+        self.token_prefix: List[int] = [0]
+        # history_digest[i] = running digest of all messages before messages[i]; same length
+        self.history_digest: List[bytes] = [b'']
+        self.first_seq = self.next_seq
+        self.title = 'New chat'
+        self.user_messages = 0
+        self.assistant_messages = 0
+        self.chars = 0
+
+    def _push(self, msg: Message) -> None:
+        """Append a message to the history and every projection"""
+        self.messages.append(msg)
+        self.openai_messages.append({'role': msg.role, 'content': msg.content})
+        self.gemini_history.append({
+            'role': 'model' if msg.role == 'assistant' else 'user',
+            'parts': [msg.content],
+        })
+        self.token_prefix.append(self.token_prefix[-1] + msg.tokens)
+        self.history_digest.append(extend_digest(self.history_digest[-1], msg.role, msg.content))
+        self.next_seq += 1
+        if msg.role == 'user':
+            self.user_messages += 1
+            if self.user_messages == 1:
+                text = msg.content.strip().replace('\n', ' ')
+                self.title = text[:60] + ('…' if len(text) > 60 else '')
+        elif msg.role == 'assistant':
+            self.assistant_messages += 1
+        self.chars += len(msg.content)
+
+    def _drop_front(self, count: int) -> int:
+        """Drop the oldest messages; returns the number of characters freed"""
+        freed = 0
+        for msg in self.messages[:count]:
+            freed += len(msg.content)
+            if msg.role == 'user':
+                self.user_messages -= 1
+            elif msg.role == 'assistant':
+                self.assistant_messages -= 1
+        del self.messages[:count]
+        del self.openai_messages[:count]
+        del self.gemini_history[:count]
+        # Prefix sums stay absolute; only differences between entries are used
+        del self.token_prefix[:count]
+        del self.history_digest[:count]
+        self.first_seq += count
+        self.chars -= freed
+        return freed
+
+    def page(self, since: Optional[int] = None, before: Optional[int] = None,
+             limit: Optional[int] = None) -> Tuple[int, List[Message]]:
+        """
+        A range of messages in order, and the sequence number of the first one
+
+        Args:
+            since: Only messages after this sequence number (forward paging from a cursor)
+            before: Only messages before this sequence number (backward paging)
+            limit: At most this many: the oldest ones after `since`, otherwise the newest ones
+
+        The caller holds the lock.
+        """
+        start, end = self.first_seq, self.next_seq
+        if since is not None:
+            start = min(max(start, since + 1), end)
+        if before is not None:
+            end = max(start, min(end, before))
+        if limit is not None:
+            if since is not None:
+                end = min(end, start + limit)
+            else:
+                start = max(start, end - limit)
+        return start, self.messages[start - self.first_seq:end - self.first_seq]
+
+    def summary(self) -> Dict[str, object]:
+        """Lightweight description used by the sessions list"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'message_count': len(self.messages),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class ConversationStore:
+    """Bounded, thread-safe store of conversations with LRU eviction"""
+
+    def __init__(
+        self,
+        max_conversations: int = 10000,
+        max_chars: int = 50_000_000,
+        max_messages: int = 500,
+        max_per_owner: int = 20,
+    ) -> None:
+        """
+        Args:
+            max_conversations: Max conversations held across all users
+            max_chars: Max total message characters held across all conversations
+            max_messages: Max messages kept per conversation (oldest are dropped)
+            max_per_owner: Max conversations kept per user
+        """
+        self.max_conversations = max_conversations
+        self.max_chars = max_chars
+        self.max_messages = max_messages
+        self.max_per_owner = max_per_owner
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._by_owner: Dict[str, List[str]] = {}
+        self._total_chars = 0
+        self._total_messages = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_owner_id() -> str:
+        """Return a fresh random user id for a new browser session"""
+        return secrets.token_urlsafe(16)
+
+    @property
+    def total_messages(self) -> int:
+        return self._total_messages
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def get(self, conversation_id: Optional[str], owner: str) -> Optional[Conversation]:
+        """Return an owner's conversation and mark it recently used"""
+        if not conversation_id:
+            return None
+        with self._lock:
+            conv = self._conversations.get(conversation_id)
+            if conv is None or conv.owner != owner:
+                return None
+            self._conversations.move_to_end(conversation_id)
+            return conv
+
+    def create(self, owner: str, conversation_id: Optional[str] = None) -> Conversation:
+        """Create and register a new conversation for an owner (under conversation_id if it is free)"""
+        with self._lock:
+            if not conversation_id or conversation_id in self._conversations:
+                conversation_id = secrets.token_urlsafe(12)
+            conv = Conversation(conversation_id, owner)
+            self._conversations[conv.id] = conv
+            owned = self._by_owner.setdefault(owner, [])
+            owned.append(conv.id)
+            # Per-user cap: drop that user's oldest conversations first
+            while len(owned) > self.max_per_owner:
+                self._remove_locked(owned[0])
+            self._evict_locked()
+        return conv
+
+    def get_or_create(self, conversation_id: Optional[str], owner: str) -> Conversation:
+        """
+        Return the owner's conversation, creating it again if it is gone
+
+        The id comes from the signed session cookie, so a conversation this
+        process does not hold (evicted, or kept by another worker) is recreated
+        under the same id and the cookie keeps naming it.
+        """
+        return self.get(conversation_id, owner) or self.create(owner, conversation_id)
+
+    def list(self, owner: str) -> List[Dict[str, object]]:
+        """Summaries of an owner's conversations, most recently updated first"""
+        with self._lock:
+            convs = [self._conversations[cid] for cid in self._by_owner.get(owner, [])]
+        return sorted((c.summary() for c in convs), key=lambda s: s['updated_at'], reverse=True)
+
+    def append(self, conv: Conversation, *messages: Message) -> int:
+        """Append messages to a conversation, trimming and evicting to stay within caps
+
+        Returns the sequence number of the first appended message.
+        """
+        with conv.lock:
+            added_chars = 0
+            for msg in messages:
+                conv._push(msg)
+                added_chars += len(msg.content)
+
+            # Trim in batches so the O(n) front deletion is amortized over many turns
+            dropped = 0
+            dropped_chars = 0
+            if len(conv.messages) > self.max_messages:
+                dropped = len(conv.messages) - self.max_messages + self.max_messages // 10
+                dropped = min(dropped, len(conv.messages) - len(messages))
+                dropped_chars = conv._drop_front(dropped)
+
+            conv.updated_at = time.time()
+
+            with self._lock:
+                if conv.id in self._conversations:
+                    self._total_chars += added_chars - dropped_chars
+                    self._total_messages += len(messages) - dropped
+                    self._conversations.move_to_end(conv.id)
+                else:
+                    # Evicted while its request was waiting on the provider; it is active again
+                    self._adopt_locked(conv)
+                self._evict_locked(keep=conv.id)
+            return conv.next_seq - len(messages)
+
+    def clear(self, conv: Conversation) -> None:
+        """Remove every message from a conversation"""
+        with conv.lock:
+            with self._lock:
+                if conv.id in self._conversations:
+                    self._total_chars -= conv.chars
+                    self._total_messages -= len(conv.messages)
+            conv._reset()
+            conv.updated_at = time.time()
+
+    def _adopt_locked(self, conv: Conversation) -> None:
+        """Register a conversation object that is not in the store"""
+        self._conversations[conv.id] = conv
+        self._by_owner.setdefault(conv.owner, []).append(conv.id)
+        self._total_chars += conv.chars
+        self._total_messages += len(conv.messages)
+
+    def _remove_locked(self, conversation_id: str) -> None:
+        conv = self._conversations.pop(conversation_id, None)
+        if conv is None:
+            return
+        owned = self._by_owner.get(conv.owner)
+        if owned is not None:
+            owned.remove(conversation_id)
+            if not owned:
+                del self._by_owner[conv.owner]
+        self._total_chars -= conv.chars
+        self._total_messages -= len(conv.messages)
+
+    def _evict_locked(self, keep: Optional[str] = None) -> None:
+        """Evict least recently used idle conversations until within caps"""
+        if len(self._conversations) <= self.max_conversations and self._total_chars <= self.max_chars:
+            return
+        for conversation_id in list(self._conversations):
+            if len(self._conversations) <= self.max_conversations and self._total_chars <= self.max_chars:
+                break
+            if conversation_id == keep:
+                continue
+            conv = self._conversations[conversation_id]
+            # Skip conversations that a request is currently using
+            if not conv.lock.acquire(blocking=False):
+                continue
+            try:
+                self._remove_locked(conversation_id)
+            finally:
+                conv.lock.release()
@@ -1,12 +1,27 @@
+import asyncio
 import os
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+import metrics
+from context_packer import extend_digest
+from rate_limiter import RateLimitError
 
 
 class GeminiClient:
     """Client for interacting with Google Gemini API using google-generativeai."""
 
+    # Sensible defaults used when the API cannot be reached
+    FALLBACK_MODELS: List[Dict[str, object]] = [
+        {"id": "gemini-2.0-flash-exp", "name": "Gemini 2.0 Flash (exp)", "owned_by": "google", "active": True},
+        {"id": "gemini-1.5-flash", "name": "Gemini 1.5 Flash", "owned_by": "google", "active": True},
+        {"id": "gemini-1.5-pro", "name": "Gemini 1.5 Pro", "owned_by": "google", "active": True},
+    ]
+
     def __init__(self, api_key: str | None = None) -> None:
         self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
@@ -14,7 +29,62 @@ class GeminiClient:
                 "Gemini API key is required. Set GEMINI_API_KEY or GOOGLE_API_KEY environment variable."
             )
 
-        genai.configure(api_key=self.api_key)
+        # GEMINI_BASE_URL points the SDK at another server (e.g. benchmarks/fake_providers.py);
+        # only the REST transport accepts a plain http:// endpoint
+        self.base_url = os.getenv("GEMINI_BASE_URL")
+        if self.base_url:
+            genai.configure(
+                api_key=self.api_key,
+                transport="rest",
+                client_options={"api_endpoint": self.base_url.rstrip("/")},
+            )
+        else:
+            genai.configure(api_key=self.api_key)
+
+        # Per-process reuse: one GenerativeModel per (model, generation config) and,
+        # when enabled, one live ChatSession per conversation so a follow-up turn
+        # only sends the newest message instead of rebuilding the whole history
+        self.model_cache_size = int(os.getenv("GEMINI_MODEL_CACHE_SIZE", 32))
+        self.session_cache_size = int(os.getenv("GEMINI_SESSION_CACHE_SIZE", 1000))
+        self.persistent_sessions = os.getenv("GEMINI_PERSISTENT_SESSIONS", "true").lower() in ("1", "true", "yes", "on")
+        self._models: "OrderedDict[tuple, genai.GenerativeModel]" = OrderedDict()
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch_models(self, include_all: bool = False) -> List[Dict[str, object]]:
+        """Fetch the live Gemini model list (raises on failure).
+
+        If include_all is False (default), only return models that support text generation.
+        """
+        models: List[Dict[str, object]] = []
+        for model in genai.list_models():
+            if not include_all:
+                supported = getattr(model, "supported_generation_methods", []) or []
+                if (
+                    "generateContent" not in supported
+                    and "createContent" not in supported
+                    and "streamGenerateContent" not in supported
+                ):
+                    # Skip embedding or non-generative models for chat usage
+                    continue
+
+            # model.name looks like "models/gemini-1.5-pro-latest"; trim prefix for id
+            name: str = getattr(model, "name", "")
+            model_id = name.split("/")[-1] if name else name
+            display_name = getattr(model, "display_name", None) or model_id
+
+            models.append(
+                {
+                    "id": model_id,
+                    "name": display_name,
+                    "owned_by": "google",
+                    "active": True,
+                }
+            )
+
+        # Sort alphabetically by id for consistency
+        models.sort(key=lambda m: m["id"])  # type: ignore[index]
+        return models
 
     def list_models(self, include_all: bool = False) -> List[Dict[str, object]]:
         """Return Gemini models.
@@ -22,42 +92,10 @@ class GeminiClient:
         If include_all is False (default), only return models that support text generation.
         """
         try:
-            models: List[Dict[str, object]] = []
-            for model in genai.list_models():
-                if not include_all:
-                    supported = getattr(model, "supported_generation_methods", []) or []
-                    if (
-                        "generateContent" not in supported
-                        and "createContent" not in supported
-                        and "streamGenerateContent" not in supported
-                    ):
-                        # Skip embedding or non-generative models for chat usage
-                        continue
-
-                # model.name looks like "models/gemini-1.5-pro-latest"; trim prefix for id
-                name: str = getattr(model, "name", "")
-                model_id = name.split("/")[-1] if name else name
-                display_name = getattr(model, "display_name", None) or model_id
-
-                models.append(
-                    {
-                        "id": model_id,
-                        "name": display_name,
-                        "owned_by": "google",
-                        "active": True,
-                    }
-                )
-
-            # Sort alphabetically by id for consistency
-            models.sort(key=lambda m: m["id"])  # type: ignore[index]
-            return models
+            return self.fetch_models(include_all=include_all)
         except Exception:
             # Provide a sensible fallback list if API fails
-            return [
-                {"id": "gemini-2.0-flash-exp", "name": "Gemini 2.0 Flash (exp)", "owned_by": "google", "active": True},
-                {"id": "gemini-1.5-flash", "name": "Gemini 1.5 Flash", "owned_by": "google", "active": True},
-                {"id": "gemini-1.5-pro", "name": "Gemini 1.5 Pro", "owned_by": "google", "active": True},
-            ]
+            return [dict(m) for m in self.FALLBACK_MODELS]
 
     def chat(
         self,
@@ -70,44 +108,265 @@ class GeminiClient:
 
         messages: List of {"role": "user"|"assistant", "content": str}
         """
-        # Build a chat with history for better context following
+        return self.chat_with_usage(messages, model, temperature, max_tokens)[0]
+
+    def chat_with_usage(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gemini-1.5-flash",
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> Tuple[str, Dict[str, int]]:
+        """Like chat(), but also return the token usage reported by Gemini."""
         try:
-            # Prepare history excluding the last user message (which we'll send as the new turn)
-            history: List[Dict[str, object]] = []
-            if messages:
-                # Map roles: our "assistant" -> Gemini "model"
-                for msg in messages[:-1]:
-                    role = "model" if msg.get("role") == "assistant" else "user"
-                    history.append({"role": role, "parts": [msg.get("content", "")]})
-
-            # Determine the latest user message; if last isn't user, just treat last as prompt
-            last = messages[-1] if messages else {"role": "user", "content": ""}
-            prompt_text = last.get("content", "")
-
-            gemini = genai.GenerativeModel(model)
-            chat = gemini.start_chat(history=history)
-            response = chat.send_message(
-                prompt_text,
-                generation_config={
-                    "temperature": temperature,
-                    "max_output_tokens": max_tokens,
-                },
-            )
+            key, chat, prompt_text = self._checkout_chat(messages, model, temperature, max_tokens)
+            response = chat.send_message(prompt_text)
+            text = self._response_text(response)
+            usage = self._record_usage(model, response)
+            self._checkin_chat(messages, key, chat, text)
+            return text, usage
+        except google_exceptions.ResourceExhausted as exc:
+            raise self._rate_limit_error(exc)
+        except Exception as exc:
+            raise Exception(f"Error getting Gemini chat response: {exc}")
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gemini-1.5-flash",
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> Iterator[str]:
+        """Send chat messages and yield the response text as it is generated.
+
+        Uses streamGenerateContent under the hood (``send_message(stream=True)``).
+        Usage metadata arrives with the final chunk and is recorded once the stream ends.
+        """
+        try:
+            key, chat, prompt_text = self._checkout_chat(messages, model, temperature, max_tokens)
+            response = chat.send_message(prompt_text, stream=True)
 
-            # google-generativeai returns candidates; use text convenience accessor if present
-            if hasattr(response, "text") and isinstance(response.text, str):
-                return response.text
-
-            # Fallback: serialize parts
-            if getattr(response, "candidates", None):
-                candidate = response.candidates[0]
-                if getattr(candidate, "content", None) and getattr(candidate.content, "parts", None):
-                    parts = candidate.content.parts
-                    combined = "\n".join(
-                        [getattr(p, "text", str(p)) for p in parts if getattr(p, "text", None) or str(p)]
-                    )
-                    return combined.strip()
-
-            return ""  # Empty response fallback
+            last = None
+            parts = []
+            for chunk in response:
+                last = chunk
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+            self._record_usage(model, last)
+            # Only a fully consumed stream leaves the session with a coherent history
+            self._checkin_chat(messages, key, chat, "".join(parts))
+        except google_exceptions.ResourceExhausted as exc:
+            raise self._rate_limit_error(exc)
+        except Exception as exc:
+            raise Exception(f"Error getting Gemini streaming response: {exc}")
+
+    def _generative_model(self, model: str, temperature: float, max_tokens: int) -> "genai.GenerativeModel":
+        """Return the cached GenerativeModel for a model and generation config."""
+        key = (model, float(temperature), int(max_tokens))
+        with self._lock:
+            gemini = self._models.get(key)
+            if gemini is not None:
+                self._models.move_to_end(key)
+                return gemini
+        gemini = genai.GenerativeModel(
+            model,
+            generation_config={
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            },
+        )
+        with self._lock:
+            self._models[key] = gemini
+            while len(self._models) > self.model_cache_size:
+                self._models.popitem(last=False)
+        return gemini
+
+    def _checkout_chat(self, messages, model: str, temperature: float, max_tokens: int):
+        """Return (key, ChatSession, prompt) for a request.
+
+        A conversation's live session is reused when it was opened with the same
+        model and config and holds exactly the packed history (the same
+        ``history_key``); otherwise (first turn, window moved, a turn edited or
+        answered by another provider or arena contender, ...) a fresh one is
+        started from the packed history. The session is taken out of the cache
+        while in use, so concurrent turns never share one.
+        """
+        history, prompt_text = self._split_history(messages)
+        key = (model, float(temperature), int(max_tokens))
+        conversation_id = getattr(messages, "conversation_id", None)
+        history_key = getattr(messages, "history_key", None)
+        if self.persistent_sessions and conversation_id is not None and history_key is not None:
+            with self._lock:
+                cached = self._sessions.pop(conversation_id, None)
+            if cached is not None and cached[0] == key and cached[2] == history_key:
+                metrics.GEMINI_SESSIONS.labels("reused").inc()
+                return key, cached[1], prompt_text
+        metrics.GEMINI_SESSIONS.labels("started").inc()
+        chat = self._generative_model(model, temperature, max_tokens).start_chat(history=history)
+        return key, chat, prompt_text
+
+    def _checkin_chat(self, messages, key: tuple, chat, reply: str) -> None:
+        """Keep a session whose turn completed for the conversation's next turn.
+
+        The session now holds the packed history, the prompt and the reply, so
+        it matches the next turn's window only if the conversation stored this
+        reply. Extending the running digest costs only the new turn's text.
+        """
+        conversation_id = getattr(messages, "conversation_id", None)
+        history_key = getattr(messages, "history_key", None)
+        if not self.persistent_sessions or conversation_id is None or history_key is None:
+            return
+        start, digest = history_key
+        digest = extend_digest(extend_digest(digest, "user", messages[-1]["content"]), "assistant", reply)
+        with self._lock:
+            self._sessions[conversation_id] = (key, chat, (start, digest))
+            self._sessions.move_to_end(conversation_id)
+            while len(self._sessions) > self.session_cache_size:
+                self._sessions.popitem(last=False)
+
+    @staticmethod
+    def _rate_limit_error(error) -> RateLimitError:
+        """Turn a 429 (quota exhausted) into a RateLimitError the scheduler can retry."""
+        retry_after: Optional[float] = None
+        # Quota errors carry a google.rpc.RetryInfo detail with the suggested delay
+        for detail in getattr(error, "details", None) or []:
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None:
+                retry_after = delay.seconds + delay.nanos / 1e9
+        return RateLimitError(f"Gemini rate limit exceeded: {error.message}", retry_after=retry_after)
+
+    @staticmethod
+    def _record_usage(model: str, response) -> Dict[str, int]:
+        """Return (and count) the token usage a response or final chunk reports."""
+        metadata = getattr(response, "usage_metadata", None)
+        usage = {
+            "prompt_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+            "completion_tokens": getattr(metadata, "candidates_token_count", 0) or 0,
+            "total_tokens": getattr(metadata, "total_token_count", 0) or 0,
+        }
+        label = metrics.model_label("gemini", model)
+        metrics.TOKENS.labels("gemini", label, "prompt").inc(usage["prompt_tokens"])
+        metrics.TOKENS.labels("gemini", label, "completion").inc(usage["completion_tokens"])
+        return usage
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Return the text of a non-streamed response"""
+        # google-generativeai returns candidates; use text convenience accessor if present
+        if hasattr(response, "text") and isinstance(response.text, str):
+            return response.text
+
+        # Fallback: serialize parts
+        if getattr(response, "candidates", None):
+            candidate = response.candidates[0]
+            if getattr(candidate, "content", None) and getattr(candidate.content, "parts", None):
+                parts = candidate.content.parts
+                combined = "\n".join(
+                    [getattr(p, "text", str(p)) for p in parts if getattr(p, "text", None) or str(p)]
+                )
+                return combined.strip()
+
+        return ""  # Empty response fallback
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Return the text of a streamed chunk ('' for chunks without text parts)"""
+        try:
+            return chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety/finish metadata) raise on .text
+            return ""
+
+    @staticmethod
+    def _split_history(messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, object]], str]:
+        """Convert OpenAI-style messages into Gemini chat history plus the prompt to send.
+
+        Packed message lists carry a ready-made Gemini projection, which is used as-is.
+        """
+        # Prepare history excluding the last user message (which we'll send as the new turn)
+        history: List[Dict[str, object]] = getattr(messages, "gemini_history", None)
+        if history is None:
+            history = []
+            # Map roles: our "assistant" -> Gemini "model"
+            for msg in messages[:-1]:
+                role = "model" if msg.get("role") == "assistant" else "user"
+                history.append({"role": role, "parts": [msg.get("content", "")]})
+
+        # Determine the latest user message; if last isn't user, just treat last as prompt
+        last = messages[-1] if messages else {"role": "user", "content": ""}
+        return history, last.get("content", "")
+
+
+class AsyncGeminiClient(GeminiClient):
+    """Asyncio variant of GeminiClient (uses the SDK's *_async calls)."""
+
+    async def fetch_models(self, include_all: bool = False) -> List[Dict[str, object]]:
+        """Fetch the live Gemini model list (raises on failure)."""
+        # The SDK has no async model listing; keep it off the event loop
+        return await asyncio.to_thread(GeminiClient.fetch_models, self, include_all)
+
+    async def list_models(self, include_all: bool = False) -> List[Dict[str, object]]:
+        """Return Gemini models, falling back to a default list on failure."""
+        try:
+            return await self.fetch_models(include_all=include_all)
+        except Exception:
+            return [dict(m) for m in self.FALLBACK_MODELS]
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gemini-1.5-flash",
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> str:
+        """Send chat messages and return the assistant response text."""
+        return (await self.chat_with_usage(messages, model, temperature, max_tokens))[0]
+
+    async def chat_with_usage(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gemini-1.5-flash",
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> Tuple[str, Dict[str, int]]:
+        """Like chat(), but also return the token usage reported by Gemini."""
+        try:
+            key, chat, prompt_text = self._checkout_chat(messages, model, temperature, max_tokens)
+            response = await chat.send_message_async(prompt_text)
+            text = self._response_text(response)
+            usage = self._record_usage(model, response)
+            self._checkin_chat(messages, key, chat, text)
+            return text, usage
+        except google_exceptions.ResourceExhausted as exc:
+            raise self._rate_limit_error(exc)
         except Exception as exc:
             raise Exception(f"Error getting Gemini chat response: {exc}")
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gemini-1.5-flash",
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> AsyncIterator[str]:
+        """Send chat messages and asynchronously yield the response text as it is generated."""
+        try:
+            key, chat, prompt_text = self._checkout_chat(messages, model, temperature, max_tokens)
+            response = await chat.send_message_async(prompt_text, stream=True)
+
+            last = None
+            parts = []
+            async for chunk in response:
+                last = chunk
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+            self._record_usage(model, last)
+            self._checkin_chat(messages, key, chat, "".join(parts))
+        except google_exceptions.ResourceExhausted as exc:
+            raise self._rate_limit_error(exc)
+        except Exception as exc:
+            raise Exception(f"Error getting Gemini streaming response: {exc}")
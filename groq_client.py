@@ -1,46 +1,68 @@
 import os
-from groq import Groq
+import groq
+from groq import AsyncGroq, Groq
 import httpx
+from http_pool import AsyncHTTPPool, HTTPPool
+from rate_limiter import RateLimitError, parse_duration
 
 class GroqClient:
     """Client for interacting with Groq API"""
     
+    # Default models used when the API cannot be reached
+    FALLBACK_MODELS = [
+        {'id': 'mixtral-8x7b-32768', 'name': 'Mixtral 8x7B', 'owned_by': 'mistralai', 'active': True},
+        {'id': 'llama2-70b-4096', 'name': 'LLaMA2 70B', 'owned_by': 'meta', 'active': True},
+        {'id': 'gemma-7b-it', 'name': 'Gemma 7B', 'owned_by': 'google', 'active': True},
+        {'id': 'llama3-70b-8192', 'name': 'LLaMA3 70B', 'owned_by': 'meta', 'active': True},
+        {'id': 'llama3-8b-8192', 'name': 'LLaMA3 8B', 'owned_by': 'meta', 'active': True}
+    ]
+    
+    # Called as rate_observer(model, headers) after each chat call (see rate_limiter.py)
+    rate_observer = None
+    
     def __init__(self, api_key=None):
         """Initialize Groq client with API key"""
         self.api_key = api_key or os.getenv('GROQ_API_KEY')
         if not self.api_key:
             raise ValueError("Groq API key is required. Set GROQ_API_KEY environment variable.")
         
-        self.client = Groq(api_key=self.api_key)
+        # GROQ_BASE_URL points the client at another server (e.g. benchmarks/fake_providers.py)
+        self.base_url = os.getenv('GROQ_BASE_URL', 'https://api.groq.com').rstrip('/')
+        # 429s are retried by the rate-limit scheduler, not silently inside the SDK
+        self.client = Groq(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        # Keep-alive pool for endpoints the SDK doesn't cover (TTS)
+        self.http = HTTPPool('groq', self.base_url, timeout=30.0)
+    
+    def fetch_models(self):
+        """Fetch the live Groq model list (raises on failure)"""
+        return self._parse_models(self.client.models.list())
+    
+    @staticmethod
+    def _parse_models(models_response):
+        """Convert an SDK model list into model dictionaries"""
+        models = []
+        
+        for model in models_response.data:
+            models.append({
+                'id': model.id,
+                'name': model.id,
+                'owned_by': model.owned_by,
+                'active': model.active if hasattr(model, 'active') else True
+            })
+        
+        # Sort by name
+        models.sort(key=lambda x: x['id'])
+        
+        return models
     
     def list_models(self):
         """List all available Groq models"""
         try:
-            models_response = self.client.models.list()
-            models = []
-            
-            for model in models_response.data:
-                models.append({
-                    'id': model.id,
-                    'name': model.id,
-                    'owned_by': model.owned_by,
-                    'active': model.active if hasattr(model, 'active') else True
-                })
-            
-            # Sort by name
-            models.sort(key=lambda x: x['id'])
-            
-            return models
+            return self.fetch_models()
         except Exception as e:
             print(f"Error listing models: {e}")
             # Return default models if API call fails
-            return [
-                {'id': 'mixtral-8x7b-32768', 'name': 'Mixtral 8x7B', 'owned_by': 'mistralai', 'active': True},
-                {'id': 'llama2-70b-4096', 'name': 'LLaMA2 70B', 'owned_by': 'meta', 'active': True},
-                {'id': 'gemma-7b-it', 'name': 'Gemma 7B', 'owned_by': 'google', 'active': True},
-                {'id': 'llama3-70b-8192', 'name': 'LLaMA3 70B', 'owned_by': 'meta', 'active': True},
-                {'id': 'llama3-8b-8192', 'name': 'LLaMA3 8B', 'owned_by': 'meta', 'active': True}
-            ]
+            return [dict(m) for m in self.FALLBACK_MODELS]
     
     def chat(self, messages, model='mixtral-8x7b-32768', temperature=0.7, max_tokens=1024):
         """
@@ -56,7 +78,7 @@ class GroqClient:
             Assistant's response text
         """
         try:
-            chat_completion = self.client.chat.completions.create(
+            raw = self.client.chat.completions.with_raw_response.create(
                 messages=messages,
                 model=model,
                 temperature=temperature,
@@ -64,9 +86,13 @@ class GroqClient:
                 top_p=1,
                 stream=False
             )
+            self._observe_rate_limits(model, raw.headers)
+            chat_completion = raw.parse()
             
             return chat_completion.choices[0].message.content
         
+        except groq.RateLimitError as e:
+            raise self._rate_limit_error(e)
         except Exception as e:
             raise Exception(f"Error getting chat response: {str(e)}")
     
@@ -84,7 +110,7 @@ class GroqClient:
             Chunks of the response
         """
         try:
-            stream = self.client.chat.completions.create(
+            raw = self.client.chat.completions.with_raw_response.create(
                 messages=messages,
                 model=model,
                 temperature=temperature,
@@ -92,14 +118,33 @@ class GroqClient:
                 top_p=1,
                 stream=True
             )
+            self._observe_rate_limits(model, raw.headers)
+            stream = raw.parse()
             
             for chunk in stream:
                 if chunk.choices[0].delta.content is not None:
                     yield chunk.choices[0].delta.content
         
+        except groq.RateLimitError as e:
+            raise self._rate_limit_error(e)
         except Exception as e:
             raise Exception(f"Error getting streaming chat response: {str(e)}")
     
+    def _observe_rate_limits(self, model, headers):
+        """Report a response's rate-limit headers to the scheduler"""
+        if self.rate_observer is not None:
+            self.rate_observer(model, headers)
+    
+    @staticmethod
+    def _rate_limit_error(error):
+        """Turn an SDK 429 into a RateLimitError the scheduler can retry"""
+        headers = error.response.headers
+        return RateLimitError(
+            f"Groq rate limit exceeded: {error.message}",
+            retry_after=parse_duration(headers.get('retry-after')),
+            headers=headers,
+        )
+    
     def text_to_speech(self, text, model='playai-tts', voice='Fritz-PlayAI', response_format='wav'):
         """
         Convert text to speech using Groq TTS API
@@ -115,28 +160,115 @@ class GroqClient:
         """
         try:
             # Use direct HTTP request since SDK doesn't support TTS yet
-            url = 'https://api.groq.com/openai/v1/audio/speech'
-            headers = {
+            response = self.http.client.post(**self._speech_request(text, model, voice, response_format))
+            return self._speech_content(response)
+        
+        except httpx.HTTPError as e:
+            raise Exception(f"Network error generating speech: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Error generating speech: {str(e)}")
+    
+    def _speech_request(self, text, model, voice, response_format):
+        """Keyword arguments for the TTS POST request"""
+        return {
+            'url': f'{self.base_url}/openai/v1/audio/speech',
+            'headers': {
                 'Authorization': f'Bearer {self.api_key}',
                 'Content-Type': 'application/json'
-            }
-            payload = {
+            },
+            'json': {
                 'model': model,
                 'voice': voice,
                 'input': text,
                 'response_format': response_format
             }
+        }
+    
+    @staticmethod
+    def _speech_content(response):
+        """Return audio bytes from a TTS response, raising on API errors"""
+        if response.status_code != 200:
+            error_data = response.json()
+            error_message = error_data.get('error', {}).get('message', 'Unknown error')
+            raise Exception(f"TTS API error: {error_message}")
+        
+        return response.content
+
+
+class AsyncGroqClient(GroqClient):
+    """Asyncio variant of GroqClient (AsyncGroq SDK + pooled httpx.AsyncClient)"""
+    
+    def __init__(self, api_key=None):
+        """Initialize async Groq client with API key"""
+        self.api_key = api_key or os.getenv('GROQ_API_KEY')
+        if not self.api_key:
+            raise ValueError("Groq API key is required. Set GROQ_API_KEY environment variable.")
+        
+        self.base_url = os.getenv('GROQ_BASE_URL', 'https://api.groq.com').rstrip('/')
+        self.client = AsyncGroq(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        self.http = AsyncHTTPPool('groq', self.base_url, timeout=30.0)
+    
+    async def fetch_models(self):
+        """Fetch the live Groq model list (raises on failure)"""
+        return self._parse_models(await self.client.models.list())
+    
+    async def list_models(self):
+        """List all available Groq models"""
+        try:
+            return await self.fetch_models()
+        except Exception as e:
+            print(f"Error listing models: {e}")
+            return [dict(m) for m in self.FALLBACK_MODELS]
+    
+    async def chat(self, messages, model='mixtral-8x7b-32768', temperature=0.7, max_tokens=1024):
+        """Send chat messages and return the assistant's response text"""
+        try:
+            raw = await self.client.chat.completions.with_raw_response.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=1,
+                stream=False
+            )
+            self._observe_rate_limits(model, raw.headers)
+            chat_completion = await raw.parse()
+            
+            return chat_completion.choices[0].message.content
+        
+        except groq.RateLimitError as e:
+            raise self._rate_limit_error(e)
+        except Exception as e:
+            raise Exception(f"Error getting chat response: {str(e)}")
+    
+    async def chat_stream(self, messages, model='mixtral-8x7b-32768', temperature=0.7, max_tokens=1024):
+        """Send chat messages and asynchronously yield chunks of the response"""
+        try:
+            raw = await self.client.chat.completions.with_raw_response.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=1,
+                stream=True
+            )
+            self._observe_rate_limits(model, raw.headers)
+            stream = await raw.parse()
             
-            with httpx.Client(timeout=30.0) as client:
-                response = client.post(url, headers=headers, json=payload)
-                
-                # Check for errors
-                if response.status_code != 200:
-                    error_data = response.json()
-                    error_message = error_data.get('error', {}).get('message', 'Unknown error')
-                    raise Exception(f"TTS API error: {error_message}")
-                
-                return response.content
+            async for chunk in stream:
+                if chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+        
+        except groq.RateLimitError as e:
+            raise self._rate_limit_error(e)
+        except Exception as e:
+            raise Exception(f"Error getting streaming chat response: {str(e)}")
+    
+    async def text_to_speech(self, text, model='playai-tts', voice='Fritz-PlayAI', response_format='wav'):
+        """Convert text to speech using Groq TTS API; returns audio bytes"""
+        try:
+            response = await self.http.client.post(**self._speech_request(text, model, voice, response_format))
+            return self._speech_content(response)
         
         except httpx.HTTPError as e:
             raise Exception(f"Network error generating speech: {str(e)}")
@@ -3,21 +3,35 @@ Production configuration for Gunicorn
 """
 import multiprocessing
 import os
+import tempfile
 
 # Note: If using 'gevent' worker, monkey patching should be done in a separate
 # pre-fork module or wsgi file, not in this config file (too late).
 # For 'gthread' or 'sync' workers, no monkey patching is needed.
 
+# Prometheus multiprocess metrics: every worker writes samples here and /metrics
+# aggregates them. Must be set before the app (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'groq-chatbot-metrics')
+)
+os.makedirs(metrics_dir, exist_ok=True)
+
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
 backlog = 2048
 
 # Worker processes
 workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Conversations kept in one worker's memory are invisible to the others, so a
+# multi-worker server shares them through SQLite unless configured otherwise
+# (set before the preloaded app creates its store)
+if workers > 1:
+    os.environ.setdefault('CONVERSATION_BACKEND', 'sqlite')
 # Alternative worker classes to avoid monkey-patch warnings:
 # - 'sync': Standard synchronous workers (stable, no warnings)
 # - 'gthread': Thread-based workers (good for I/O bound apps)
 # - 'gevent': Async I/O with greenlets (requires early patching)
+# - 'uvicorn.workers.UvicornWorker': asyncio, serve asgi:app instead of app:app
 worker_class = os.getenv('WORKER_CLASS', 'gthread')  # Changed from 'gevent' to avoid warnings
 worker_connections = 1000
 threads = int(os.getenv('GUNICORN_THREADS', 4))  # Increased for gthread
@@ -47,8 +61,49 @@ tmp_upload_dir = None
 # keyfile = None
 # certfile = None
 
-# Preload app for better performance
+# Preload app for better performance (provider clients are warmed up in when_ready)
 preload_app = True
 
 # Graceful shutdown
 graceful_timeout = 30
+
+
+# Worker lifecycle hooks
+def on_starting(server):
+    """Delete metric files left by a previous run before any worker writes new ones"""
+    # Only the master runs this; with preload_app it has already opened its own
+    # files (<type>_<pid>.db), so those are kept
+    own_suffix = f'_{os.getpid()}.db'
+    for name in os.listdir(metrics_dir):
+        if not name.endswith(own_suffix):
+            try:
+                os.remove(os.path.join(metrics_dir, name))
+            except OSError:
+                pass
+
+
+def when_ready(server):
+    """Import provider SDKs and build clients in the master, before workers are forked"""
+    # With preload_app every worker inherits them copy-on-write instead of loading its own
+    if server.cfg.preload_app and os.getenv('PROVIDER_WARM_UP', 'true').lower() in ('1', 'true', 'yes', 'on'):
+        import providers
+        providers.warm_up()
+
+
+def post_worker_init(worker):
+    """Open upstream connections before the worker takes traffic"""
+    import http_pool
+    if os.getenv('HTTP_POOL_PREWARM', 'true').lower() in ('1', 'true', 'yes', 'on'):
+        http_pool.prewarm_all()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the aggregated metrics"""
+    import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Close pooled upstream connections cleanly on worker shutdown/recycle"""
+    import http_pool
+    http_pool.close_all()
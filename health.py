@@ -0,0 +1,109 @@
+"""
+Background provider health prober.
+
+Readiness checks read cached probe results instead of calling a provider on
+every request. One daemon thread per worker process probes each configured
+provider on a fixed interval and records the last success time, latency and
+error, so health endpoints answer instantly and upstream quota is only spent
+once per interval.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class ProbeResult:
+    """Outcome of the most recent probes of one provider"""
+
+    __slots__ = ('healthy', 'last_check', 'last_success', 'latency_ms', 'error')
+
+    def __init__(self):
+        self.healthy = False
+        self.last_check: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'healthy': self.healthy,
+            'last_check': self.last_check,
+            'last_success': self.last_success,
+            'latency_ms': self.latency_ms,
+            'error': self.error,
+        }
+
+
+class ProviderProber:
+    """Periodically probes providers and caches the results"""
+
+    def __init__(self, interval: float = 30.0) -> None:
+        """
+        Args:
+            interval: Seconds between probe rounds
+        """
+        self.interval = interval
+        self._probes: Dict[str, Callable[[], object]] = {}
+        self._results: Dict[str, ProbeResult] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._first_round = threading.Event()
+
+    def register(self, provider: str, probe: Callable[[], object]) -> None:
+        """Register a callable that raises when the provider is unreachable"""
+        self._probes[provider] = probe
+        self._results[provider] = ProbeResult()
+
+    def ensure_started(self) -> None:
+        """Start the probe thread in this process if it isn't running yet"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads don't survive fork; each worker starts its own
+            self._pid = os.getpid()
+            self._first_round = threading.Event()
+            threading.Thread(target=self._run, name='provider-prober', daemon=True).start()
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Latest probe result per provider"""
+        return {name: result.to_dict() for name, result in self._results.items()}
+
+    def is_ready(self) -> bool:
+        """True if at least one provider succeeded within the last few intervals"""
+        now = time.time()
+        for result in self._results.values():
+            if result.healthy and result.last_success is not None and now - result.last_success < self.interval * 3:
+                return True
+        return False
+
+    def wait_first_round(self, timeout: float) -> bool:
+        """Block until the first probe round completes (or timeout)"""
+        return self._first_round.wait(timeout)
+
+    def probe_all(self) -> None:
+        """Run one probe round synchronously"""
+        for name, probe in list(self._probes.items()):
+            result = self._results[name]
+            started = time.perf_counter()
+            try:
+                probe()
+                result.healthy = True
+                result.last_success = time.time()
+                result.error = None
+            except Exception as e:
+                result.healthy = False
+                result.error = str(e)
+            result.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            result.last_check = time.time()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.probe_all()
+            except Exception as e:
+                print(f"[WARNING] Provider probe round failed: {e}")
+            self._first_round.set()
+            time.sleep(self.interval)
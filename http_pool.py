@@ -0,0 +1,165 @@
+"""
+Long-lived, per-process HTTP connection pools for the provider clients.
+
+Each provider client owns one HTTPPool. The underlying httpx.Client is created
+lazily in the process that first uses it and is rebuilt after a fork, so
+gunicorn workers started from a preloaded app never share sockets with the
+master. Connections are kept alive between requests, which saves a TCP and
+TLS handshake on every upstream call.
+
+AsyncHTTPPool is the httpx.AsyncClient counterpart used by the ASGI serving
+mode (asgi.py); its client belongs to the event loop that first used it.
+"""
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (presence check for httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Pool configuration (shared by every pool in the process)
+MAX_CONNECTIONS = int(os.getenv('HTTP_POOL_MAX_CONNECTIONS', 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_POOL_MAX_KEEPALIVE', 20))
+KEEPALIVE_EXPIRY = float(os.getenv('HTTP_POOL_KEEPALIVE_EXPIRY', 30))
+HTTP2_ENABLED = _env_flag('HTTP2_ENABLED', True) and HTTP2_AVAILABLE
+
+# Every pool created in this process, for pre-warming and shutdown hooks
+_pools = weakref.WeakSet()
+_async_pools = weakref.WeakSet()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+class HTTPPool:
+    """Thread-safe, fork-aware holder of a keep-alive httpx.Client"""
+
+    def __init__(self, name: str, base_url: str, timeout: float = 30.0) -> None:
+        """
+        Args:
+            name: Label used in log messages
+            base_url: Origin the pool talks to (used for pre-warming)
+            timeout: Default request timeout in seconds
+        """
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client: Optional[httpx.Client] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        _pools.add(self)
+
+    @property
+    def client(self) -> httpx.Client:
+        """Return this process's httpx.Client, creating it on first use"""
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                # A client inherited across fork shares sockets with the parent; drop it
+                # without closing so the parent's connections are left untouched
+                self._client = httpx.Client(timeout=self.timeout, http2=HTTP2_ENABLED, limits=_limits())
+                self._pid = os.getpid()
+            return self._client
+
+    def prewarm(self) -> None:
+        """Open a connection to the upstream host ahead of the first real request"""
+        try:
+            self.client.head(self.base_url, timeout=5.0)
+        except Exception as e:
+            print(f"[WARNING] Connection pre-warm failed for {self.name}: {e}")
+
+    def close(self) -> None:
+        """Close pooled connections owned by this process"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+
+class AsyncHTTPPool:
+    """Fork-aware holder of a keep-alive httpx.AsyncClient (one per process and event loop)"""
+
+    def __init__(self, name: str, base_url: str, timeout: float = 30.0) -> None:
+        """
+        Args:
+            name: Label used in log messages
+            base_url: Origin the pool talks to
+            timeout: Default request timeout in seconds
+        """
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._owner = None
+        _async_pools.add(self)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the AsyncClient for the running event loop, creating it on first use"""
+        # Connections are bound to the loop that opened them; no lock needed
+        # because the check and assignment never yield to the loop
+        owner = (os.getpid(), asyncio.get_running_loop())
+        if self._client is None or self._owner != owner:
+            self._client = httpx.AsyncClient(timeout=self.timeout, http2=HTTP2_ENABLED, limits=_limits())
+            self._owner = owner
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close pooled connections owned by the running event loop"""
+        if self._client is not None and self._owner == (os.getpid(), asyncio.get_running_loop()):
+            await self._client.aclose()
+        self._client = None
+        self._owner = None
+
+
+def prewarm_all(background: bool = True) -> None:
+    """Pre-warm every registered pool (in a background thread by default)"""
+    pools = list(_pools)
+    if not pools:
+        return
+    if not background:
+        for pool in pools:
+            pool.prewarm()
+        return
+    for pool in pools:
+        threading.Thread(target=pool.prewarm, name=f"prewarm-{pool.name}", daemon=True).start()
+
+
+def close_all() -> None:
+    """Close every registered pool; called on worker exit"""
+    for pool in list(_pools):
+        pool.close()
+
+
+async def aclose_all() -> None:
+    """Close every async pool; called on ASGI application shutdown"""
+    for pool in list(_async_pools):
+        await pool.aclose()
+
+
+atexit.register(close_all)
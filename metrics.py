@@ -0,0 +1,219 @@
+"""
+Prometheus metrics for chat, catalog, routing and TTS traffic.
+
+Counters and histograms are updated in O(1) on the request path. When
+PROMETHEUS_MULTIPROC_DIR is set (gunicorn_config.py sets it up), every worker
+process writes its samples to that directory and /metrics aggregates them, so
+the numbers are correct no matter which worker serves the scrape.
+
+prometheus_client is optional: without it every metric is a no-op and
+/metrics reports that metrics are unavailable.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        REGISTRY,
+        generate_latest,
+        multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TTFT_BUCKETS = (0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1, 1.5, 2, 4, 8)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+if PROMETHEUS_AVAILABLE:
+    CHAT_REQUESTS = Counter(
+        'chatbot_chat_requests_total', 'Chat requests sent upstream',
+        ['provider', 'model', 'endpoint'])
+    CHAT_ERRORS = Counter(
+        'chatbot_chat_errors_total', 'Chat requests that failed upstream',
+        ['provider', 'model', 'endpoint'])
+    UPSTREAM_LATENCY = Histogram(
+        'chatbot_upstream_latency_seconds', 'Time until the full upstream answer was received',
+        ['provider', 'model'], buckets=LATENCY_BUCKETS)
+    TIME_TO_FIRST_TOKEN = Histogram(
+        'chatbot_time_to_first_token_seconds', 'Time until the first streamed token arrived',
+        ['provider', 'model'], buckets=TTFT_BUCKETS)
+    REQUEST_CHARS = Histogram(
+        'chatbot_request_payload_chars', 'Characters of message content sent upstream',
+        ['provider'], buckets=SIZE_BUCKETS)
+    RESPONSE_CHARS = Histogram(
+        'chatbot_response_payload_chars', 'Characters of assistant content received',
+        ['provider'], buckets=SIZE_BUCKETS)
+    IN_FLIGHT = Gauge(
+        'chatbot_upstream_in_flight', 'Upstream requests currently in progress',
+        ['provider'], multiprocess_mode='livesum')
+    CATALOG_REQUESTS = Counter(
+        'chatbot_model_catalog_requests_total', 'Model catalog lookups',
+        ['provider'])
+    TTS_REQUESTS = Counter(
+        'chatbot_tts_requests_total', 'Text-to-speech requests',
+        ['model'])
+    TTS_BYTES = Counter(
+        'chatbot_tts_bytes_total', 'Audio bytes returned by text-to-speech',
+        ['model'])
+    TTS_CACHE = Counter(
+        'chatbot_tts_cache_total', 'Text-to-speech cache lookups by tier',
+        ['result'])
+    RESPONSE_CACHE = Counter(
+        'chatbot_response_cache_total', 'Chat response cache lookups (memory, disk, miss, bypass)',
+        ['result'])
+    SINGLEFLIGHT_CALLS = Counter(
+        'chatbot_singleflight_calls_total', 'Coalescable upstream calls by role (followers reused a leader\'s call)',
+        ['group', 'role'])
+    HEDGED_REQUESTS = Counter(
+        'chatbot_hedged_requests_total', 'Hedge requests sent because the primary exceeded its p95 latency',
+        ['provider', 'model'])
+    HEDGE_WINS = Counter(
+        'chatbot_hedge_wins_total', 'Hedged chats answered first by the hedge provider',
+        ['provider'])
+    FAILOVERS = Counter(
+        'chatbot_failovers_total', 'Chats moved to another provider after an error or open circuit',
+        ['from_provider', 'to_provider'])
+    CIRCUIT_OPENED = Counter(
+        'chatbot_circuit_opened_total', 'Times a provider circuit breaker opened',
+        ['provider'])
+    TOKENS = Counter(
+        'chatbot_tokens_total', 'Tokens reported by the provider (prompt, completion)',
+        ['provider', 'model', 'kind'])
+    RATE_LIMIT_QUEUE = Gauge(
+        'chatbot_rate_limit_queue_depth', 'Chat calls waiting for rate-limit capacity',
+        ['provider'], multiprocess_mode='livesum')
+    RATE_LIMIT_WAIT = Histogram(
+        'chatbot_rate_limit_wait_seconds', 'Time chat calls waited for rate-limit capacity',
+        ['provider'], buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+    RATE_LIMIT_EVENTS = Counter(
+        'chatbot_rate_limit_events_total', 'Upstream 429s (throttled), their retries and calls that ran out of time (expired)',
+        ['provider', 'event'])
+    REQUEST_PHASE = Histogram(
+        'chatbot_request_phase_seconds', 'Time spent in each phase of a request (as sent in Server-Timing)',
+        ['endpoint', 'phase'], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30))
+    SLOW_REQUEST_PROFILES = Counter(
+        'chatbot_slow_request_profiles_total', 'Sampling profiles written for requests over the threshold',
+        ['endpoint'])
+    GEMINI_SESSIONS = Counter(
+        'chatbot_gemini_sessions_total', 'Gemini chat turns on a reused live session vs a freshly started one',
+        ['result'])
+    CONVERSATION_CACHE = Counter(
+        'chatbot_conversation_cache_total',
+        'Shared conversation store lookups: cached and current, refreshed from newer writes, or loaded',
+        ['result'])
+    BATCH_ITEMS = Counter(
+        'chatbot_batch_items_total', 'Batch chat items answered, by requested provider and outcome',
+        ['provider', 'result'])
+    COMPRESSED_BYTES = Counter(
+        'chatbot_compressed_bytes_total', 'JSON response bytes before (in) and after (out) compression, by encoding',
+        ['encoding', 'stage'])
+    NOT_MODIFIED = Counter(
+        'chatbot_not_modified_total', 'Conditional requests answered 304 Not Modified',
+        ['endpoint'])
+else:
+    CHAT_REQUESTS = CHAT_ERRORS = UPSTREAM_LATENCY = TIME_TO_FIRST_TOKEN = _NoopMetric()
+    REQUEST_CHARS = RESPONSE_CHARS = IN_FLIGHT = CATALOG_REQUESTS = _NoopMetric()
+    TTS_REQUESTS = TTS_BYTES = TTS_CACHE = _NoopMetric()
+    SINGLEFLIGHT_CALLS = RESPONSE_CACHE = HEDGED_REQUESTS = HEDGE_WINS = FAILOVERS = CIRCUIT_OPENED = _NoopMetric()
+    TOKENS = GEMINI_SESSIONS = _NoopMetric()
+    RATE_LIMIT_QUEUE = RATE_LIMIT_WAIT = RATE_LIMIT_EVENTS = _NoopMetric()
+    REQUEST_PHASE = SLOW_REQUEST_PROFILES = CONVERSATION_CACHE = _NoopMetric()
+    BATCH_ITEMS = COMPRESSED_BYTES = NOT_MODIFIED = _NoopMetric()
+
+
+# Model ids reach label values from request bodies. Only models the app knows
+# (see register_model_check) get their own series; anything else is counted as
+# "other", so clients cannot create unbounded series, or files in multiprocess mode.
+OTHER_MODEL = 'other'
+_model_check = None
+
+
+def register_model_check(check) -> None:
+    """Install check(provider, model) -> bool, deciding which model ids may be label values"""
+    global _model_check
+    _model_check = check
+
+
+def model_label(provider, model) -> str:
+    """The label value for a requested model: the id itself if known, otherwise OTHER_MODEL"""
+    if _model_check is not None and model and _model_check(provider, model):
+        return model
+    return OTHER_MODEL
+
+
+def message_chars(messages) -> int:
+    """Total content characters in a provider message list"""
+    return sum(len(msg['content']) for msg in messages)
+
+
+@contextmanager
+def track_upstream(provider, model, endpoint):
+    """
+    Count, time and track in-flight state of one upstream chat call
+
+    Usage:
+        with track_upstream('groq', model, 'chat'):
+            answer = client.chat(...)
+    """
+    model = model_label(provider, model)
+    CHAT_REQUESTS.labels(provider, model, endpoint).inc()
+    IN_FLIGHT.labels(provider).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        # A client disconnect (GeneratorExit, or task cancellation under asyncio) is not an upstream error
+        if not isinstance(e, (GeneratorExit, asyncio.CancelledError)):
+            CHAT_ERRORS.labels(provider, model, endpoint).inc()
+        raise
+    else:
+        UPSTREAM_LATENCY.labels(provider, model).observe(time.perf_counter() - started)
+    finally:
+        IN_FLIGHT.labels(provider).dec()
+
+
+def render():
+    """Return (body, content_type) for the /metrics endpoint"""
+    if not PROMETHEUS_AVAILABLE:
+        return b'# prometheus_client is not installed\n', CONTENT_TYPE_LATEST
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid) -> None:
+    """Clean up a dead worker's live gauges (gunicorn child_exit hook)"""
+    if PROMETHEUS_AVAILABLE and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
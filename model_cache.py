@@ -0,0 +1,218 @@
+"""
+Per-provider model catalog cache with stale-while-revalidate.
+
+Catalog lookups are served from memory. Once an entry is older than its TTL
+it is still returned immediately while a single background thread refreshes
+it, so only the very first request for a provider ever waits on the network.
+"""
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+class CatalogEntry:
+    """A cached model list plus bookkeeping for refreshes"""
+
+    __slots__ = ('models', 'fetched_at', 'version', 'is_fallback', 'error', '_by_id')
+
+    def __init__(self, models, fetched_at, version, is_fallback=False, error=None):
+        self.models = models
+        self.fetched_at = fetched_at
+        self.version = version
+        self.is_fallback = is_fallback
+        # Why the live fetch failed, for a fallback entry or an expired one still being served
+        self.error = error
+        self._by_id = None
+
+    def find(self, model_id):
+        """Return the model dict with the given id (or None)"""
+        if self._by_id is None:
+            self._by_id = {m.get('id'): m for m in self.models}
+        return self._by_id.get(model_id)
+
+
+class ModelCatalogCache:
+    """Thread-safe TTL cache of model catalogs keyed by provider name"""
+
+    def __init__(self, ttl: float = 300.0, max_stale: float = 86400.0, error_ttl: float = 30.0) -> None:
+        """
+        Args:
+            ttl: Seconds a catalog is considered fresh
+            max_stale: Seconds after which a stale catalog is refetched synchronously
+            error_ttl: Seconds to serve the fallback list (or an expired catalog) after a failed
+                fetch before retrying
+        """
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.error_ttl = error_ttl
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._refreshing: set = set()
+        self._failed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self._merged_key = None
+        self._merged: List[Dict[str, object]] = []
+
+    def get(
+        self,
+        provider: str,
+        fetch: Callable[[], List[Dict[str, object]]],
+        fallback: Optional[List[Dict[str, object]]] = None,
+    ) -> List[Dict[str, object]]:
+        """
+        Return the catalog for a provider, fetching or refreshing it as needed
+
+        Args:
+            provider: Cache key (provider name)
+            fetch: Callable returning the live model list; must raise on failure
+            fallback: Models to return when nothing has been cached yet and fetch fails
+
+        Returns:
+            List of model dictionaries (shared; callers must not mutate it)
+        """
+        models = self.peek(provider, fetch)
+        if models is not None:
+            return models
+        return self._refresh(provider, fetch, fallback)
+
+    def peek(self, provider: str, fetch: Callable[[], List[Dict[str, object]]]) -> Optional[List[Dict[str, object]]]:
+        """
+        Return the catalog if it can be served without waiting, else None
+
+        A stale (but not expired) catalog is returned and refreshed in the background.
+        """
+        entry = self._entries.get(provider)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry.fetched_at
+        ttl = self.error_ttl if entry.is_fallback else self.ttl
+        if age < ttl:
+            return entry.models
+        if not entry.is_fallback and age < self.max_stale:
+            # Serve stale data now, refresh in the background
+            self._refresh_async(provider, fetch)
+            return entry.models
+        if not entry.is_fallback and self._backing_off(provider):
+            # Expired, but the last synchronous refetch failed: don't retry on every request
+            return entry.models
+        return None
+
+    async def get_async(
+        self,
+        provider: str,
+        fetch_async: Callable[[], Awaitable[List[Dict[str, object]]]],
+        fetch: Callable[[], List[Dict[str, object]]],
+        fallback: Optional[List[Dict[str, object]]] = None,
+    ) -> List[Dict[str, object]]:
+        """
+        Like get(), for asyncio callers: a cold or expired catalog is awaited via
+        fetch_async; background refreshes of stale entries still use fetch.
+        """
+        models = self.peek(provider, fetch)
+        if models is not None:
+            return models
+        try:
+            return self._store(provider, await fetch_async()).models
+        except Exception as e:
+            return self._fallback(provider, fallback, e)
+
+    def entry(self, provider: str) -> Optional[CatalogEntry]:
+        """Return the raw cache entry for a provider (or None)"""
+        return self._entries.get(provider)
+
+    def failure(self, provider: str) -> Optional[str]:
+        """Why a provider's live catalog could not be fetched, if a fallback or an expired catalog is being served"""
+        entry = self._entries.get(provider)
+        if entry is None or not (entry.is_fallback or entry.error):
+            return None
+        return entry.error or 'catalog unavailable'
+
+    def merged(self, providers: List[str]) -> List[Dict[str, object]]:
+        """
+        Return one provider-tagged catalog built from the cached entries
+
+        The merged list is rebuilt only when the set of providers or the version
+        of one of their catalogs changes; otherwise the previous list is reused.
+        """
+        key = tuple((p, self._entries[p].version) for p in providers if p in self._entries)
+        if key == self._merged_key:
+            return self._merged
+
+        merged = []
+        for provider, _ in key:
+            for model in self._entries[provider].models:
+                tagged = dict(model)
+                tagged['provider'] = provider
+                merged.append(tagged)
+
+        with self._lock:
+            self._merged_key = key
+            self._merged = merged
+        return merged
+
+    def invalidate(self, provider: Optional[str] = None) -> None:
+        """Drop one provider's catalog, or all of them"""
+        with self._lock:
+            if provider is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(provider, None)
+
+    def _store(self, provider, models, is_fallback=False, error=None):
+        with self._lock:
+            previous = self._entries.get(provider)
+            if previous is not None and previous.is_fallback == is_fallback and previous.models == models:
+                # Unchanged: keep the version so merged() and derived ETags stay valid
+                version = previous.version
+                models = previous.models
+            else:
+                self._version += 1
+                version = self._version
+            entry = CatalogEntry(models, time.monotonic(), version, is_fallback, error)
+            self._entries[provider] = entry
+            if not is_fallback:
+                self._failed_at.pop(provider, None)
+            return entry
+
+    def _refresh(self, provider, fetch, fallback):
+        """Fetch synchronously; fall back only when no real catalog is cached"""
+        try:
+            return self._store(provider, fetch()).models
+        except Exception as e:
+            return self._fallback(provider, fallback, e)
+
+    def _fallback(self, provider, fallback, error):
+        print(f"[WARNING] Model catalog fetch failed for {provider}: {error}")
+        entry = self._entries.get(provider)
+        if entry is not None and not entry.is_fallback:
+            # Serve the expired catalog, reported as partial, and back off before the next refetch
+            with self._lock:
+                entry.error = str(error) or type(error).__name__
+                self._failed_at[provider] = time.monotonic()
+            return entry.models
+        if fallback is None:
+            raise error
+        return self._store(provider, list(fallback), is_fallback=True, error=str(error) or type(error).__name__).models
+
+    def _backing_off(self, provider):
+        failed_at = self._failed_at.get(provider)
+        return failed_at is not None and time.monotonic() - failed_at < self.error_ttl
+
+    def _refresh_async(self, provider, fetch):
+        with self._lock:
+            if provider in self._refreshing or self._backing_off(provider):
+                return
+            self._refreshing.add(provider)
+
+        def run():
+            try:
+                self._store(provider, fetch())
+            except Exception as e:
+                # Keep serving the stale catalog; retry after error_ttl
+                self._failed_at[provider] = time.monotonic()
+                print(f"[WARNING] Background model catalog refresh failed for {provider}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(provider)
+
+        threading.Thread(target=run, name=f"catalog-refresh-{provider}", daemon=True).start()
@@ -1,11 +1,25 @@
+import json
 import os
-from typing import List, Dict
+from urllib.parse import urlsplit
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 import httpx
+from http_pool import AsyncHTTPPool, HTTPPool
+from rate_limiter import RateLimitError, parse_duration
 
 
 class OpenRouterClient:
     """Client for interacting with OpenRouter API"""
     
+    # Default free models used when the API cannot be reached
+    FALLBACK_MODELS = [
+        {'id': 'meta-llama/llama-3.2-3b-instruct:free', 'name': 'Llama 3.2 3B Instruct (free)', 'owned_by': 'openrouter', 'active': True},
+        {'id': 'google/gemma-2-9b-it:free', 'name': 'Gemma 2 9B (free)', 'owned_by': 'openrouter', 'active': True},
+        {'id': 'mistralai/mistral-7b-instruct:free', 'name': 'Mistral 7B Instruct (free)', 'owned_by': 'openrouter', 'active': True},
+    ]
+    
+    # Called as rate_observer(model, headers) after each chat call (see rate_limiter.py)
+    rate_observer = None
+    
     def __init__(self, api_key: str | None = None) -> None:
         """Initialize OpenRouter client with API key"""
         self.api_key = api_key or os.getenv('OPENROUTER_API_KEY')
@@ -14,52 +28,63 @@ class OpenRouterClient:
                 "OpenRouter API key is required. Set OPENROUTER_API_KEY environment variable."
             )
         
-        self.base_url = "https://openrouter.ai/api/v1"
+        # OPENROUTER_BASE_URL points the client at another server (e.g. benchmarks/fake_providers.py)
+        self.base_url = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1").rstrip('/')
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # Shared keep-alive connection pool (one per process)
+        self.http = HTTPPool('openrouter', self._origin(), timeout=30.0)
+    
+    def _origin(self) -> str:
+        """Scheme and host of base_url (what the connection pool pre-warms)"""
+        parts = urlsplit(self.base_url)
+        return f"{parts.scheme}://{parts.netloc}"
+    
+    def fetch_models(self) -> List[Dict[str, object]]:
+        """Fetch the live list of free OpenRouter models (raises on failure)"""
+        client = self.http.client
+        response = client.get(
+            f"{self.base_url}/models",
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return self._parse_models(response.json())
+    
+    @staticmethod
+    def _parse_models(data: Dict[str, object]) -> List[Dict[str, object]]:
+        """Extract the free models from a /models response body"""
+        models = []
+        for model in data.get('data', []):
+            # Filter for free models only
+            pricing = model.get('pricing', {})
+            prompt_price = float(pricing.get('prompt', '1'))
+            completion_price = float(pricing.get('completion', '1'))
+                
+            # Only include models that are free (0 cost)
+            if prompt_price == 0 and completion_price == 0:
+                models.append({
+                    'id': model.get('id', ''),
+                    'name': model.get('name', model.get('id', '')),
+                    'owned_by': 'openrouter',
+                    'active': True,
+                    'context_length': model.get('context_length', 0)
+                })
+            
+        # Sort by name
+        models.sort(key=lambda x: x['id'])
+            
+        return models
     
     def list_models(self) -> List[Dict[str, object]]:
         """List all available free OpenRouter models"""
         try:
-            with httpx.Client(timeout=30.0) as client:
-                response = client.get(
-                    f"{self.base_url}/models",
-                    headers=self.headers
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                models = []
-                for model in data.get('data', []):
-                    # Filter for free models only
-                    pricing = model.get('pricing', {})
-                    prompt_price = float(pricing.get('prompt', '1'))
-                    completion_price = float(pricing.get('completion', '1'))
-                    
-                    # Only include models that are free (0 cost)
-                    if prompt_price == 0 and completion_price == 0:
-                        models.append({
-                            'id': model.get('id', ''),
-                            'name': model.get('name', model.get('id', '')),
-                            'owned_by': 'openrouter',
-                            'active': True,
-                            'context_length': model.get('context_length', 0)
-                        })
-                
-                # Sort by name
-                models.sort(key=lambda x: x['id'])
-                
-                return models
+            return self.fetch_models()
         except Exception as e:
             print(f"Error listing OpenRouter models: {e}")
             # Return default free models if API call fails
-            return [
-                {'id': 'meta-llama/llama-3.2-3b-instruct:free', 'name': 'Llama 3.2 3B Instruct (free)', 'owned_by': 'openrouter', 'active': True},
-                {'id': 'google/gemma-2-9b-it:free', 'name': 'Gemma 2 9B (free)', 'owned_by': 'openrouter', 'active': True},
-                {'id': 'mistralai/mistral-7b-instruct:free', 'name': 'Mistral 7B Instruct (free)', 'owned_by': 'openrouter', 'active': True},
-            ]
+            return [dict(m) for m in self.FALLBACK_MODELS]
     
     def chat(
         self,
@@ -81,41 +106,132 @@ class OpenRouterClient:
             Assistant's response text
         """
         try:
-            with httpx.Client(timeout=60.0) as client:
-                payload = {
-                    "model": model,
-                    "messages": messages,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                }
+            client = self.http.client
+            payload = {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            }
                 
-                response = client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=60.0
+            )
+            self._observe_rate_limits(model, response.headers)
+            response.raise_for_status()
+            data = response.json()
                 
-                if 'choices' in data and len(data['choices']) > 0:
-                    return data['choices'][0]['message']['content']
-                else:
-                    raise Exception("No response from OpenRouter API")
+            if 'choices' in data and len(data['choices']) > 0:
+                return data['choices'][0]['message']['content']
+            else:
+                raise Exception("No response from OpenRouter API")
                     
         except httpx.HTTPStatusError as e:
-            error_message = self._parse_error_message(e.response)
-            status = e.response.status_code if e.response is not None else 'Unknown'
-            if status == 404 and error_message and 'No allowed providers' in error_message:
-                raise Exception(
-                    "OpenRouter returned 404: No allowed providers are available for the selected model. "
-                    "Update your API key's Allowed Providers list or choose another model."
-                )
-            raise Exception(f"OpenRouter API error ({status}): {error_message or str(e)}")
+            raise self._status_error(e)
         except httpx.HTTPError as e:
             raise Exception(f"Network error getting OpenRouter chat response: {str(e)}")
         except Exception as e:
             raise Exception(f"Error getting OpenRouter chat response: {str(e)}")
 
+    def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = 'meta-llama/llama-3.2-3b-instruct:free',
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> Iterator[str]:
+        """
+        Send chat messages and get streaming response
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            model: Model ID to use
+            temperature: Sampling temperature (0-2)
+            max_tokens: Maximum tokens in response
+        
+        Yields:
+            Chunks of the response
+        """
+        try:
+            client = self.http.client
+            payload = {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "stream": True,
+            }
+                
+            with client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=60.0
+            ) as response:
+                self._observe_rate_limits(model, response.headers)
+                if response.status_code >= 400:
+                    response.read()
+                response.raise_for_status()
+                    
+                for line in response.iter_lines():
+                    content = self._stream_delta(line)
+                    if content is None:
+                        break
+                    if content:
+                        yield content
+                    
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise Exception(f"Network error getting OpenRouter streaming response: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Error getting OpenRouter streaming response: {str(e)}")
+
+    @staticmethod
+    def _stream_delta(line: str) -> Optional[str]:
+        """Return the content of one SSE line ('' to skip it, None at end of stream)"""
+        # SSE frames look like "data: {...}"; lines starting with ":" are keep-alive comments
+        if not line.startswith('data:'):
+            return ''
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return None
+        chunk = json.loads(data)
+        if 'error' in chunk:
+            raise Exception(chunk['error'].get('message', 'Unknown streaming error'))
+        choices = chunk.get('choices') or []
+        if choices:
+            return (choices[0].get('delta') or {}).get('content') or ''
+        return ''
+
+    def _observe_rate_limits(self, model: str, headers) -> None:
+        """Report a response's rate-limit headers to the scheduler"""
+        if self.rate_observer is not None:
+            self.rate_observer(model, headers)
+
+    @classmethod
+    def _status_error(cls, error: httpx.HTTPStatusError) -> Exception:
+        """Turn an HTTP error status into a readable exception"""
+        error_message = cls._parse_error_message(error.response)
+        status = error.response.status_code if error.response is not None else 'Unknown'
+        if status == 429:
+            # Retried by the rate-limit scheduler
+            return RateLimitError(
+                f"OpenRouter rate limit exceeded: {error_message or str(error)}",
+                retry_after=parse_duration(error.response.headers.get('retry-after')),
+                headers=error.response.headers,
+            )
+        if status == 404 and error_message and 'No allowed providers' in error_message:
+            return Exception(
+                "OpenRouter returned 404: No allowed providers are available for the selected model. "
+                "Update your API key's Allowed Providers list or choose another model."
+            )
+        return Exception(f"OpenRouter API error ({status}): {error_message or str(error)}")
+
     @staticmethod
     def _parse_error_message(response: httpx.Response | None) -> str:
         """Return a readable error message from an HTTP response"""
@@ -135,3 +251,105 @@ class OpenRouterClient:
             if isinstance(message, str):
                 return message
         return response.text
+
+
+class AsyncOpenRouterClient(OpenRouterClient):
+    """Asyncio variant of OpenRouterClient (pooled httpx.AsyncClient)"""
+    
+    def __init__(self, api_key: str | None = None) -> None:
+        """Initialize async OpenRouter client with API key"""
+        super().__init__(api_key)
+        self.http = AsyncHTTPPool('openrouter', self._origin(), timeout=30.0)
+    
+    async def fetch_models(self) -> List[Dict[str, object]]:
+        """Fetch the live list of free OpenRouter models (raises on failure)"""
+        response = await self.http.client.get(
+            f"{self.base_url}/models",
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return self._parse_models(response.json())
+    
+    async def list_models(self) -> List[Dict[str, object]]:
+        """List all available free OpenRouter models"""
+        try:
+            return await self.fetch_models()
+        except Exception as e:
+            print(f"Error listing OpenRouter models: {e}")
+            return [dict(m) for m in self.FALLBACK_MODELS]
+    
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = 'meta-llama/llama-3.2-3b-instruct:free',
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> str:
+        """Send chat messages and return the assistant's response text"""
+        try:
+            response = await self.http.client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json={
+                    "model": model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                },
+                timeout=60.0
+            )
+            self._observe_rate_limits(model, response.headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            if 'choices' in data and len(data['choices']) > 0:
+                return data['choices'][0]['message']['content']
+            raise Exception("No response from OpenRouter API")
+        
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise Exception(f"Network error getting OpenRouter chat response: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Error getting OpenRouter chat response: {str(e)}")
+    
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = 'meta-llama/llama-3.2-3b-instruct:free',
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> AsyncIterator[str]:
+        """Send chat messages and asynchronously yield chunks of the response"""
+        try:
+            async with self.http.client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json={
+                    "model": model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": True,
+                },
+                timeout=60.0
+            ) as response:
+                self._observe_rate_limits(model, response.headers)
+                if response.status_code >= 400:
+                    await response.aread()
+                response.raise_for_status()
+                
+                async for line in response.aiter_lines():
+                    content = self._stream_delta(line)
+                    if content is None:
+                        break
+                    if content:
+                        yield content
+        
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise Exception(f"Network error getting OpenRouter streaming response: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Error getting OpenRouter streaming response: {str(e)}")
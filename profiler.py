@@ -0,0 +1,157 @@
+"""
+Sampling profiler for slow requests.
+
+While enabled, a background thread samples the Python stack of every thread
+that is serving a request, once per interval. When a request finishes its
+samples are dropped unless it took longer than the threshold; slow requests
+are written as collapsed stacks (one "frame;frame;frame count" line per
+distinct stack), the input format of flamegraph.pl, speedscope and inferno:
+
+    flamegraph.pl /tmp/groq-chatbot-profiles/20250101T120000-2350ms-chat.folded > chat.svg
+
+The cost is one wake-up per interval plus a stack walk per in-flight request,
+and nothing when disabled, so it can stay on in production. Sampling uses
+sys._current_frames(), which sees OS threads: it profiles sync and gthread
+workers, not gevent greenlets or asyncio tasks that share one thread.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+import metrics
+
+_UNSAFE_LABEL = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class _Recording:
+    """Samples collected for one in-flight request"""
+
+    __slots__ = ('label', 'started', 'stacks')
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+
+
+class SlowRequestProfiler:
+    """Samples request threads; keeps a flame-graph profile of requests over a threshold"""
+
+    def __init__(self, threshold_ms: float = 0, interval_ms: float = 10, directory: Optional[str] = None,
+                 max_profiles: int = 200) -> None:
+        """
+        Args:
+            threshold_ms: Requests slower than this are written out (0 disables the profiler)
+            interval_ms: Sampling interval
+            directory: Where .folded profiles are written
+            max_profiles: Profiles kept before the oldest are deleted
+        """
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.enabled = threshold_ms > 0 and bool(directory) and not _gevent_patched()
+        self._active: Dict[int, _Recording] = {}
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._sampler_pid: Optional[int] = None
+        if threshold_ms > 0 and not self.enabled and directory:
+            print("[WARNING] Slow-request profiler disabled: it cannot sample gevent greenlets")
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def begin(self, label: str) -> None:
+        """Start sampling the calling thread for a request"""
+        if not self.enabled:
+            return
+        self._ensure_sampler()
+        with self._lock:
+            self._active[threading.get_ident()] = _Recording(label or 'request')
+
+    def end(self) -> Optional[str]:
+        """Stop sampling the calling thread; returns the profile path if the request was slow"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            recording = self._active.pop(threading.get_ident(), None)
+        if recording is None:
+            return None
+        elapsed = time.perf_counter() - recording.started
+        if elapsed < self.threshold or not recording.stacks:
+            return None
+        return self._write(recording, elapsed)
+
+    def _ensure_sampler(self):
+        # The sampler thread does not survive fork; start one per worker process
+        if self._sampler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sampler_pid != os.getpid():
+                self._active.clear()
+                self._sampler_pid = os.getpid()
+                threading.Thread(target=self._run, name='slow-request-profiler', daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._sampler_pid == pid:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, recording in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        recording.stacks[self._fold(frame)] += 1
+
+    def _fold(self, frame) -> str:
+        """Root-first 'function (file:line);...' stack of a frame"""
+        labels = self._labels
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = labels.get(code)
+            if name is None:
+                name = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            names.append(name)
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def _write(self, recording, elapsed):
+        label = _UNSAFE_LABEL.sub('_', recording.label)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{elapsed * 1000:.0f}ms-{label}-{os.getpid()}.folded"
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'w', encoding='utf-8') as handle:
+                for stack, count in recording.stacks.most_common():
+                    handle.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"[WARNING] Could not write slow-request profile: {e}")
+            return None
+        metrics.SLOW_REQUEST_PROFILES.labels(recording.label).inc()
+        self._prune()
+        return path
+
+    def _prune(self):
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith('.folded'))
+        except OSError:
+            return
+        for stale in names[:max(0, len(names) - self.max_profiles)]:
+            try:
+                os.unlink(os.path.join(self.directory, stale))
+            except OSError:
+                pass
+
+
+def _gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
@@ -0,0 +1,89 @@
+"""
+Provider clients that are imported and built on first use.
+
+Importing the provider SDKs is most of the app's start-up cost:
+google.generativeai pulls in grpc and protobuf, and groq and httpx add more.
+A LazyClient stands in for one configured client. Its provider module is
+imported, and the client built, the first time an attribute is used. A
+deployment that only chats with Groq therefore never loads the Gemini SDK,
+and `import app` stays cheap for tools, tests and workers that never call a
+provider.
+
+warm_up() builds every configured client ahead of time. With preload_app,
+gunicorn_config.py calls it in the master before workers are forked. The
+SDK modules and clients are then loaded once and shared copy-on-write,
+instead of each worker importing them on its first request.
+"""
+import importlib
+import threading
+import time
+from typing import Callable, List, Optional
+
+_registry: List['LazyClient'] = []
+
+
+class LazyClient:
+    """Proxy for a provider client; imports its module and builds it on first attribute access"""
+
+    def __init__(self, provider: str, module: str, class_name: str,
+                 setup: Optional[Callable[[object], None]] = None, **kwargs) -> None:
+        """
+        Args:
+            provider: Provider name, for log messages
+            module: Module that defines the client class (e.g. 'gemini_client')
+            class_name: Client class in that module
+            setup: Called with the new client once it is built (e.g. to attach a rate observer)
+            **kwargs: Constructor arguments
+        """
+        self._provider = provider
+        self._module = module
+        self._class_name = class_name
+        self._setup = setup
+        self._kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def get(self):
+        """The real client, built on the first call (raises if it cannot be built)"""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    client_class = getattr(importlib.import_module(self._module), self._class_name)
+                    client = client_class(**self._kwargs)
+                    if self._setup is not None:
+                        self._setup(client)
+                    self._client = client
+                    print(f"[INFO] {self._class_name} initialized in "
+                          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+                client = self._client
+        return client
+
+    def sibling(self, class_name: str) -> 'LazyClient':
+        """A lazy client of another class in the same module, built with the same arguments"""
+        return LazyClient(self._provider, self._module, class_name, self._setup, **self._kwargs)
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    def __getattr__(self, name):
+        # Only reached for attributes the proxy itself does not have
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self._client is not None else 'not loaded'
+        return f"<LazyClient {self._module}.{self._class_name} ({state})>"
+
+
+def warm_up() -> None:
+    """Build every configured client now (a client that fails is reported and retried on use)"""
+    for lazy in list(_registry):
+        try:
+            lazy.get()
+        except Exception as e:
+            print(f"Warning: {lazy._provider} client initialization failed: {e}")
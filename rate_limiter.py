@@ -0,0 +1,455 @@
+"""
+Rate-limit-aware scheduling of upstream chat calls.
+
+Every (provider, model) route has two token buckets: requests per minute and
+tokens per minute. Limits come from RATE_LIMITS and are refined from the
+rate-limit headers providers send back (x-ratelimit-*, retry-after). A call
+waits in the route's priority queue until both buckets can cover it, or gives
+up at its deadline; only the head of the queue consumes capacity, so lower
+priority work (batch) never starves interactive chats. A 429 blocks the whole
+route for the retry-after period (or an exponential backoff) and the call is
+retried with jitter, so a burst slows down instead of turning into errors.
+
+RATE_LIMITS is a JSON object keyed by "provider" or "provider:model", with
+optional "rpm" and "tpm" values:
+
+    {"groq": {"rpm": 30, "tpm": 6000}, "gemini:gemini-1.5-pro": {"rpm": 2}}
+
+Routes without a configured or learned limit are not throttled. Buckets are
+per worker process.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import metrics
+from context_packer import CHARS_PER_TOKEN
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+class RateLimitError(Exception):
+    """An upstream rate limit (HTTP 429), or a call that could not be scheduled in time"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, headers=None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.headers = headers
+
+
+def parse_duration(value) -> Optional[float]:
+    """Seconds in a header value like "12", "1.5", "120ms", "7.66s" or "2m59.56s" """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def parse_rate_limits(raw: str) -> Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]:
+    """Parse a RATE_LIMITS value into {(provider, model or '*'): (rpm, tpm)}"""
+    if not raw or not raw.strip():
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        print(f"[WARNING] Ignoring invalid RATE_LIMITS: {e}")
+        return {}
+    limits = {}
+    for key, value in data.items():
+        provider, _, model = key.partition(':')
+        limits[(provider.strip().lower(), model.strip() or '*')] = (value.get('rpm'), value.get('tpm'))
+    return limits
+
+
+def request_tokens(messages, max_tokens: int) -> int:
+    """Tokens a chat may consume: the estimated prompt plus the completion budget"""
+    return metrics.message_chars(messages) // CHARS_PER_TOKEN + int(max_tokens)
+
+
+class TokenBucket:
+    """Capacity refilled continuously at a per-minute rate (unlimited until a limit is known)"""
+
+    __slots__ = ('per_minute', 'level', 'updated', 'blocked_until')
+
+    def __init__(self, per_minute: Optional[float] = None) -> None:
+        self.per_minute = per_minute
+        self.level = float(per_minute or 0)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    def wait(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 if it can be taken now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole bucket waits for a full bucket
+        amount = min(amount, self.per_minute)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.per_minute
+
+    def take(self, amount: float) -> None:
+        if self.per_minute:
+            self.level -= min(amount, self.per_minute)
+
+    def learn(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float], now: float) -> None:
+        """Adopt what the provider reported about this limit"""
+        if limit:
+            self.per_minute = limit
+        if remaining is None:
+            return
+        self._refill(now)
+        self.level = remaining
+        if remaining <= 0 and reset:
+            self.blocked_until = max(self.blocked_until, now + reset)
+
+
+class _Waiter:
+    """One queued call; woken when it becomes the head of its queue"""
+
+    __slots__ = ('tokens', 'deadline', 'event', 'loop')
+
+    def __init__(self, tokens, deadline, loop=None):
+        self.tokens = tokens
+        self.deadline = deadline
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class _Route:
+    """Buckets and wait queue of one (provider, model)"""
+
+    __slots__ = ('requests', 'tokens', 'queue')
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue = []
+
+    def head(self):
+        return self.queue[0][2] if self.queue else None
+
+    def try_take(self, waiter, now) -> Optional[float]:
+        """0 if waiter got its capacity, seconds to wait if it is the head, None otherwise"""
+        if self.head() is not waiter:
+            return None
+        wait = max(self.requests.wait(1, now), self.tokens.wait(waiter.tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(waiter.tokens)
+        heapq.heappop(self.queue)
+        self.wake_head()
+        return 0.0
+
+    def remove(self, waiter):
+        was_head = self.head() is waiter
+        self.queue = [entry for entry in self.queue if entry[2] is not waiter]
+        heapq.heapify(self.queue)
+        if was_head:
+            self.wake_head()
+
+    def wake_head(self):
+        if self.queue:
+            self.queue[0][2].wake()
+
+
+class RateScheduler:
+    """Per-route token buckets, priority wait queues and 429 retries for chat calls"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]] = None,
+        max_wait: float = 30.0,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+        max_backoff: float = 20.0,
+    ) -> None:
+        """
+        Args:
+            limits: Configured (rpm, tpm) per (provider, model), '*' as model for a provider default
+            max_wait: Seconds a call may spend queued and backing off before it fails
+            max_retries: 429 responses retried per call
+            base_backoff: First backoff (seconds) after a 429 without retry-after
+            max_backoff: Upper bound for the exponential backoff
+        """
+        self.limits = limits or {}
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._routes: Dict[Tuple[str, str], _Route] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _route(self, provider: str, model: str) -> _Route:
+        # Called with self._lock held
+        route = self._routes.get((provider, model))
+        if route is None:
+            rpm, tpm = self.limits.get((provider, model)) or self.limits.get((provider, '*')) or (None, None)
+            route = self._routes[(provider, model)] = _Route(rpm, tpm)
+        return route
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Limits and queue depth per route (for health output)"""
+        with self._lock:
+            return {
+                f"{provider}:{model}": {
+                    'rpm': route.requests.per_minute,
+                    'tpm': route.tokens.per_minute,
+                    'queued': len(route.queue),
+                }
+                for (provider, model), route in self._routes.items()
+            }
+
+    def observe(self, provider: str, model: str, headers) -> None:
+        """Learn a route's limits from the rate-limit headers of a provider response"""
+        if not headers:
+            return
+
+        def number(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        now = time.monotonic()
+        with self._lock:
+            route = self._route(provider, model)
+            # Groq/OpenAI style: separate request and token limits with relative resets
+            route.requests.learn(
+                None,
+                number('x-ratelimit-remaining-requests'),
+                parse_duration(headers.get('x-ratelimit-reset-requests')),
+                now)
+            route.tokens.learn(
+                number('x-ratelimit-limit-tokens'),
+                number('x-ratelimit-remaining-tokens'),
+                parse_duration(headers.get('x-ratelimit-reset-tokens')),
+                now)
+            # OpenRouter style: one per-minute request limit, reset as epoch milliseconds
+            if headers.get('x-ratelimit-limit') is not None:
+                reset = number('x-ratelimit-reset')
+                route.requests.learn(
+                    number('x-ratelimit-limit'),
+                    number('x-ratelimit-remaining'),
+                    max(reset / 1000.0 - time.time(), 0.0) if reset else None,
+                    now)
+            retry_after = parse_duration(headers.get('retry-after'))
+            if retry_after:
+                route.requests.blocked_until = max(route.requests.blocked_until, now + retry_after)
+            route.wake_head()
+
+    def backoff(self, provider: str, model: str, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Block a route after a 429; returns the extra jittered delay for the retrying call"""
+        delay = retry_after if retry_after else min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+        with self._lock:
+            route = self._route(provider, model)
+            route.requests.blocked_until = max(route.requests.blocked_until, time.monotonic() + delay)
+        # Full jitter spreads the retries of calls that were throttled together
+        return random.uniform(0, delay)
+
+    def acquire(self, provider: str, model: str, tokens: int, priority: int = 0,
+                deadline: Optional[float] = None) -> float:
+        """
+        Wait for capacity on a route; returns the seconds spent waiting
+
+        Args:
+            tokens: Tokens the call may consume (see request_tokens)
+            priority: Lower runs first (0 for interactive chats)
+            deadline: time.monotonic() value after which RateLimitError is raised
+        """
+        started = time.monotonic()
+        waiter = _Waiter(tokens, deadline or started + self.max_wait)
+        self._wait_sync(provider, model, priority, waiter)
+        return self._waited(provider, started)
+
+    async def acquire_async(self, provider: str, model: str, tokens: int, priority: int = 0,
+                            deadline: Optional[float] = None) -> float:
+        """Asyncio counterpart of acquire()"""
+        started = time.monotonic()
+        waiter = _Waiter(tokens, deadline or started + self.max_wait, asyncio.get_running_loop())
+        await self._wait_async(provider, model, priority, waiter)
+        return self._waited(provider, started)
+
+    def _enqueue(self, provider, model, priority, waiter):
+        with self._lock:
+            route = self._route(provider, model)
+            heapq.heappush(route.queue, (priority, next(self._seq), waiter))
+            metrics.RATE_LIMIT_QUEUE.labels(provider).inc()
+        return route
+
+    def _poll(self, provider, route, waiter):
+        """(done, timeout) for one wait step; raises once the deadline has passed"""
+        with self._lock:
+            now = time.monotonic()
+            wait = route.try_take(waiter, now)
+            if wait == 0:
+                return True, None
+            remaining = waiter.deadline - now
+            if remaining <= 0 or (wait is not None and wait > remaining):
+                route.remove(waiter)
+                metrics.RATE_LIMIT_EVENTS.labels(provider, 'expired').inc()
+                raise RateLimitError(
+                    f"{provider} rate limit: request could not be scheduled in time",
+                    retry_after=wait)
+            waiter.event.clear()
+            return False, remaining if wait is None else wait
+
+    def _wait_sync(self, provider, model, priority, waiter):
+        route = self._enqueue(provider, model, priority, waiter)
+        try:
+            while True:
+                done, timeout = self._poll(provider, route, waiter)
+                if done:
+                    return
+                waiter.event.wait(timeout)
+        except BaseException:
+            # Also a gevent Timeout or KeyboardInterrupt: never leave a dead head blocking the queue
+            with self._lock:
+                route.remove(waiter)
+            raise
+        finally:
+            metrics.RATE_LIMIT_QUEUE.labels(provider).dec()
+
+    async def _wait_async(self, provider, model, priority, waiter):
+        route = self._enqueue(provider, model, priority, waiter)
+        try:
+            while True:
+                done, timeout = self._poll(provider, route, waiter)
+                if done:
+                    return
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._lock:
+                route.remove(waiter)
+            raise
+        finally:
+            metrics.RATE_LIMIT_QUEUE.labels(provider).dec()
+
+    @staticmethod
+    def _waited(provider, started):
+        waited = time.monotonic() - started
+        metrics.RATE_LIMIT_WAIT.labels(provider).observe(waited)
+        return waited
+
+    def run(self, provider: str, model: str, tokens: int, fn: Callable[[], object],
+            priority: int = 0, deadline: Optional[float] = None):
+        """Call fn() once the route has capacity, retrying 429s until the deadline"""
+        deadline = deadline or time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            self.acquire(provider, model, tokens, priority, deadline)
+            try:
+                return fn()
+            except RateLimitError as e:
+                attempt += 1
+                delay = self._retry_delay(provider, model, attempt, e, deadline)
+                time.sleep(delay)
+
+    async def run_async(self, provider: str, model: str, tokens: int, fn,
+                        priority: int = 0, deadline: Optional[float] = None):
+        """Asyncio counterpart of run(); fn returns an awaitable"""
+        deadline = deadline or time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            await self.acquire_async(provider, model, tokens, priority, deadline)
+            try:
+                return await fn()
+            except RateLimitError as e:
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(provider, model, attempt, e, deadline))
+
+    def run_stream(self, provider: str, model: str, tokens: int, open_stream: Callable,
+                   priority: int = 0, deadline: Optional[float] = None):
+        """
+        Yield from open_stream() once the route has capacity
+
+        A 429 is retried only until the first chunk arrives; after that the
+        caller has already seen part of the answer.
+        """
+        deadline = deadline or time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            self.acquire(provider, model, tokens, priority, deadline)
+            stream = open_stream()
+            try:
+                first = next(stream, None)
+            except RateLimitError as e:
+                stream.close()
+                attempt += 1
+                time.sleep(self._retry_delay(provider, model, attempt, e, deadline))
+                continue
+            break
+        try:
+            if first is not None:
+                yield first
+            yield from stream
+        finally:
+            stream.close()
+
+    async def run_stream_async(self, provider: str, model: str, tokens: int, open_stream: Callable,
+                               priority: int = 0, deadline: Optional[float] = None):
+        """Asyncio counterpart of run_stream(); open_stream returns an async iterator"""
+        deadline = deadline or time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            await self.acquire_async(provider, model, tokens, priority, deadline)
+            stream = open_stream()
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except RateLimitError as e:
+                await stream.aclose()
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(provider, model, attempt, e, deadline))
+                continue
+            break
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def _retry_delay(self, provider, model, attempt, error, deadline):
+        """Back the route off after a 429; re-raises once retries or time run out"""
+        metrics.RATE_LIMIT_EVENTS.labels(provider, 'throttled').inc()
+        self.observe(provider, model, error.headers)
+        delay = self.backoff(provider, model, attempt, error.retry_after)
+        if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+            raise error
+        metrics.RATE_LIMIT_EVENTS.labels(provider, 'retried').inc()
+        return delay
@@ -0,0 +1,157 @@
+"""
+Exact-match cache for deterministic chat answers.
+
+Requests are keyed by a hash of the canonical (provider, model, packed
+messages, temperature, max_tokens), so only byte-identical requests hit.
+Only low-temperature requests are cached (by default temperature 0), where
+the provider would return the same answer anyway. Two tiers:
+
+- memory: a bounded LRU per worker process
+- disk (optional): one small JSON file per entry in a directory shared by all
+  gunicorn workers on the host
+
+Both tiers expire entries after a TTL.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def request_key(provider: str, model: str, messages, temperature: float, max_tokens: int) -> str:
+    """Canonical hash of a chat request"""
+    canonical = json.dumps(
+        [provider, model, float(temperature), int(max_tokens),
+         [[m['role'], m['content']] for m in messages]],
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional shared disk) chat answer cache"""
+
+    def __init__(self, enabled: bool = False, ttl: float = 3600.0, max_entries: int = 10000,
+                 directory: Optional[str] = None, max_disk_entries: int = 100000,
+                 max_temperature: float = 0.0) -> None:
+        """
+        Args:
+            enabled: Master switch (the cache is opt-in)
+            ttl: Seconds an answer stays valid
+            max_entries: Entries kept in the in-process LRU
+            directory: Disk tier location shared by workers (None disables it)
+            max_disk_entries: Files kept on disk before the oldest are pruned
+            max_temperature: Highest sampling temperature considered deterministic
+        """
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.directory = directory if enabled else None
+        self.max_disk_entries = max_disk_entries
+        self.max_temperature = max_temperature
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def cacheable(self, temperature: float) -> bool:
+        """True if a request at this temperature may be served from the cache"""
+        return self.enabled and temperature <= self.max_temperature
+
+    def get(self, key: str):
+        """
+        Return (value, tier) for a live entry, or (None, None) on a miss
+
+        tier is 'memory' or 'disk'.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return value, 'memory'
+                del self._memory[key]
+
+        if not self.directory:
+            return None, None
+        try:
+            with open(self._path(key), 'rb') as handle:
+                record = json.loads(handle.read())
+        except (OSError, ValueError):
+            return None, None
+        if record.get('expires_at', 0) <= now:
+            return None, None
+        self._put_memory(key, record['expires_at'], record['value'])
+        return record['value'], 'disk'
+
+    def put(self, key: str, value: Dict[str, object]) -> None:
+        """Store an answer in both tiers"""
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, expires_at, value)
+        if not self.directory:
+            return
+
+        data = json.dumps({'expires_at': expires_at, 'value': value}).encode('utf-8')
+        # Write-then-rename so concurrent workers never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"[WARNING] Response cache disk write failed: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 256 == 0
+        if prune:
+            self._prune_disk()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _put_memory(self, key, expires_at, value):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        """Drop expired files, then the oldest beyond max_disk_entries"""
+        cutoff = time.time() - self.ttl
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if mtime < cutoff:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            entries.append((mtime, path))
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_disk_entries)]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
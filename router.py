@@ -0,0 +1,508 @@
+"""
+Cross-provider chat routing: hedged requests, failover and circuit breakers.
+
+A chat goes to the requested provider/model first. If it has not answered
+within that model's observed p95 latency, one hedge request is sent to a
+configured equivalent model on another provider; whichever answers first
+wins and the other is cancelled (sync calls already in flight finish in the
+background and their answer is discarded). Provider failures (timeouts,
+connection errors, 429 and 5xx) fail over to the next equivalent immediately;
+client errors (bad key, bad request, unknown model) are returned as they are
+and leave the circuit alone. Per-provider circuit breakers skip providers that
+keep failing, and let one probe request through after a cool-down. A probe
+that is cancelled before it reports an outcome (losing hedge, client
+disconnect) gives its slot back; one that never reports expires after the
+cool-down.
+
+Equivalents come from HEDGE_MODEL_MAP, a JSON object mapping "provider:model"
+to a list of "provider:model" alternatives; a model of "*" matches every model
+of that provider:
+
+    {"groq:llama3-70b-8192": ["openrouter:meta-llama/llama-3-70b-instruct:free"],
+     "groq:*": ["gemini:gemini-1.5-flash"]}
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from rate_limiter import RateLimitError, request_tokens
+
+Route = Tuple[str, str]
+
+
+class CircuitOpenError(Exception):
+    """No route for a chat is available: every candidate provider's circuit is open"""
+
+    def __init__(self, provider: str) -> None:
+        super().__init__(f"{provider} is unavailable (circuit open) and no equivalent model is configured")
+        self.provider = provider
+
+
+def parse_model_map(raw: str) -> Dict[Route, List[Route]]:
+    """Parse a HEDGE_MODEL_MAP value into {(provider, model): [(provider, model), ...]}"""
+    if not raw or not raw.strip():
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        print(f"[WARNING] Ignoring invalid HEDGE_MODEL_MAP: {e}")
+        return {}
+
+    def route(value):
+        # Model ids may contain ':' (e.g. OpenRouter ':free'); split on the first one only
+        provider, _, model = value.partition(':')
+        return provider.strip().lower(), model.strip()
+
+    return {route(key): [route(v) for v in values] for key, values in data.items()}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK or httpx error, if any"""
+    for value in (getattr(error, 'status_code', None),
+                  getattr(getattr(error, 'response', None), 'status_code', None),
+                  # google.api_core errors carry the HTTP status as .code
+                  getattr(error, 'code', None)):
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    True if an error says the provider is unhealthy: timeouts, connection errors, 429 and 5xx
+
+    Clients re-raise SDK errors as readable exceptions, so the original is
+    found through the exception chain. An error without any HTTP status
+    (timeout, refused connection, broken stream) counts as a failure; a 4xx
+    other than 408/429 is the request's fault and does not.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, RateLimitError):
+            return True
+        status = _status_code(error)
+        if status is not None:
+            return status >= 500 or status in (408, 429)
+        error = error.__cause__ or error.__context__
+    return True
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one provider"""
+
+    __slots__ = ('failure_threshold', 'reset_timeout', 'failures', 'opened_at', '_probing', '_lock')
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # When the current half-open probe was let through (None if there is none)
+        self._probing: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """True if a request may be sent (one probe at a time once half-open)"""
+        return self.acquire() is not None
+
+    def acquire(self) -> Optional[str]:
+        """
+        Admit a request: 'closed', 'probe' (the half-open probe), or None if refused
+
+        Whoever is admitted as the probe must report an outcome or call
+        release_probe(); a probe that does neither expires after reset_timeout.
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return 'closed'
+            if state == 'open':
+                return None
+            now = time.monotonic()
+            if self._probing is not None and now - self._probing < self.reset_timeout:
+                return None
+            self._probing = now
+            return 'probe'
+
+    def release_probe(self) -> None:
+        """Give back the probe slot without an outcome (the probe was cancelled)"""
+        with self._lock:
+            self._probing = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = None
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this failure opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            tripped = self._probing is not None or (self.opened_at is None and self.failures >= self.failure_threshold)
+            self._probing = None
+            if tripped:
+                self.opened_at = time.monotonic()
+            return tripped
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls to one model"""
+
+    __slots__ = ('samples', 'min_samples')
+
+    def __init__(self, size: int = 200, min_samples: int = 20) -> None:
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th percentile (0-1), or None until enough samples were seen"""
+        samples = sorted(self.samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ChatRouter:
+    """Routes chat calls across providers with hedging, failover and circuit breakers"""
+
+    def __init__(
+        self,
+        clients: Dict[str, object],
+        equivalents: Optional[Dict[Route, List[Route]]] = None,
+        hedge: bool = True,
+        default_delay: float = 2.0,
+        min_delay: float = 0.1,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_workers: int = 64,
+        scheduler=None,
+    ) -> None:
+        """
+        Args:
+            clients: Provider name -> client (None for unconfigured providers)
+            equivalents: Alternatives per (provider, model), see parse_model_map
+            hedge: Send hedge requests (failover on errors happens regardless)
+            default_delay: Hedge delay used until a model has enough latency samples
+            min_delay: Lower bound for the p95-based hedge delay
+            failure_threshold: Consecutive failures that open a provider's circuit
+            reset_timeout: Seconds an open circuit waits before letting a probe through
+            max_workers: Threads for concurrent sync calls (per process)
+            scheduler: RateScheduler that paces calls per route and retries 429s (None to call directly)
+        """
+        self.clients = clients
+        self.equivalents = equivalents or {}
+        self.hedge = hedge
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_workers = max_workers
+        self.scheduler = scheduler
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[Route, LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+
+    def with_clients(self, clients: Dict[str, object]) -> 'ChatRouter':
+        """A router with the same configuration over a different set of clients"""
+        return ChatRouter(
+            clients, self.equivalents, self.hedge, self.default_delay, self.min_delay,
+            self.failure_threshold, self.reset_timeout, self.max_workers, self.scheduler,
+        )
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    provider, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Circuit state per provider (for health output)"""
+        return {
+            name: {'state': breaker.state, 'failures': breaker.failures}
+            for name, breaker in self._breakers.items()
+        }
+
+    def candidates(self, provider: str, model: str) -> List[Route]:
+        """The requested route followed by its configured equivalents (configured providers only)"""
+        routes = [(provider, model)]
+        routes += self.equivalents.get((provider, model), [])
+        routes += self.equivalents.get((provider, '*'), [])
+        seen = set()
+        result = []
+        for route in routes:
+            if route in seen or self.clients.get(route[0]) is None:
+                continue
+            seen.add(route)
+            result.append(route)
+        return result
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        """Seconds to wait for a route before hedging: its observed p95 latency"""
+        window = self._latency.get((provider, model))
+        p95 = window.percentile(0.95) if window is not None else None
+        if p95 is None:
+            return self.default_delay
+        return max(self.min_delay, p95)
+
+
+    def select(self, provider: str, model: str) -> Route:
+        """First route whose circuit allows a request (the requested one if none do)"""
+        admitted = self.admit(provider, model)
+        return admitted[0] if admitted is not None else (provider, model)
+
+    def admit(self, provider: str, model: str) -> Optional[Tuple[Route, bool]]:
+        """
+        Like select(), also telling whether the request is its provider's half-open probe
+
+        Returns None when every candidate's circuit is open (chat() raises
+        CircuitOpenError then). A caller holding the probe must record() an
+        outcome or release() it, including when the client goes away mid-call.
+        """
+        for route in self.candidates(provider, model):
+            admitted = self.breaker(route[0]).acquire()
+            if admitted is not None:
+                if route[0] != provider:
+                    metrics.FAILOVERS.labels(provider, route[0]).inc()
+                return route, admitted == 'probe'
+        return None
+
+    def release(self, provider: str) -> None:
+        """Give back a probe that was cancelled before it reported an outcome"""
+        self.breaker(provider).release_probe()
+
+    def record(self, provider: str, model: str, latency: Optional[float] = None,
+               error: Optional[BaseException] = None) -> None:
+        """Feed the outcome of a call into the circuit breaker and latency stats"""
+        if error is not None:
+            if not is_provider_failure(error):
+                # The provider answered; the request itself was rejected
+                return
+            if self.breaker(provider).record_failure():
+                metrics.CIRCUIT_OPENED.labels(provider).inc()
+            return
+        self.breaker(provider).record_success()
+        if latency is not None:
+            window = self._latency.get((provider, model))
+            if window is None:
+                window = self._latency.setdefault((provider, model), LatencyWindow())
+            window.record(latency)
+
+    def chat(self, provider: str, model: str, messages, max_tokens: int,
+             temperature: float = 0.7, priority: int = 0, hedge: bool = True) -> Tuple[str, str, str]:
+        """
+        Send a chat with hedging and failover
+
+        priority orders calls waiting for rate-limit capacity (lower runs first).
+        hedge=False keeps failover on errors but never sends a second request
+        for a slow one (for bulk work where quota matters more than latency).
+
+        Returns:
+            (assistant text, provider that answered, model that answered)
+        """
+        pool = self._executor()
+        pending = {}
+        launcher = _Launcher(
+            self, self.candidates(provider, model), pending,
+            lambda route: pool.submit(self._call, route, messages, max_tokens, temperature, priority), hedge)
+        if not launcher.launch():
+            raise CircuitOpenError(provider)
+
+        last_error = None
+        while pending:
+            done, _ = wait(pending, timeout=launcher.hedge_timeout(), return_when=FIRST_COMPLETED)
+            if not done:
+                # The primary is slower than usual: race it against an equivalent
+                launcher.hedge()
+                continue
+
+            for future in done:
+                route = pending.pop(future)
+                # Harmless if the call recorded an outcome; frees the probe of a rejected one
+                launcher.release(route)
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    last_error = e
+                    if not pending and is_provider_failure(e):
+                        launcher.launch()
+                    continue
+                for other, other_route in pending.items():
+                    # Not-yet-started calls are dropped; running ones finish, record and are discarded
+                    if other.cancel():
+                        launcher.release(other_route)
+                launcher.won(route)
+                return answer, route[0], route[1]
+        raise last_error
+
+    async def chat_async(self, provider: str, model: str, messages, max_tokens: int,
+                         temperature: float = 0.7, priority: int = 0, hedge: bool = True) -> Tuple[str, str, str]:
+        """Asyncio counterpart of chat() for async clients; losing calls are cancelled"""
+        pending = {}
+        launcher = _Launcher(
+            self, self.candidates(provider, model), pending,
+            lambda route: asyncio.ensure_future(self._call_async(route, messages, max_tokens, temperature, priority)),
+            hedge)
+        if not launcher.launch():
+            raise CircuitOpenError(provider)
+
+        last_error = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=launcher.hedge_timeout(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launcher.hedge()
+                    continue
+
+                for task in done:
+                    route = pending.pop(task)
+                    launcher.release(route)
+                    try:
+                        answer = task.result()
+                    except Exception as e:
+                        last_error = e
+                        if not pending and is_provider_failure(e):
+                            launcher.launch()
+                        continue
+                    launcher.won(route)
+                    return answer, route[0], route[1]
+            raise last_error
+        finally:
+            # A cancelled call never records an outcome, so a probe among them is given back
+            for task, route in pending.items():
+                if task.cancel():
+                    launcher.release(route)
+
+    def _call(self, route, messages, max_tokens, temperature, priority=0):
+        provider, model = route
+        started = None
+
+        def call():
+            # Latency stats cover the upstream call only, not time spent queued for rate limits
+            nonlocal started
+            started = time.perf_counter()
+            with metrics.track_upstream(provider, model, 'chat'):
+                return self.clients[provider].chat(
+                    messages, model=model, temperature=temperature, max_tokens=max_tokens)
+
+        try:
+            if self.scheduler is None:
+                answer = call()
+            else:
+                answer = self.scheduler.run(
+                    provider, model, request_tokens(messages, max_tokens), call, priority)
+        except Exception as e:
+            self.record(provider, model, error=e)
+            raise
+        self.record(provider, model, latency=time.perf_counter() - started)
+        return answer
+
+    async def _call_async(self, route, messages, max_tokens, temperature, priority=0):
+        provider, model = route
+        started = None
+
+        async def call():
+            nonlocal started
+            started = time.perf_counter()
+            with metrics.track_upstream(provider, model, 'chat'):
+                return await self.clients[provider].chat(
+                    messages, model=model, temperature=temperature, max_tokens=max_tokens)
+
+        try:
+            if self.scheduler is None:
+                answer = await call()
+            else:
+                answer = await self.scheduler.run_async(
+                    provider, model, request_tokens(messages, max_tokens), call, priority)
+        except Exception as e:
+            self.record(provider, model, error=e)
+            raise
+        self.record(provider, model, latency=time.perf_counter() - started)
+        return answer
+
+    def _executor(self):
+        # Worker threads don't survive fork; build the pool in the process that uses it
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='chat-router')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+
+class _Launcher:
+    """Starts the routes of one routed call in order, skipping open circuits"""
+
+    __slots__ = ('router', 'routes', 'pending', 'start', 'allow_hedge', 'index', 'hedged', 'probes')
+
+    def __init__(self, router, routes, pending, start, allow_hedge=True):
+        self.router = router
+        self.routes = routes
+        self.pending = pending
+        self.start = start
+        self.allow_hedge = allow_hedge and router.hedge
+        self.index = 0
+        self.hedged = False
+        # Routes started as their provider's half-open probe
+        self.probes = set()
+
+    def launch(self):
+        """Start the next route whose circuit allows it; False if none is left"""
+        while self.index < len(self.routes):
+            route = self.routes[self.index]
+            self.index += 1
+            # Checked only when about to send, so a half-open circuit's probe is never wasted
+            admitted = self.router.breaker(route[0]).acquire()
+            if admitted is None:
+                continue
+            if admitted == 'probe':
+                self.probes.add(route)
+            if route != self.routes[0] and not self.hedged:
+                metrics.FAILOVERS.labels(self.routes[0][0], route[0]).inc()
+            self.pending[self.start(route)] = route
+            return True
+        return False
+
+    def hedge_timeout(self):
+        """Seconds to wait before hedging, or None once hedging is no longer possible"""
+        if not self.allow_hedge or self.hedged or self.index >= len(self.routes) or len(self.pending) != 1:
+            return None
+        return self.router.hedge_delay(*next(iter(self.pending.values())))
+
+    def hedge(self):
+        self.hedged = True
+        if self.launch():
+            provider, model = self.routes[0]
+            metrics.HEDGED_REQUESTS.labels(provider, metrics.model_label(provider, model)).inc()
+
+    def release(self, route):
+        """Give back the probe of a call that was cancelled or rejected without a recorded outcome"""
+        if route in self.probes:
+            self.probes.discard(route)
+            self.router.release(route[0])
+
+    def won(self, route):
+        if self.hedged and route != self.routes[0]:
+            metrics.HEDGE_WINS.labels(route[0]).inc()
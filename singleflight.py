@@ -0,0 +1,106 @@
+"""
+Single-flight coalescing of identical in-flight upstream calls.
+
+While a call for a key is running, further callers with the same key wait for
+it and share its result (or its exception) instead of making their own
+upstream request. If the leading call is killed rather than failing
+(cancelled task, gevent timeout, interrupt), waiting callers start the call
+again instead of sharing an outcome that never came. Coalescing is per
+worker process.
+
+The sync path uses threading primitives only, so it works under gthread
+workers and, once gevent has monkey-patched threading (wsgi_gevent.py), under
+gevent workers too. do_async() is the asyncio counterpart for asgi.py.
+"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+import metrics
+
+T = TypeVar('T')
+
+
+class _Call:
+    """One in-flight call and its outcome"""
+
+    __slots__ = ('done', 'result', 'error', 'aborted')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # The leader was killed (BaseException) before producing an outcome
+        self.aborted = False
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share it"""
+
+    def __init__(self, name: str) -> None:
+        """
+        Args:
+            name: Group label used in metrics (e.g. 'catalog', 'chat')
+        """
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Call fn(), or wait for the identical call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.SINGLEFLIGHT_CALLS.labels(self.name, 'follower').inc()
+            call.done.wait()
+            if call.aborted:
+                return self.do(key, fn)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.SINGLEFLIGHT_CALLS.labels(self.name, 'leader').inc()
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # Not the call's outcome, so it is not shared: followers retry instead
+            call.aborted = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await fn(), or the identical call already in flight"""
+        task = self._tasks.get(key)
+        if task is not None:
+            metrics.SINGLEFLIGHT_CALLS.labels(self.name, 'follower').inc()
+        else:
+            metrics.SINGLEFLIGHT_CALLS.labels(self.name, 'leader').inc()
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # A caller that disconnects must not cancel the call others are waiting on
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if not task.cancelled() or (hasattr(current, 'cancelling') and current.cancelling()):
+                raise
+            # The shared call was cancelled, not this caller: start it again
+            return await self.do_async(key, fn)
+
+    def _finish(self, key, task):
+        self._tasks.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
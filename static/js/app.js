@@ -3,8 +3,19 @@ let currentModel = 'mixtral-8x7b-32768';
 let currentProvider = 'groq';
 let currentTTSMode = 'playai-tts|Fritz-PlayAI'; // Format: "model|voice" or "disabled"
 let isLoading = false;
-let chatHistory = [];
+let chatHistory = []; // Loaded messages in sequence order, each with its server `seq`
+let historySessionId = null; // Conversation the loaded messages belong to
+let historyHasOlder = false; // Older messages exist on the server but are not loaded yet
+let historyCached = true; // chatHistory is a contiguous copy that may be saved locally
+let loadingOlderHistory = false;
+const HISTORY_PAGE_SIZE = 50;
+const HISTORY_CACHE_KEY = 'history_cache';
+const HISTORY_CACHE_MAX = 200; // Newest messages kept in localStorage
 let currentAudio = null; // Track currently playing audio
+const ttsAudioUrls = new Map(); // "model|voice|text" -> cached audio URL for replays
+const ARENA_MAX_MODELS = 4; // Matches the server's default ARENA_MAX_MODELS
+let arenaMode = false;
+let arenaContenders = []; // [{provider, model}], in the order their answers are preferred
 
 // DOM Elements
 const messageInput = document.getElementById('messageInput');
@@ -16,6 +27,10 @@ const modelSelect = document.getElementById('modelSelect');
 const providerSelect = document.getElementById('providerSelect');
 const newChatBtn = document.getElementById('newChatBtn');
 const ttsSelect = document.getElementById('ttsSelect');
+const arenaToggleBtn = document.getElementById('arenaToggleBtn');
+const arenaBar = document.getElementById('arenaBar');
+const arenaContendersList = document.getElementById('arenaContenders');
+const arenaAddBtn = document.getElementById('arenaAddBtn');
 
 // Mobile settings elements
 const hamburgerBtn = document.getElementById('hamburgerBtn');
@@ -39,6 +54,7 @@ document.addEventListener('DOMContentLoaded', () => {
     loadChatHistory();
     // Sessions removed - no database
     loadTTSPreference(); // Load saved TTS voice
+    loadArenaPreference();
     setupEventListeners();
     autoResizeTextarea();
     highlightModelSelector(); // Highlight model selector on first visit
@@ -140,6 +156,27 @@ function setupEventListeners() {
     
     newChatBtn.addEventListener('click', startNewChat);
     
+    // Load older messages when scrolled near the top
+    chatContainer.addEventListener('scroll', () => {
+        if (chatContainer.scrollTop < 200) loadOlderHistory();
+    });
+
+    // Arena mode
+    arenaToggleBtn.addEventListener('click', () => {
+        setArenaMode(!arenaMode);
+        // Start with the model already selected
+        if (arenaMode && arenaContenders.length === 0) {
+            arenaContenders.push({ provider: currentProvider, model: currentModel });
+            saveArenaContenders();
+        }
+    });
+    arenaAddBtn.addEventListener('click', () => {
+        if (arenaContenders.length >= ARENA_MAX_MODELS) return;
+        if (arenaContenders.some(c => c.provider === currentProvider && c.model === currentModel)) return;
+        arenaContenders.push({ provider: currentProvider, model: currentModel });
+        saveArenaContenders();
+    });
+    
     // Example prompts
     document.querySelectorAll('.example-prompt').forEach(btn => {
         btn.addEventListener('click', (e) => {
@@ -209,51 +246,55 @@ async function speakText(text, button) {
         button.classList.add('playing');
         button.disabled = true;
         
-        // Call Flask TTS endpoint
-        const response = await fetch('/api/tts', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                text: cleanText,
-                model: model,
-                voice: voice
-            })
-        });
+        const cacheId = `${model}|${voice}|${cleanText}`;
+        let audioUrl = ttsAudioUrls.get(cacheId);
         
-        if (!response.ok) {
-            const errorData = await response.json();
+        if (!audioUrl) {
+            // Prepare streamed speech; playback starts with the first chunk
+            const response = await fetch('/api/tts/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    text: cleanText,
+                    model: model,
+                    voice: voice
+                })
+            });
             
-            // Special handling for terms required error
-            if (errorData.error_type === 'terms_required') {
-                alert('⚠️ TTS Setup Required\n\n' + errorData.error + '\n\nThis is a one-time setup. After accepting terms, refresh this page.');
-                throw new Error('Terms acceptance required');
+            const data = await response.json();
+            if (!response.ok || !data.success) {
+                // Special handling for terms required error
+                if (data.error_type === 'terms_required') {
+                    alert('⚠️ TTS Setup Required\n\n' + data.error + '\n\nThis is a one-time setup. After accepting terms, refresh this page.');
+                    throw new Error('Terms acceptance required');
+                }
+                
+                throw new Error(data.error || 'TTS request failed');
             }
             
-            throw new Error(errorData.error || 'TTS request failed');
+            // The same URL replays from the server-side cache once the stream completes
+            audioUrl = data.url;
+            ttsAudioUrls.set(cacheId, audioUrl);
         }
         
-        // Get audio blob from response
-        const audioBlob = await response.blob();
-        const audioUrl = URL.createObjectURL(audioBlob);
-        
         // Create and play audio
         currentAudio = new Audio(audioUrl);
         
-        currentAudio.onended = () => {
+        const cleanup = () => {
             button.classList.remove('playing');
             button.disabled = false;
             currentAudio = null;
-            URL.revokeObjectURL(audioUrl); // Clean up
         };
         
+        currentAudio.onended = cleanup;
+        
         currentAudio.onerror = (e) => {
             console.error('Audio playback error:', e);
-            button.classList.remove('playing');
-            button.disabled = false;
-            currentAudio = null;
-            URL.revokeObjectURL(audioUrl);
+            // Cached copy may have been evicted; synthesize again next time
+            ttsAudioUrls.delete(cacheId);
+            cleanup();
         };
         
         await currentAudio.play();
@@ -335,22 +376,145 @@ async function loadModels() {
     }
 }
 
-// Load chat history
+// Load chat history: show the local copy at once, then fetch only what is new
 async function loadChatHistory() {
     try {
-        const response = await fetch('/api/history');
-        const data = await response.json();
-        
-        if (data.success && data.history.length > 0) {
-            chatHistory = data.history;
+        const cached = readHistoryCache();
+        if (cached && cached.messages.length > 0) {
+            historySessionId = cached.sessionId;
+            historyHasOlder = cached.hasOlder;
+            chatHistory = cached.messages;
             hideWelcomeScreen();
             renderChatHistory();
+            await syncHistory();
+        } else {
+            await loadLatestHistory();
+        }
+        // Nothing to scroll yet: load older pages until the view is filled
+        while (historyHasOlder && chatContainer.scrollHeight <= chatContainer.clientHeight) {
+            const loaded = chatHistory.length;
+            await loadOlderHistory();
+            if (chatHistory.length === loaded) break;
         }
     } catch (error) {
         console.error('Error loading chat history:', error);
     }
 }
 
+// Fetch one page of /api/history (null on failure)
+async function fetchHistory(params) {
+    const response = await fetch('/api/history?' + new URLSearchParams(params));
+    const data = await response.json();
+    return data.success ? data : null;
+}
+
+// Replace the loaded history with the newest page of the conversation
+async function loadLatestHistory() {
+    const data = await fetchHistory({ limit: HISTORY_PAGE_SIZE });
+    if (!data) return;
+    historySessionId = data.session_id;
+    historyHasOlder = data.has_older;
+    historyCached = true;
+    chatHistory = data.history;
+    saveHistoryCache();
+    if (chatHistory.length > 0) {
+        hideWelcomeScreen();
+        renderChatHistory();
+    } else {
+        showWelcomeScreen();
+    }
+}
+
+// Fetch the messages added after the newest loaded one
+async function syncHistory() {
+    while (true) {
+        const last = chatHistory[chatHistory.length - 1];
+        const data = await fetchHistory({ since: last.seq, limit: HISTORY_PAGE_SIZE });
+        if (!data) return;
+        if (data.session_id !== historySessionId || last.seq < data.first_seq) {
+            // Another conversation, or everything loaded was cleared or trimmed
+            await loadLatestHistory();
+            return;
+        }
+        if (chatHistory[0].seq < data.first_seq) {
+            // The oldest loaded messages were trimmed on the server
+            chatHistory = chatHistory.filter(msg => msg.seq >= data.first_seq);
+            renderChatHistory();
+        }
+        data.history.forEach(msg => addMessage(msg.role, msg.content, msg.timestamp));
+        chatHistory = chatHistory.concat(data.history);
+        historyHasOlder = chatHistory[0].seq > data.first_seq;
+        if (!data.has_newer) break;
+    }
+    saveHistoryCache();
+}
+
+// Prepend the page before the oldest loaded message, keeping the scroll position
+async function loadOlderHistory() {
+    if (loadingOlderHistory || !historyHasOlder || chatHistory.length === 0) return;
+    loadingOlderHistory = true;
+    try {
+        const data = await fetchHistory({ before: chatHistory[0].seq, limit: HISTORY_PAGE_SIZE });
+        if (!data || data.session_id !== historySessionId) return;
+        historyHasOlder = data.has_older;
+        if (data.history.length === 0) return;
+        
+        const previousHeight = chatContainer.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        data.history.forEach(msg => fragment.appendChild(createMessageElement(msg.role, msg.content, msg.timestamp)));
+        messagesContainer.insertBefore(fragment, messagesContainer.firstChild);
+        chatContainer.scrollTop += chatContainer.scrollHeight - previousHeight;
+        
+        chatHistory = data.history.concat(chatHistory);
+        saveHistoryCache();
+    } catch (error) {
+        console.error('Error loading older messages:', error);
+    } finally {
+        loadingOlderHistory = false;
+    }
+}
+
+// Record a completed turn locally, without refetching it
+function recordTurn(userContent, assistantContent, payload) {
+    if (payload.seq === null || payload.seq === undefined) return;
+    const last = chatHistory[chatHistory.length - 1];
+    if (last && last.seq !== payload.seq - 2) {
+        // Other messages came in between (another tab); the next load fetches them
+        historyCached = false;
+        localStorage.removeItem(HISTORY_CACHE_KEY);
+        return;
+    }
+    chatHistory.push(
+        { role: 'user', content: userContent, timestamp: payload.timestamp, model: payload.model, seq: payload.seq - 1 },
+        { role: 'assistant', content: assistantContent, timestamp: payload.timestamp, model: payload.model, seq: payload.seq }
+    );
+    saveHistoryCache();
+}
+
+function readHistoryCache() {
+    try {
+        return JSON.parse(localStorage.getItem(HISTORY_CACHE_KEY));
+    } catch (error) {
+        return null;
+    }
+}
+
+// Keep the newest messages of the conversation in localStorage
+function saveHistoryCache() {
+    if (!historyCached || !historySessionId) return;
+    const messages = chatHistory.slice(-HISTORY_CACHE_MAX);
+    try {
+        localStorage.setItem(HISTORY_CACHE_KEY, JSON.stringify({
+            sessionId: historySessionId,
+            hasOlder: historyHasOlder || messages.length < chatHistory.length,
+            messages: messages
+        }));
+    } catch (error) {
+        // Over the storage quota: do without the local copy
+        localStorage.removeItem(HISTORY_CACHE_KEY);
+    }
+}
+
 // (Removed) Sessions UI and switching logic - not used in minimalist mode
 
 // Send message
@@ -359,6 +523,11 @@ async function sendMessage() {
     
     if (!message || isLoading) return;
     
+    if (arenaMode) {
+        await sendArenaMessage(message);
+        return;
+    }
+    
     // Hide welcome screen
     hideWelcomeScreen();
     
@@ -376,10 +545,11 @@ async function sendMessage() {
     isLoading = true;
     
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
             },
             body: JSON.stringify({
                 message: message,
@@ -388,16 +558,44 @@ async function sendMessage() {
             })
         });
         
-        const data = await response.json();
+        if (!response.ok || !response.body) {
+            removeTypingIndicator(typingId);
+            const data = await response.json().catch(() => ({}));
+            showError(data.error || 'Failed to get response');
+            return;
+        }
         
-        // Remove typing indicator
-        removeTypingIndicator(typingId);
+        let streamingMessage = null;
+        let fullText = '';
         
-        if (data.success) {
-            addMessage('assistant', data.message, data.timestamp);
-            // Sessions removed - no database
-        } else {
-            showError(data.error || 'Failed to get response');
+        await readEventStream(response, (event, payload) => {
+            if (event === 'token') {
+                if (!streamingMessage) {
+                    // Swap the typing indicator for the message on first token
+                    removeTypingIndicator(typingId);
+                    streamingMessage = createStreamingMessage();
+                }
+                fullText += payload.delta;
+                streamingMessage.update(fullText);
+            } else if (event === 'done') {
+                removeTypingIndicator(typingId);
+                if (streamingMessage) streamingMessage.remove();
+                addMessage('assistant', fullText, payload.timestamp);
+                streamingMessage = null;
+                recordTurn(message, fullText, payload);
+            } else if (event === 'error') {
+                removeTypingIndicator(typingId);
+                if (streamingMessage) streamingMessage.remove();
+                streamingMessage = null;
+                showError(payload.error || 'Failed to get response');
+            }
+        });
+        
+        // Stream ended without a terminal event (connection dropped)
+        removeTypingIndicator(typingId);
+        if (streamingMessage) {
+            streamingMessage.remove();
+            showError('Response was interrupted. Please try again.');
         }
     } catch (error) {
         removeTypingIndicator(typingId);
@@ -408,8 +606,271 @@ async function sendMessage() {
     }
 }
 
+// Restore arena mode and its contenders from localStorage
+function loadArenaPreference() {
+    try {
+        arenaContenders = JSON.parse(localStorage.getItem('arena_contenders') || '[]').slice(0, ARENA_MAX_MODELS);
+    } catch (error) {
+        arenaContenders = [];
+    }
+    setArenaMode(localStorage.getItem('arena_mode') === 'on');
+    renderArenaContenders();
+}
+
+// Turn arena mode on or off
+function setArenaMode(enabled) {
+    arenaMode = enabled;
+    localStorage.setItem('arena_mode', enabled ? 'on' : 'off');
+    arenaBar.hidden = !enabled;
+    arenaToggleBtn.classList.toggle('active', enabled);
+    arenaToggleBtn.setAttribute('aria-pressed', String(enabled));
+}
+
+function saveArenaContenders() {
+    localStorage.setItem('arena_contenders', JSON.stringify(arenaContenders));
+    renderArenaContenders();
+}
+
+// Show the contenders as removable chips
+function renderArenaContenders() {
+    arenaContendersList.innerHTML = '';
+    arenaContenders.forEach((contender, index) => {
+        const chip = document.createElement('span');
+        chip.className = 'arena-chip';
+        chip.textContent = `${contender.provider} · ${contender.model}`;
+        
+        const removeBtn = document.createElement('button');
+        removeBtn.className = 'arena-chip-remove';
+        removeBtn.textContent = '×';
+        removeBtn.title = 'Remove';
+        removeBtn.onclick = () => {
+            arenaContenders.splice(index, 1);
+            saveArenaContenders();
+        };
+        
+        chip.appendChild(removeBtn);
+        arenaContendersList.appendChild(chip);
+    });
+    arenaAddBtn.disabled = arenaContenders.length >= ARENA_MAX_MODELS;
+}
+
+// Send a message to every arena contender, rendering their answers side by side
+async function sendArenaMessage(message) {
+    if (arenaContenders.length === 0) {
+        showError('Add at least one model to the arena.');
+        return;
+    }
+    
+    hideWelcomeScreen();
+    addMessage('user', message);
+    
+    messageInput.value = '';
+    sendBtn.disabled = true;
+    autoResizeTextarea();
+    
+    isLoading = true;
+    const round = createArenaRound(arenaContenders);
+    
+    try {
+        const response = await fetch('/api/chat/arena', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({
+                message: message,
+                contenders: arenaContenders
+            })
+        });
+        
+        if (!response.ok || !response.body) {
+            round.remove();
+            const data = await response.json().catch(() => ({}));
+            showError(data.error || 'Failed to get response');
+            return;
+        }
+        
+        let finished = false;
+        await readEventStream(response, (event, payload) => {
+            if (event === 'token') {
+                round.append(payload.slot, payload.delta);
+            } else if (event === 'result' || event === 'error') {
+                round.finish(payload);
+            } else if (event === 'done') {
+                round.recorded(payload.recorded);
+                if (payload.recorded !== null && payload.recorded !== undefined) {
+                    const winner = arenaContenders[payload.recorded];
+                    recordTurn(message, round.text(payload.recorded), Object.assign({ model: winner && winner.model }, payload));
+                }
+                finished = true;
+            }
+        });
+        
+        if (!finished) {
+            showError('Response was interrupted. Please try again.');
+        }
+    } catch (error) {
+        showError('Network error. Please try again.');
+        console.error('Error sending arena message:', error);
+    } finally {
+        isLoading = false;
+    }
+}
+
+// Create one column per contender; each streams its own answer and stats
+function createArenaRound(contenders) {
+    const roundDiv = document.createElement('div');
+    roundDiv.className = 'arena-round';
+    
+    const columns = contenders.map(contender => {
+        const column = document.createElement('div');
+        column.className = 'arena-column';
+        
+        const header = document.createElement('div');
+        header.className = 'arena-column-header';
+        header.textContent = `${contender.provider} · ${contender.model}`;
+        
+        const textDiv = document.createElement('div');
+        textDiv.className = 'message-text';
+        textDiv.innerHTML = '<div class="typing-indicator"><span class="typing-dot"></span><span class="typing-dot"></span><span class="typing-dot"></span></div>';
+        
+        const stats = document.createElement('div');
+        stats.className = 'arena-stats';
+        
+        column.appendChild(header);
+        column.appendChild(textDiv);
+        column.appendChild(stats);
+        roundDiv.appendChild(column);
+        return { column, textDiv, stats, text: '', pending: false };
+    });
+    
+    messagesContainer.appendChild(roundDiv);
+    scrollToBottom();
+    
+    const render = (entry) => {
+        // Coalesce renders to one per animation frame and column
+        if (entry.pending) return;
+        entry.pending = true;
+        requestAnimationFrame(() => {
+            entry.pending = false;
+            entry.textDiv.innerHTML = formatMessage(entry.text);
+            scrollToBottom();
+        });
+    };
+    
+    return {
+        append(slot, delta) {
+            const entry = columns[slot];
+            entry.text += delta;
+            render(entry);
+        },
+        finish(result) {
+            const entry = columns[result.slot];
+            if (!entry.text) entry.textDiv.innerHTML = '';
+            if (result.error) {
+                entry.column.classList.add('failed');
+                entry.stats.textContent = result.error;
+                return;
+            }
+            const parts = [];
+            if (result.ttfb_ms !== null) parts.push(`TTFB ${Math.round(result.ttfb_ms)} ms`);
+            if (result.total_ms !== null) parts.push(`${(result.total_ms / 1000).toFixed(2)} s total`);
+            parts.push(`${result.chars} chars`, `~${result.tokens} tokens`);
+            entry.stats.textContent = parts.join(' · ');
+        },
+        text(slot) {
+            return columns[slot].text;
+        },
+        recorded(slot) {
+            if (slot === null || slot === undefined) return;
+            columns[slot].column.classList.add('recorded');
+            columns[slot].column.title = 'This answer continues the conversation';
+        },
+        remove() {
+            roundDiv.remove();
+        }
+    };
+}
+
+// Read a text/event-stream response body and dispatch each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Create an assistant message that is re-rendered as tokens arrive
+function createStreamingMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant';
+    
+    const avatar = document.createElement('div');
+    avatar.className = 'message-avatar';
+    avatar.textContent = 'AI';
+    
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+    
+    const textDiv = document.createElement('div');
+    textDiv.className = 'message-text';
+    
+    contentDiv.appendChild(textDiv);
+    messageDiv.appendChild(avatar);
+    messageDiv.appendChild(contentDiv);
+    messagesContainer.appendChild(messageDiv);
+    
+    let pendingText = null;
+    
+    return {
+        update(text) {
+            // Coalesce renders to one per animation frame
+            const scheduled = pendingText !== null;
+            pendingText = text;
+            if (scheduled) return;
+            requestAnimationFrame(() => {
+                if (pendingText === null) return;
+                textDiv.innerHTML = formatMessage(pendingText);
+                pendingText = null;
+                scrollToBottom();
+            });
+        },
+        remove() {
+            pendingText = null;
+            messageDiv.remove();
+        }
+    };
+}
+
 // Add message to UI
 function addMessage(role, content, timestamp = null) {
+    messagesContainer.appendChild(createMessageElement(role, content, timestamp));
+    scrollToBottom();
+}
+
+// Build the element for one chat message
+function createMessageElement(role, content, timestamp = null) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${role}`;
     
@@ -456,8 +917,7 @@ function addMessage(role, content, timestamp = null) {
     messageDiv.appendChild(avatar);
     messageDiv.appendChild(contentDiv);
     
-    messagesContainer.appendChild(messageDiv);
-    scrollToBottom();
+    return messageDiv;
 }
 
 // Format message with markdown-like syntax
@@ -616,6 +1076,10 @@ async function startNewChat() {
             
             if (data.success) {
                 chatHistory = [];
+                historySessionId = data.session_id;
+                historyHasOlder = false;
+                historyCached = true;
+                saveHistoryCache();
                 showWelcomeScreen();
                 messageInput.value = '';
                 sendBtn.disabled = true;
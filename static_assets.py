@@ -0,0 +1,120 @@
+"""
+Fingerprinted, precompressed static assets.
+
+build() copies each stylesheet and script under static/ to a build directory
+under a content-hashed name (css/style.3f2a9c1e0b7d.css). Next to each copy
+it writes a gzip file and, if brotli is installed, a brotli file, both
+compressed once with the maximum settings. Templates link to
+asset_url('css/style.css'). The URL changes whenever the file's content
+changes, so /assets/ responses can be cached as immutable for a year. A
+redeploy invalidates exactly the assets that changed.
+
+Built files are keyed by content hash, so a restart or another worker reuses
+them and only hashes the sources. Files are written then renamed, so workers
+building at the same time never serve a partial file. If the build directory
+is not writable, asset_url() falls back to the plain /static/ URL.
+
+Prebuild (e.g. in a Docker image) with:
+    python static_assets.py
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
+
+import compression
+
+EXTENSIONS = ('.css', '.js')
+# Fingerprinted names never change content, so clients may keep them forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'groq-chatbot-static')
+
+
+class StaticAssets:
+    """Content-hashed copies of the static stylesheets and scripts, with precompressed variants"""
+
+    def __init__(self, root: str, directory: str) -> None:
+        """
+        Args:
+            root: Static folder to fingerprint (the app's static/)
+            directory: Build directory for the fingerprinted and compressed files
+        """
+        self.root = root
+        self.directory = directory
+        # 'css/style.css' -> 'css/style.3f2a9c1e0b7d.css'
+        self._names: Dict[str, str] = {}
+        # 'css/style.3f2a9c1e0b7d.css' -> {encoding or 'identity': file path}
+        self._files: Dict[str, Dict[str, str]] = {}
+
+    def build(self) -> None:
+        """Fingerprint and compress every asset (a failure leaves that asset on /static/)"""
+        for folder, _, files in os.walk(self.root):
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1] not in EXTENSIONS:
+                    continue
+                source = os.path.join(folder, filename)
+                name = os.path.relpath(source, self.root).replace(os.sep, '/')
+                try:
+                    self._build_one(name, source)
+                except OSError as e:
+                    print(f"[WARNING] Static asset {name} not fingerprinted: {e}")
+
+    def _build_one(self, name, source):
+        with open(source, 'rb') as handle:
+            data = handle.read()
+        stem, extension = os.path.splitext(name)
+        fingerprinted = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        target = os.path.join(self.directory, *fingerprinted.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        variants = {'identity': target}
+        if not os.path.exists(target):
+            self._write_atomic(target, data)
+        for encoding in compression.encodings():
+            path = f"{target}.{'br' if encoding == 'br' else 'gz'}"
+            if not os.path.exists(path):
+                self._write_atomic(path, compression.compress(data, encoding, best=True))
+            variants[encoding] = path
+        self._files[fingerprinted] = variants
+        self._names[name] = fingerprinted
+
+    @staticmethod
+    def _write_atomic(path, data):
+        # Write-then-rename so concurrent workers never serve a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def url(self, name: str) -> Optional[str]:
+        """The /assets/ URL of a static file, or None if it was not fingerprinted"""
+        fingerprinted = self._names.get(name)
+        return f'/assets/{fingerprinted}' if fingerprinted else None
+
+    def resolve(self, fingerprinted: str, accept_encodings) -> Optional[Tuple[str, str, Optional[str]]]:
+        """(path, mimetype, content encoding) of the best variant for a client, or None if unknown"""
+        variants = self._files.get(fingerprinted)
+        if variants is None:
+            return None
+        encoding = accept_encodings.best_match([e for e in compression.encodings() if e in variants])
+        mimetype = mimetypes.guess_type(fingerprinted)[0] or 'application/octet-stream'
+        return variants[encoding or 'identity'], mimetype, encoding
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    here = os.path.dirname(os.path.abspath(__file__))
+    assets = StaticAssets(os.path.join(here, 'static'), os.getenv('STATIC_BUILD_DIR', DEFAULT_DIRECTORY))
+    assets.build()
+    for source, built in sorted(assets._names.items()):
+        print(f"{source} -> {built}")
@@ -0,0 +1,43 @@
+"""Smoke tests for fingerprinted /assets/ responses under the WSGI and ASGI apps"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault('STATIC_BUILD_DIR', tempfile.mkdtemp(prefix='assets-test-'))
+
+import app as wsgi  # noqa: E402
+
+
+def _check_immutable(status, headers):
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in headers['Vary']
+    cache_control = {part.strip() for part in headers['Cache-Control'].split(',')}
+    assert {'public', 'immutable', 'max-age=31536000'} <= cache_control
+
+
+def test_flask_serves_fingerprinted_asset():
+    url = wsgi.static_assets.url('css/style.css')
+    assert url is not None
+    client = wsgi.app.test_client()
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    _check_immutable(response.status_code, response.headers)
+    assert client.get('/assets/css/style.000000000000.css').status_code == 404
+
+
+def test_quart_serves_fingerprinted_asset():
+    pytest.importorskip('quart')
+    import asgi
+
+    async def fetch():
+        client = asgi.app.test_client()
+        found = await client.get(wsgi.static_assets.url('css/style.css'), headers={'Accept-Encoding': 'gzip'})
+        missing = await client.get('/assets/css/style.000000000000.css')
+        return found, missing
+
+    found, missing = asyncio.run(fetch())
+    _check_immutable(found.status_code, found.headers)
+    assert missing.status_code == 404
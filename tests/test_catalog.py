@@ -0,0 +1,43 @@
+"""The provider=all catalog fan-out in the WSGI app"""
+import os
+import tempfile
+import threading
+
+os.environ.setdefault('STATIC_BUILD_DIR', tempfile.mkdtemp(prefix='assets-test-'))
+
+import app as wsgi  # noqa: E402
+
+
+class _Client:
+    FALLBACK_MODELS = [{'id': 'fallback'}]
+
+    def __init__(self, models=None, release=None):
+        self.models = models
+        self.release = release
+        self.calls = 0
+
+    def fetch_models(self):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(10)
+        return self.models
+
+
+def test_hung_provider_holds_one_pool_thread_and_cached_ones_resolve_at_once():
+    release = threading.Event()
+    hung, cached = _Client([{'id': 'slow'}], release), _Client([{'id': 'fast'}])
+    wsgi.model_catalog.invalidate('groq')
+    wsgi.model_catalog.invalidate('gemini')
+    wsgi.model_catalog.get('gemini', cached.fetch_models)
+    try:
+        lookups = [wsgi._catalog_lookup('groq', hung) for _ in range(5)]
+        assert len({id(future) for future in lookups}) == 1
+        # More concurrent requests than pool threads: the cached provider never queues behind them
+        for _ in range(5):
+            assert wsgi._catalog_lookup('gemini', cached).result(timeout=0) == [{'id': 'fast'}]
+    finally:
+        release.set()
+    assert lookups[0].result(timeout=5) == [{'id': 'slow'}]
+    assert hung.calls == 1
+    wsgi.model_catalog.invalidate('groq')
+    wsgi.model_catalog.invalidate('gemini')
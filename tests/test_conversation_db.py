@@ -0,0 +1,63 @@
+"""SQLite conversation store shared by worker processes"""
+from conversation_db import SQLiteConversationStore
+from conversation_store import Message
+
+
+def _message(content, role='user'):
+    return Message(role, content, 't')
+
+
+def test_reinserted_conversation_respects_the_per_user_cap(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / 'chats.db'), max_per_owner=2)
+    deleted = store.create('owner')
+    # Another worker deleted the row while this one still holds the conversation
+    with store._transaction() as db:
+        db.execute('DELETE FROM conversations WHERE id = ?', (deleted.id,))
+    older, newer = store.create('owner'), store.create('owner')
+    store.append(deleted, _message('still here'))
+    assert [c['id'] for c in store.list('owner')] == [deleted.id, newer.id]
+    assert store.get(older.id, 'owner') is None
+
+
+def _workers(tmp_path):
+    """Two stores on one database file, like two gunicorn workers"""
+    path = str(tmp_path / 'chats.db')
+    return SQLiteConversationStore(path), SQLiteConversationStore(path)
+
+
+def _contents(conv):
+    return [m.content for m in conv.messages]
+
+
+def test_cached_copy_catches_up_with_another_workers_appends(tmp_path):
+    first, second = _workers(tmp_path)
+    conv = first.create('owner')
+    first.append(conv, _message('hi'), _message('hello', 'assistant'))
+    cached = second.get(conv.id, 'owner')
+    first.append(conv, _message('more'), _message('sure', 'assistant'))
+    assert second.get(conv.id, 'owner') is cached
+    assert _contents(cached) == ['hi', 'hello', 'more', 'sure']
+    assert cached.version == conv.version == 3
+
+
+def test_append_on_an_outdated_copy_is_ordered_after_the_other_workers_turn(tmp_path):
+    first, second = _workers(tmp_path)
+    conv = first.create('owner')
+    cached = second.get(conv.id, 'owner')
+    first.append(conv, _message('from first'))
+    # No get() in between: the append itself must sync before writing
+    assert second.append(cached, _message('from second')) == 1
+    assert _contents(cached) == ['from first', 'from second']
+    assert _contents(first.get(conv.id, 'owner')) == ['from first', 'from second']
+
+
+def test_clear_by_another_worker_empties_the_cached_copy(tmp_path):
+    first, second = _workers(tmp_path)
+    conv = first.create('owner')
+    first.append(conv, _message('hi'), _message('hello', 'assistant'))
+    cached = second.get(conv.id, 'owner')
+    first.clear(conv)
+    assert second.get(conv.id, 'owner') is cached
+    assert cached.messages == []
+    second.append(cached, _message('again'))
+    assert _contents(first.get(conv.id, 'owner')) == ['again']
@@ -0,0 +1,17 @@
+"""Conversation lookup by the id in the session cookie"""
+from conversation_store import ConversationStore
+
+
+def test_missing_conversation_is_recreated_under_the_cookie_id():
+    # Another worker (or eviction) lost it: the cookie must keep naming the same conversation
+    store = ConversationStore()
+    assert store.get_or_create('cookie-id', 'owner').id == 'cookie-id'
+    assert store.get_or_create('cookie-id', 'owner').id == 'cookie-id'
+
+
+def test_another_owners_id_is_never_adopted():
+    store = ConversationStore()
+    store.get_or_create('taken', 'alice')
+    conv = store.get_or_create('taken', 'mallory')
+    assert conv.id != 'taken' and conv.owner == 'mallory'
+    assert store.get('taken', 'alice') is not None
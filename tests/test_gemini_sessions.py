@@ -0,0 +1,75 @@
+"""Reuse of live Gemini chat sessions across a conversation's turns"""
+import threading
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip('google.generativeai')
+
+from context_packer import pack_conversation  # noqa: E402
+from conversation_store import ConversationStore, Message  # noqa: E402
+from gemini_client import GeminiClient  # noqa: E402
+
+
+class _Reply:
+    usage_metadata = None
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _Chat:
+    def __init__(self, history):
+        self.history = list(history)
+
+    def send_message(self, prompt):
+        return _Reply(f'answer {len(self.history)}')
+
+
+class _Model:
+    def start_chat(self, history):
+        return _Chat(history)
+
+
+def _client():
+    client = GeminiClient.__new__(GeminiClient)
+    client.persistent_sessions = True
+    client.session_cache_size = 10
+    client._sessions = OrderedDict()
+    client._lock = threading.Lock()
+    client._generative_model = lambda model, temperature, max_tokens: _Model()
+    return client
+
+
+def _turn(client, store, conv, prompt, stored_reply=None):
+    """Ask, store the turn (optionally with another answer), return the session used"""
+    user_entry = Message('user', prompt, 't')
+    messages, _ = pack_conversation(conv, user_entry, 100000, 1024)
+    used = []
+    checkout = client._checkout_chat
+
+    def spy(*args):
+        result = checkout(*args)
+        used.append(result[1])
+        return result
+
+    client._checkout_chat = spy
+    reply = client.chat(messages, model='gemini-1.5-flash')
+    del client._checkout_chat
+    store.append(conv, user_entry, Message('assistant', stored_reply or reply, 't'))
+    return used[0]
+
+
+def test_session_is_reused_while_the_stored_history_matches():
+    client, store = _client(), ConversationStore()
+    conv = store.create('owner')
+    first = _turn(client, store, conv, 'hello')
+    assert _turn(client, store, conv, 'and then?') is first
+
+
+def test_session_is_not_reused_after_another_answer_was_stored():
+    # An arena round (or failover) stored a reply this session never produced
+    client, store = _client(), ConversationStore()
+    conv = store.create('owner')
+    first = _turn(client, store, conv, 'hello', stored_reply='from another model')
+    assert _turn(client, store, conv, 'and then?') is not first
@@ -0,0 +1,29 @@
+"""Request values that reach Prometheus labels stay bounded"""
+import os
+import tempfile
+
+os.environ.setdefault('STATIC_BUILD_DIR', tempfile.mkdtemp(prefix='assets-test-'))
+
+import app as wsgi  # noqa: E402
+import metrics  # noqa: E402
+
+
+def test_unknown_models_share_one_label_value():
+    assert metrics.model_label('groq', 'llama3-8b-8192') == 'llama3-8b-8192'
+    assert metrics.model_label('groq', 'playai-tts') == 'playai-tts'
+    assert metrics.model_label('groq', 'made-up-model-1234') == metrics.OTHER_MODEL
+
+
+def test_catalog_models_are_known():
+    wsgi.model_catalog.invalidate('openrouter')
+    try:
+        wsgi.model_catalog.get('openrouter', lambda: [{'id': 'vendor/listed-model'}])
+        assert metrics.model_label('openrouter', 'vendor/listed-model') == 'vendor/listed-model'
+    finally:
+        wsgi.model_catalog.invalidate('openrouter')
+
+
+def test_unknown_provider_is_rejected_before_any_call():
+    response = wsgi.app.test_client().post('/api/chat', json={'message': 'hi', 'provider': 'no-such-provider'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown provider: no-such-provider'
@@ -0,0 +1,22 @@
+"""Expiry and refetch behaviour of the model catalog cache"""
+from model_cache import ModelCatalogCache
+
+
+def test_failed_refetch_of_an_expired_catalog_backs_off_and_is_partial():
+    cache = ModelCatalogCache(ttl=0, max_stale=0, error_ttl=60)
+    calls = []
+
+    def failing_fetch():
+        calls.append(1)
+        raise ConnectionError('upstream down')
+
+    cache.get('groq', lambda: [{'id': 'm'}])
+    assert cache.failure('groq') is None
+    for _ in range(3):
+        assert cache.get('groq', failing_fetch) == [{'id': 'm'}]
+    assert len(calls) == 1
+    assert cache.failure('groq') == 'upstream down'
+
+    cache.error_ttl = 0
+    assert cache.get('groq', lambda: [{'id': 'n'}]) == [{'id': 'n'}]
+    assert cache.failure('groq') is None
@@ -0,0 +1,71 @@
+"""Priority wait queues of the rate scheduler"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from rate_limiter import RateLimitError, RateScheduler, _Waiter
+
+
+class _Interrupt(BaseException):
+    """Stands in for a gevent Timeout raised inside a blocking wait"""
+
+
+class _InterruptedEvent:
+    def clear(self):
+        pass
+
+    def wait(self, timeout=None):
+        raise _Interrupt()
+
+
+def test_interrupted_sync_waiter_leaves_the_queue():
+    scheduler = RateScheduler({('groq', 'm'): (1, None)})
+    scheduler.acquire('groq', 'm', 1)  # spend the only request of this minute
+    waiter = _Waiter(1, time.monotonic() + 120)
+    waiter.event = _InterruptedEvent()
+    with pytest.raises(_Interrupt):
+        scheduler._wait_sync('groq', 'm', 0, waiter)
+    assert scheduler.snapshot()['groq:m']['queued'] == 0
+
+
+def test_waiter_that_cannot_be_served_in_time_expires_and_leaves_the_queue():
+    scheduler = RateScheduler({('groq', 'm'): (1, None)})
+    scheduler.acquire('groq', 'm', 1)
+    with pytest.raises(RateLimitError) as raised:
+        scheduler.acquire('groq', 'm', 1, deadline=time.monotonic() + 1)
+    assert raised.value.retry_after > 1
+    assert scheduler.snapshot()['groq:m']['queued'] == 0
+
+
+def test_expired_head_does_not_hold_up_the_waiters_behind_it():
+    scheduler = RateScheduler()
+    scheduler.backoff('groq', 'm', 1, retry_after=0.3)
+    background = threading.Thread(target=scheduler.acquire, args=('groq', 'm', 1, 1))
+    background.start()
+    while scheduler.snapshot()['groq:m']['queued'] < 1:
+        time.sleep(0.005)
+    # Higher priority, so it becomes the head, but it cannot wait out the block
+    with pytest.raises(RateLimitError):
+        scheduler.acquire('groq', 'm', 1, priority=0, deadline=time.monotonic() + 0.05)
+    background.join(2)
+    assert not background.is_alive()
+    assert scheduler.snapshot()['groq:m']['queued'] == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    # Long enough to wait out the minute for the next request
+    scheduler = RateScheduler({('groq', 'm'): (1, None)}, max_wait=120)
+    scheduler.acquire('groq', 'm', 1)
+
+    async def scenario():
+        task = asyncio.ensure_future(scheduler.acquire_async('groq', 'm', 1))
+        await asyncio.sleep(0.01)
+        assert scheduler.snapshot()['groq:m']['queued'] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert scheduler.snapshot()['groq:m']['queued'] == 0
@@ -0,0 +1,162 @@
+"""Circuit breaker probes, open circuits and which errors count as provider failures"""
+import asyncio
+import time
+
+from router import ChatRouter, CircuitBreaker, CircuitOpenError
+
+
+def _half_open(breaker):
+    breaker.failures = breaker.failure_threshold
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout - 1
+
+
+class _SlowClient:
+    def __init__(self, delay, answer='ok'):
+        self.delay = delay
+        self.answer = answer
+
+    def chat(self, messages, model, temperature, max_tokens):
+        time.sleep(self.delay)
+        return self.answer
+
+
+class _AsyncClient:
+    def __init__(self, started):
+        self.started = started
+
+    async def chat(self, messages, model, temperature, max_tokens):
+        self.started.set()
+        await asyncio.sleep(60)
+
+
+def test_one_probe_at_a_time_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    _half_open(breaker)
+    assert breaker.acquire() == 'probe'
+    assert breaker.acquire() is None
+    breaker.release_probe()
+    assert breaker.acquire() == 'probe'
+
+
+def test_unreported_probe_expires_after_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    _half_open(breaker)
+    assert breaker.acquire() == 'probe'
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_cancelled_async_probe_is_released():
+    async def scenario():
+        started = asyncio.Event()
+        router = ChatRouter({'groq': _AsyncClient(started)}, hedge=False)
+        _half_open(router.breaker('groq'))
+        call = asyncio.ensure_future(router.chat_async('groq', 'm', [], 16))
+        await started.wait()
+        assert not router.breaker('groq').allow()
+        # Client disconnect: the whole routed call is cancelled mid-probe
+        call.cancel()
+        try:
+            await call
+        except asyncio.CancelledError:
+            pass
+        return router
+
+    router = asyncio.run(scenario())
+    assert router.breaker('groq').state == 'half_open'
+    assert router.breaker('groq').allow()
+
+
+def test_losing_hedge_probe_does_not_hold_the_circuit():
+    # One worker: the hedge probe to openrouter queues behind the primary. Once the
+    # primary wins, the probe is either cancelled unstarted (and released) or runs
+    # and records; either way the half-open circuit must not stay blocked.
+    router = ChatRouter(
+        {'groq': _SlowClient(0.2, 'primary'), 'openrouter': _SlowClient(0)},
+        equivalents={('groq', 'm'): [('openrouter', 'alt')]},
+        default_delay=0.01, max_workers=1)
+    _half_open(router.breaker('openrouter'))
+
+    assert router.chat('groq', 'm', [], 16) == ('primary', 'groq', 'm')
+    router._executor().submit(lambda: None).result()
+    assert router.breaker('openrouter').allow()
+
+
+def test_released_probe_of_stream_disconnect():
+    router = ChatRouter({'groq': object()})
+    _half_open(router.breaker('groq'))
+    route, probe = router.admit('groq', 'm')
+    assert route == ('groq', 'm') and probe
+    # The probe is taken and nothing else is configured: nothing is admitted
+    assert router.admit('groq', 'm') is None
+    router.release('groq')
+    assert router.admit('groq', 'm')[1]
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+class _FailingClient:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.calls = 0
+
+    def chat(self, messages, model, temperature, max_tokens):
+        self.calls += 1
+        try:
+            raise _StatusError(self.status_code)
+        except _StatusError as e:
+            # Clients re-raise SDK errors as readable exceptions
+            raise Exception(f'Error getting chat response: {e}')
+
+
+def test_client_errors_neither_trip_the_circuit_nor_fail_over():
+    primary, equivalent = _FailingClient(400), _SlowClient(0, 'alt')
+    router = ChatRouter({'groq': primary, 'openrouter': equivalent},
+                        equivalents={('groq', 'm'): [('openrouter', 'alt')]},
+                        hedge=False, failure_threshold=1)
+    try:
+        router.chat('groq', 'm', [], 16)
+    except Exception as e:
+        assert 'HTTP 400' in str(e)
+    else:
+        raise AssertionError('a 400 must reach the caller')
+    assert router.breaker('groq').state == 'closed'
+    assert router.breaker('groq').failures == 0
+
+
+def test_server_errors_trip_the_circuit_and_fail_over():
+    router = ChatRouter({'groq': _FailingClient(503), 'openrouter': _SlowClient(0, 'alt')},
+                        equivalents={('groq', 'm'): [('openrouter', 'alt')]},
+                        hedge=False, failure_threshold=1)
+    assert router.chat('groq', 'm', [], 16) == ('alt', 'openrouter', 'alt')
+    assert router.breaker('groq').state == 'open'
+
+
+def test_rejected_probe_is_released():
+    router = ChatRouter({'groq': _FailingClient(404)}, hedge=False)
+    _half_open(router.breaker('groq'))
+    try:
+        router.chat('groq', 'm', [], 16)
+    except Exception:
+        pass
+    assert router.breaker('groq').state == 'half_open'
+    assert router.breaker('groq').allow()
+
+
+def test_nothing_is_admitted_while_every_circuit_is_open():
+    router = ChatRouter({'groq': object()})
+    breaker = router.breaker('groq')
+    breaker.failures = breaker.failure_threshold
+    breaker.opened_at = time.monotonic()
+    assert router.admit('groq', 'm') is None
+    try:
+        router.chat('groq', 'm', [], 16)
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError('chat() went to a provider whose circuit is open')
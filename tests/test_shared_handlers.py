@@ -0,0 +1,87 @@
+"""The ASGI app reuses app.py's request handling and keeps blocking calls off the event loop"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('STATIC_BUILD_DIR', tempfile.mkdtemp(prefix='assets-test-'))
+
+import app as wsgi  # noqa: E402
+
+quart = pytest.importorskip('quart')
+import asgi  # noqa: E402
+
+
+class _AsyncClient:
+    async def chat(self, messages, model, temperature, max_tokens):
+        return 'hello'
+
+
+def test_both_apps_reject_the_same_requests():
+    flask_client = wsgi.app.test_client()
+    requests = [
+        ('/api/tts', {'text': ''}, 400),
+        ('/api/tts/stream', {'text': 'x' * (wsgi.TTS_MAX_CHARS + 1)}, 413),
+        ('/api/chat/batch', {'items': []}, 400),
+        ('/api/chat/batch', {'items': [{}] * (wsgi.BATCH_MAX_ITEMS + 1)}, 413),
+        ('/api/chat/arena', {'contenders': [{'model': 'm'}]}, 400),
+    ]
+
+    async def quart_responses():
+        client = asgi.app.test_client()
+        results = []
+        for path, body, _ in requests:
+            response = await client.post(path, json=body)
+            results.append((response.status_code, await response.get_json()))
+        return results
+
+    for (path, body, status), (quart_status, quart_body) in zip(requests, asyncio.run(quart_responses())):
+        flask_response = flask_client.post(path, json=body)
+        assert flask_response.status_code == quart_status == status, path
+        assert flask_response.get_json() == quart_body, path
+
+
+def test_quart_chat_stores_the_turn_off_the_event_loop(monkeypatch):
+    monkeypatch.setitem(asgi.chat_router.clients, 'groq', _AsyncClient())
+    append = wsgi.conversation_store.append
+    writers = []
+
+    def recording_append(conv, *messages):
+        writers.append(threading.get_ident())
+        return append(conv, *messages)
+
+    monkeypatch.setattr(wsgi.conversation_store, 'append', recording_append)
+
+    async def scenario():
+        response = await asgi.app.test_client().post('/api/chat', json={'message': 'hi', 'provider': 'groq'})
+        return threading.get_ident(), response.status_code, await response.get_json()
+
+    loop_thread, status, body = asyncio.run(scenario())
+    assert status == 200 and body['message'] == 'hello' and body['seq'] == 1
+    assert writers and loop_thread not in writers
+
+
+def test_open_circuit_is_a_503_for_chat_and_stream_in_both_apps(monkeypatch):
+    monkeypatch.setitem(wsgi.chat_router.clients, 'groq', object())
+    monkeypatch.setitem(asgi.chat_router.clients, 'groq', _AsyncClient())
+    breakers = [wsgi.chat_router.breaker('groq'), asgi.chat_router.breaker('groq')]
+    for breaker in breakers:
+        breaker.failures = breaker.failure_threshold
+        breaker.opened_at = time.monotonic()
+    body = {'message': 'hi', 'provider': 'groq', 'model': 'm'}
+
+    async def quart_statuses():
+        client = asgi.app.test_client()
+        return [(await client.post(path, json=body)).status_code for path in ('/api/chat', '/api/chat/stream')]
+
+    try:
+        flask_client = wsgi.app.test_client()
+        assert [flask_client.post(path, json=body).status_code
+                for path in ('/api/chat', '/api/chat/stream')] == [503, 503]
+        assert asyncio.run(quart_statuses()) == [503, 503]
+    finally:
+        for breaker in breakers:
+            breaker.record_success()
@@ -0,0 +1,99 @@
+"""Followers of a single-flight leader that is killed instead of failing"""
+import asyncio
+import threading
+import time
+
+from singleflight import SingleFlight
+
+
+class _Killed(BaseException):
+    pass
+
+
+def test_followers_retry_when_the_leader_is_killed():
+    flight = SingleFlight('test')
+    leading = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def killed():
+        leading.set()
+        release.wait()
+        raise _Killed()
+
+    def leader():
+        try:
+            flight.do('key', killed)
+        except _Killed:
+            results.append('killed')
+
+    def follower():
+        results.append(flight.do('key', lambda: 'answer'))
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    leading.wait()
+    threads.append(threading.Thread(target=follower))
+    threads[1].start()
+    # Let the follower start waiting on the leader
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(results) == ['answer', 'killed']
+
+
+def test_failures_are_shared_with_followers():
+    flight = SingleFlight('test')
+    leading = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        leading.set()
+        release.wait()
+        raise ValueError('upstream failed')
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    leading.wait()
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    # Let the follower start waiting on the leader
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ['upstream failed', 'upstream failed']
+
+
+def test_async_followers_retry_when_the_shared_call_is_cancelled():
+    async def scenario():
+        flight = SingleFlight('test')
+        calls = []
+
+        async def answer():
+            calls.append(1)
+            await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+            return 'answer'
+
+        first = asyncio.ensure_future(flight.do_async('key', answer))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async('key', answer))
+        await asyncio.sleep(0)
+        # e.g. shutdown cancels the shared task itself
+        flight._tasks['key'].cancel()
+        results = await asyncio.gather(first, follower)
+        return results, len(calls)
+
+    results, calls = asyncio.run(scenario())
+    assert results == ['answer', 'answer']
+    assert calls == 2
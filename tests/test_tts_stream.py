@@ -0,0 +1,47 @@
+"""Stitching synthesized WAV chunks into one stream or file"""
+import io
+import struct
+import wave
+
+import pytest
+
+from tts_stream import STREAMING_DATA_SIZE, join_wav, parse_wav, stream_wav
+
+
+def _wav(frames: bytes, rate: int = 24000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(frames)
+    return buffer.getvalue()
+
+
+def test_joined_file_is_one_valid_wav_with_every_chunk_in_order():
+    joined = join_wav([_wav(b'\x01\x00' * 3), _wav(b'\x02\x00' * 2)])
+    with wave.open(io.BytesIO(joined)) as audio:
+        assert (audio.getnchannels(), audio.getsampwidth(), audio.getframerate()) == (1, 2, 24000)
+        assert audio.readframes(audio.getnframes()) == b'\x01\x00' * 3 + b'\x02\x00' * 2
+
+
+def test_stream_sends_one_open_ended_header_then_only_pcm():
+    parts = list(stream_wav([_wav(b'\x01\x00'), _wav(b'\x02\x00')]))
+    assert parts[1:] == [b'\x01\x00', b'\x02\x00']
+    header = parts[0]
+    assert header[:4] == b'RIFF' and header[-8:] == b'data' + struct.pack('<I', STREAMING_DATA_SIZE)
+
+
+def test_parse_skips_odd_sized_chunks_and_trusts_the_bytes_after_a_placeholder_size():
+    fmt, pcm = parse_wav(_wav(b'\x05\x00'))
+    # An odd-sized LIST chunk (padded to even) before a streamed data chunk of unknown size
+    streamed = (b'RIFF' + struct.pack('<I', STREAMING_DATA_SIZE) + b'WAVE'
+                + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+                + b'LIST' + struct.pack('<I', 3) + b'abc\x00'
+                + b'data' + struct.pack('<I', STREAMING_DATA_SIZE) + b'\x07\x00\x08\x00')
+    assert parse_wav(streamed) == (fmt, b'\x07\x00\x08\x00')
+
+
+def test_non_wav_audio_is_rejected():
+    with pytest.raises(ValueError):
+        join_wav([b'ID3 not a wav file'])
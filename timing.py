@@ -0,0 +1,83 @@
+"""
+Request-scoped phase timing, reported as a Server-Timing header.
+
+Handlers wrap their phases (parsing, history packing, upstream call,
+serialization, ...) in `with phase('name'):` blocks. Durations are collected
+in the RequestTiming bound to the current request through a context variable,
+which keeps requests apart under threads, gevent greenlets and asyncio tasks
+alike, and are sent back as
+
+    Server-Timing: parse;dur=0.4, history;dur=1.2, upstream;dur=812.0, total;dur=815.1
+
+which browser dev tools show in the network panel. finish() also feeds every
+phase into the chatbot_request_phase_seconds histogram. Outside a timed
+request phase() does nothing.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import metrics
+
+
+class RequestTiming:
+    """Phase durations (seconds) of one request, in the order phases first ran"""
+
+    __slots__ = ('endpoint', 'started', 'phases')
+
+    def __init__(self, endpoint: Optional[str]) -> None:
+        self.endpoint = endpoint or 'unknown'
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        """Server-Timing header value (milliseconds), ending with the total so far"""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(parts)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar('request_timing', default=None)
+
+
+def start(endpoint: Optional[str]) -> RequestTiming:
+    """Begin timing the current request"""
+    timing = RequestTiming(endpoint)
+    _current.set(timing)
+    return timing
+
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def finish() -> Optional[RequestTiming]:
+    """Stop timing the current request and record its phases in metrics"""
+    timing = _current.get()
+    if timing is None:
+        return None
+    _current.set(None)
+    for name, seconds in timing.phases.items():
+        metrics.REQUEST_PHASE.labels(timing.endpoint, name).observe(seconds)
+    return timing
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block as one phase of the current request"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
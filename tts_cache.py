@@ -0,0 +1,200 @@
+"""
+Content-addressed cache for synthesized speech.
+
+Audio is keyed by a hash of (text, model, voice, format), so replaying the
+same message never triggers another synthesis. Two tiers:
+
+- memory: a bounded LRU of recent clips held as bytes in this worker
+- disk: files shared by all workers on the host, evicted oldest-first once
+  the directory exceeds its size cap; served with sendfile by the WSGI server
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def cache_key(text: str, model: str, voice: str, response_format: str) -> str:
+    """Return the content address of a synthesis request"""
+    digest = hashlib.sha256()
+    for part in (model, voice, response_format, text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def is_valid_key(key: str) -> bool:
+    """True if key looks like a cache key (guards the filesystem path)"""
+    return bool(_KEY_PATTERN.match(key or ''))
+
+
+class TTSCache:
+    """Two-tier (memory LRU + disk) audio cache"""
+
+    def __init__(self, directory: Optional[str], memory_bytes: int = 32 * 1024 * 1024,
+                 disk_bytes: int = 512 * 1024 * 1024) -> None:
+        """
+        Args:
+            directory: Disk tier location (None disables the disk tier)
+            memory_bytes: Max bytes held in the in-process LRU
+            disk_bytes: Max bytes kept on disk before evicting the oldest files
+        """
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._requests: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._disk_size: Optional[int] = None
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Return audio from the memory tier (or None)"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def get_path(self, key: str, response_format: str) -> Optional[str]:
+        """Return the disk-tier file for a key if it exists (or None)"""
+        if not self.directory:
+            return None
+        path = self._path(key, response_format)
+        try:
+            # Touch so eviction treats it as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get(self, key: str, response_format: str) -> Optional[bytes]:
+        """Return audio bytes from either tier (disk hits are read into memory)"""
+        data = self.get_bytes(key)
+        if data is not None:
+            return data
+        path = self.get_path(key, response_format)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as handle:
+                data = handle.read()
+        except OSError:
+            return None
+        self._put_memory(key, data)
+        return data
+
+    def put_request(self, key: str, payload: Dict[str, object]) -> None:
+        """Remember a synthesis request so any worker can stream it by key"""
+        with self._lock:
+            self._requests[key] = payload
+            while len(self._requests) > 256:
+                self._requests.popitem(last=False)
+        if self.directory:
+            self._write_atomic(self._path(key, 'json'), json.dumps(payload).encode('utf-8'))
+
+    def get_request(self, key: str) -> Optional[Dict[str, object]]:
+        """Return a request stored with put_request (or None)"""
+        with self._lock:
+            payload = self._requests.get(key)
+        if payload is not None or not self.directory:
+            return payload
+        try:
+            with open(self._path(key, 'json'), 'rb') as handle:
+                return json.loads(handle.read())
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, data: bytes, response_format: str) -> Optional[str]:
+        """Store audio in both tiers; returns the disk path if written"""
+        self._put_memory(key, data)
+        if not self.directory:
+            return None
+
+        path = self._path(key, response_format)
+        if not self._write_atomic(path, data):
+            return None
+        return path
+
+    def _path(self, key, response_format):
+        return os.path.join(self.directory, f"{key}.{response_format}")
+
+    def _write_atomic(self, path, data):
+        # Write-then-rename so concurrent workers never serve a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARNING] TTS disk cache write failed: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+        self._account_disk(len(data))
+        return True
+
+    def _put_memory(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous)
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _account_disk(self, added):
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk()
+            else:
+                self._disk_size += added
+            if self._disk_size <= self.disk_bytes:
+                return
+            # Other workers write here too: rescan, then evict least recently used files
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            # Evict down to 90% of the cap so we don't rescan on every write
+            target = int(self.disk_bytes * 0.9)
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._disk_size = total
+
+    def _scan_disk(self):
+        total = 0
+        for name in os.listdir(self.directory):
+            try:
+                total += os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return total
@@ -0,0 +1,177 @@
+"""
+Chunked, parallel speech synthesis stitched into one WAV stream.
+
+Long text is split at sentence boundaries into chunks that are synthesized
+concurrently (bounded per request) and emitted in order. The first chunk is
+kept short so playback can start as soon as possible; the WAV header is sent
+with an open-ended data length so browsers play while later chunks arrive.
+"""
+import asyncio
+import re
+import struct
+from concurrent.futures import Executor
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Tuple
+
+# Sentence end followed by whitespace (keeps the punctuation with the sentence)
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?。！？])\s+|\n{2,}')
+
+# Data length used while streaming, when the final size is not yet known
+STREAMING_DATA_SIZE = 0xFFFFFFFF
+
+
+def split_text(text: str, max_chars: int = 1000, first_chunk_chars: int = 200) -> List[str]:
+    """
+    Split text into synthesis chunks at sentence boundaries
+
+    Args:
+        text: Text to speak
+        max_chars: Maximum characters per chunk
+        first_chunk_chars: Target size of the first chunk (short for fast start)
+
+    Returns:
+        List of non-empty chunks in reading order
+    """
+    sentences = [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+    chunks: List[str] = []
+    current = ''
+    for sentence in sentences:
+        # Break sentences that alone exceed the limit at word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            sentence_part, sentence = sentence[:cut].strip(), sentence[cut:].strip()
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(sentence_part)
+
+        limit = first_chunk_chars if not chunks else max_chars
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def parse_wav(data: bytes) -> Tuple[bytes, bytes]:
+    """
+    Split a WAV file into its fmt chunk body and PCM data
+
+    Returns:
+        (fmt chunk body, audio data)
+    """
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("Audio is not a WAV file")
+    fmt = b''
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack('<I', data[pos + 4:pos + 8])[0]
+        body_start = pos + 8
+        if chunk_id == b'data':
+            # Streamed WAVs may carry a placeholder size; use what is actually there
+            if size in (0, STREAMING_DATA_SIZE) or body_start + size > len(data):
+                size = len(data) - body_start
+            return fmt, data[body_start:body_start + size]
+        if chunk_id == b'fmt ':
+            fmt = data[body_start:body_start + size]
+        pos = body_start + size + (size & 1)
+    raise ValueError("WAV file has no data chunk")
+
+
+def wav_header(fmt: bytes, data_size: int = STREAMING_DATA_SIZE) -> bytes:
+    """Build a RIFF/WAVE header for the given fmt body and data length"""
+    if data_size == STREAMING_DATA_SIZE:
+        riff_size = STREAMING_DATA_SIZE
+    else:
+        riff_size = 4 + (8 + len(fmt)) + (8 + data_size)
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+def synthesize_in_order(
+    synthesize: Callable[[str], bytes],
+    chunks: List[str],
+    executor: Executor,
+    concurrency: int = 3,
+) -> Iterator[bytes]:
+    """
+    Synthesize chunks concurrently and yield their audio in order
+
+    At most ``concurrency`` chunks of this request are in flight at once.
+    Closing the generator cancels chunks that have not started yet.
+    """
+    pending = []
+    next_index = 0
+    try:
+        while next_index < len(chunks) or pending:
+            while next_index < len(chunks) and len(pending) < concurrency:
+                pending.append(executor.submit(synthesize, chunks[next_index]))
+                next_index += 1
+            yield pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def synthesize_in_order_async(
+    synthesize: Callable[[str], Awaitable[bytes]],
+    chunks: List[str],
+    concurrency: int = 3,
+) -> AsyncIterator[bytes]:
+    """Asyncio counterpart of synthesize_in_order (tasks instead of an executor)"""
+    pending = []
+    next_index = 0
+    try:
+        while next_index < len(chunks) or pending:
+            while next_index < len(chunks) and len(pending) < concurrency:
+                pending.append(asyncio.ensure_future(synthesize(chunks[next_index])))
+                next_index += 1
+            yield await pending.pop(0)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def stream_wav(audio_chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Re-emit WAV chunks as one continuous WAV stream (open-ended length)"""
+    header_sent = False
+    for audio in audio_chunks:
+        fmt, pcm = parse_wav(audio)
+        if not header_sent:
+            yield wav_header(fmt)
+            header_sent = True
+        yield pcm
+
+
+async def stream_wav_async(audio_chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Asyncio counterpart of stream_wav"""
+    header_sent = False
+    async for audio in audio_chunks:
+        fmt, pcm = parse_wav(audio)
+        if not header_sent:
+            yield wav_header(fmt)
+            header_sent = True
+        yield pcm
+
+
+def join_wav(audio_chunks: Iterable[bytes]) -> bytes:
+    """Concatenate WAV chunks into one complete WAV file"""
+    fmt = None
+    parts = []
+    for audio in audio_chunks:
+        chunk_fmt, pcm = parse_wav(audio)
+        if fmt is None:
+            fmt = chunk_fmt
+        parts.append(pcm)
+    if fmt is None:
+        raise ValueError("No audio to join")
+    pcm = b''.join(parts)
+    return wav_header(fmt, len(pcm)) + pcm